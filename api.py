@@ -0,0 +1,165 @@
+# api.py
+"""Versioned JSON API (``/api/v1``).
+
+Used by the front end to like and unlike products without a POST, redirect
+and full ``/home`` render per click, and by anything else that wants the
+listing as data. Authentication is the regular session cookie; writes need
+the CSRF token in an ``X-CSRFToken`` header.
+"""
+from flask import Blueprint, abort, current_app, jsonify, request, session, url_for
+from werkzeug.exceptions import HTTPException, MethodNotAllowed, NotFound, RequestEntityTooLarge
+
+import cache
+from database import read_only
+from images import product_image_urls
+from models import db, Product, liked_product_ids, set_like, toggle_like
+from pagination import paginate
+from ratelimit import limit
+from search import listing_query
+from utils import api_login_required
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Field name -> how to read it from (product, image urls, liked ids)
+PRODUCT_FIELDS = {
+    'id': lambda product, urls, liked_ids: product.id,
+    'name': lambda product, urls, liked_ids: product.name,
+    'price': lambda product, urls, liked_ids: product.price,
+    'likes_count': lambda product, urls, liked_ids: product.likes_count,
+    'liked': lambda product, urls, liked_ids: product.id in liked_ids,
+    'owner_id': lambda product, urls, liked_ids: product.user_id,
+    'image_url': lambda product, urls, liked_ids: (
+        urls['thumbnail'] if urls else url_for('static', filename='placeholder.svg')
+    ),
+    'image_srcset': lambda product, urls, liked_ids: urls['srcset'] if urls else None,
+    'image_status': lambda product, urls, liked_ids: product.image_status,
+}
+
+
+# 413 is also registered by code, so it wins over the app's HTML page for it (uploads.py)
+@bp.errorhandler(RequestEntityTooLarge)
+@bp.errorhandler(HTTPException)
+def json_error(error):
+    # Keep headers such as Retry-After (429) and Allow (405)
+    headers = [(name, value) for name, value in error.get_headers() if name != 'Content-Type']
+    return jsonify(error=error.description), error.code, headers
+
+
+# URL matching fails before a blueprint is known, so its handlers never see these
+@bp.app_errorhandler(NotFound)
+@bp.app_errorhandler(MethodNotAllowed)
+def json_routing_error(error):
+    if request.path == bp.url_prefix or request.path.startswith(bp.url_prefix + '/'):
+        return json_error(error)
+    return error
+
+
+def _requested_fields():
+    raw = request.args.get('fields')
+    if not raw:
+        return list(PRODUCT_FIELDS)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = sorted(set(fields) - PRODUCT_FIELDS.keys())
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def _like_state(product_id, user_id, liked):
+    """Apply ``liked`` (or toggle when ``None``); returns the JSON body for one product."""
+    if liked is None:
+        liked, likes_count = toggle_like(product_id, user_id)
+    else:
+        likes_count = set_like(product_id, user_id, liked)
+    return {'product_id': product_id, 'liked': liked, 'likes_count': likes_count}
+
+
+@bp.route('/products')
+@api_login_required
+@read_only
+def list_products():
+    """A page of the listing; follow ``next_cursor`` for the next one.
+
+    Query parameters: ``search``, ``sort`` (``relevance``, ``likes``,
+    ``trending`` or ``newest``, see ``search.listing_query``), ``cursor``,
+    ``per_page`` and ``fields`` (comma-separated subset of ``PRODUCT_FIELDS``).
+    """
+    viewer_id = session['user_id']
+    fields = _requested_fields()
+    search_term = request.args.get('search', '').strip()
+    sort = request.args.get('sort', '')
+    per_page = min(max(request.args.get('per_page', current_app.config['API_PER_PAGE'], type=int), 1),
+                   current_app.config['API_MAX_PER_PAGE'])
+
+    query, order_by, partitions = listing_query(viewer_id, search_term, sort)
+    page = paginate(query, order_by, per_page, cursor=request.args.get('cursor'),
+                    scope=('api', viewer_id, search_term, sort, per_page), partitions=partitions)
+    liked_ids = liked_product_ids(viewer_id, [product.id for product in page.items]) if 'liked' in fields else set()
+    needs_urls = 'image_url' in fields or 'image_srcset' in fields
+
+    items = []
+    for product in page.items:
+        urls = product_image_urls(product) if needs_urls else None
+        items.append({name: PRODUCT_FIELDS[name](product, urls, liked_ids) for name in fields})
+    return jsonify(
+        items=items,
+        has_next=page.has_next,
+        has_prev=page.has_prev,
+        next_cursor=page.next_cursor if page.has_next else None,
+        prev_cursor=page.prev_cursor if page.has_prev else None,
+    )
+
+
+@bp.route('/products/<int:product_id>/like', methods=['POST'])
+@api_login_required
+@limit('like')
+def like_product(product_id):
+    """Like (``{"liked": true}``), unlike (``false``) or, with no body, toggle."""
+    liked = (request.get_json(silent=True) or {}).get('liked')
+    if liked is not None and not isinstance(liked, bool):
+        abort(400, '"liked" must be true or false')
+    if db.session.get(Product, product_id) is None:
+        abort(404, 'Product not found')
+
+    state = _like_state(product_id, session['user_id'], liked)
+    db.session.commit()
+    cache.bump('likes')
+    return jsonify(state)
+
+
+@bp.route('/likes', methods=['POST'])
+@api_login_required
+@limit('like', deferred=True)
+def batch_likes():
+    """Apply many like changes in one transaction.
+
+    Body: ``{"changes": [{"product_id": 1, "liked": true}, ...]}``. When a
+    product appears more than once the last change wins. Products that no
+    longer exist are reported with ``"error": "not_found"``.
+    """
+    changes = (request.get_json(silent=True) or {}).get('changes')
+    if not isinstance(changes, list) or not changes:
+        abort(400, '"changes" must be a non-empty list')
+    if len(changes) > current_app.config['API_MAX_BATCH']:
+        abort(400, f"At most {current_app.config['API_MAX_BATCH']} changes per request")
+
+    wanted = {}
+    for change in changes:
+        if not isinstance(change, dict) or not isinstance(change.get('product_id'), int) \
+                or not isinstance(change.get('liked'), bool):
+            abort(400, 'Each change needs an integer "product_id" and a boolean "liked"')
+        wanted[change['product_id']] = change['liked']
+    # One token per change, as if each were sent to the single-product endpoint
+    current_app.extensions['ratelimit'].charge('like', len(wanted))
+
+    existing = set(db.session.scalars(db.select(Product.id).where(Product.id.in_(wanted))))
+    results = []
+    # Ascending ID order so concurrent batches lock product rows in the same order
+    for product_id in sorted(wanted):
+        if product_id in existing:
+            results.append(_like_state(product_id, session['user_id'], wanted[product_id]))
+        else:
+            results.append({'product_id': product_id, 'error': 'not_found'})
+    db.session.commit()
+    cache.bump('likes')
+    return jsonify(results=results)
@@ -0,0 +1,120 @@
+# assets.py
+"""Fingerprinted, precompressed static assets.
+
+``flask build-assets`` copies each file in ``FINGERPRINTED`` to
+``static/dist/<name>.<hash><ext>``, writes ``.gz`` and (with the optional
+``brotli`` package installed) ``.br`` variants next to it, and records the
+names in ``static/dist/manifest.json``. Templates link assets with
+``asset_url('styles.css')``; without a build (development) that falls back
+to the plain file under ``/static``.
+
+A changed file gets a new name, so fingerprinted files are served with the
+precompressed variant the client accepts and cached for a year as
+immutable. Files from earlier builds are kept so pages rendered (and
+cached) before a deploy still load their assets.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+import click
+from flask import abort, current_app, request, send_file, url_for
+from werkzeug.security import safe_join
+
+FINGERPRINTED = ('styles.css', 'script.js')
+DIST_FOLDER = 'dist'
+MANIFEST = 'manifest.json'
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# name.<12 hex digits>.ext, as written by build_assets
+FINGERPRINTED_NAME = re.compile(r'^[\w.-]+\.([0-9a-f]{12})\.\w+$')
+# Content-Encoding -> suffix of the precompressed file, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _write(path, data):
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def build_assets(static_folder):
+    """Fingerprint and precompress ``FINGERPRINTED``; returns the new manifest."""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    dist = os.path.join(static_folder, DIST_FOLDER)
+    os.makedirs(dist, exist_ok=True)
+
+    manifest = {}
+    for name in FINGERPRINTED:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            data = f.read()
+        base, extension = os.path.splitext(name)
+        fingerprinted = f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+        target = os.path.join(dist, fingerprinted)
+        _write(target, data)
+        # mtime=0 keeps the .gz byte-identical across builds
+        variants = {'.gz': gzip.compress(data, 9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data, quality=11)
+        for suffix, compressed in variants.items():
+            if len(compressed) < len(data):
+                _write(target + suffix, compressed)
+        manifest[name] = f'{DIST_FOLDER}/{fingerprinted}'
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_FOLDER, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def asset_url(name):
+    """URL of a static file, fingerprinted when a build exists."""
+    return url_for('static', filename=current_app.extensions['assets'].get(name, name))
+
+
+def serve_asset(filename):
+    """A fingerprinted file, precompressed according to ``Accept-Encoding``."""
+    match = FINGERPRINTED_NAME.match(filename)
+    path = safe_join(current_app.static_folder, DIST_FOLDER, filename)
+    if match is None or path is None or not os.path.isfile(path):
+        abort(404)
+
+    encoding = None
+    for candidate, suffix in ENCODINGS:
+        if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+            encoding, path = candidate, path + suffix
+            break
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], conditional=True,
+                         etag=f'{match.group(1)}-{encoding or "identity"}', max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@click.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress the static assets (run before deploying)."""
+    manifest = build_assets(current_app.static_folder)
+    for name, built in manifest.items():
+        click.echo(f'{name} -> {built}')
+
+
+def init_app(app):
+    app.extensions['assets'] = load_manifest(app.static_folder)
+    app.add_template_global(asset_url)
+    # More specific than the built-in /static/<path:filename>, so it wins for dist/
+    app.add_url_rule(f'{app.static_url_path}/{DIST_FOLDER}/<path:filename>', 'asset', serve_asset)
@@ -0,0 +1,138 @@
+"""Time and bytes per /home response, warm and on a cold process.
+
+A scratch SQLite database gets ``--products`` products with stored image
+URLs and one signed-in user who owns and likes some of them. Measured:
+
+* ``warm``: median time and size of a /home page over ``--repeat``
+  requests with the page cache on. The shared card grid comes from the
+  cache and only the per-viewer parts are filled in.
+* ``uncached``: the same with ``CACHE_URL=null://``, so the grid is
+  rendered from the templates on every request.
+* ``cold``: a fresh process loading the /home templates and answering its
+  first /home. This runs twice against the same ``TEMPLATE_CACHE_DIR``:
+  first with an empty directory, then with the bytecode the first run left
+  there (as ``flask compile-templates`` leaves it at build time).
+
+Run it on two commits and compare the ``--output`` files to see a change.
+
+    python -m benchmarks.bench_home_render [--products 200] [--repeat 200] [--output render.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import PASSWORD, create_app, git_revision
+
+TEMPLATES = ('base.html', 'home.html', '_card_grid.html')
+
+
+def setup(app, products):
+    from images import build_image_urls
+    from models import db, Like, Product, User
+    from passwords import hash_password
+
+    with app.app_context():
+        db.create_all()
+        if db.session.get(User, 1) is None:
+            db.session.add(User(id=1, username='renderer', email='renderer@example.com',
+                                password=hash_password(PASSWORD)))
+            urls = build_image_urls('product_images/render')
+            db.session.execute(db.insert(Product), [
+                {'name': f'Product {i}', 'price': i + 0.5, 'user_id': 1 if i % 5 == 0 else None,
+                 'image_file': 'product_images/render', 'image_urls': urls, 'image_status': 'ready'}
+                for i in range(products)
+            ])
+            db.session.execute(db.insert(Like), [{'user_id': 1, 'product_id': i} for i in range(1, products, 3)])
+            counts = db.select(db.func.count()).where(Like.product_id == Product.id).scalar_subquery()
+            db.session.execute(db.update(Product).values(likes_count=counts + Product.id % 7))
+            db.session.commit()
+    client = app.test_client()
+    client.post('/', data={'username': 'renderer', 'password': PASSWORD})
+    return client
+
+
+def measure_warm(database_url, products, repeat, cache_url):
+    app = create_app(database_url, CACHE_URL=cache_url, JOB_MODE='external')
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = setup(app, products)
+    client.get('/home')
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get('/home')
+        timings.append(time.perf_counter() - started)
+    body = response.get_data()
+    return {'median_ms': round(statistics.median(timings) * 1000, 3), 'bytes': len(body),
+            'status': response.status_code}
+
+
+def measure_cold(database_url):
+    """Run in a fresh process: template load time and the first /home."""
+    app = create_app(database_url, CACHE_URL='null://', JOB_MODE='external')
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = setup(app, 0)
+    started = time.perf_counter()
+    for name in TEMPLATES:
+        app.jinja_env.get_template(name)
+    loaded = time.perf_counter() - started
+    app.jinja_env.cache.clear()
+    started = time.perf_counter()
+    response = client.get('/home')
+    first = time.perf_counter() - started
+    return {'template_load_ms': round(loaded * 1000, 2), 'first_home_ms': round(first * 1000, 2),
+            'status': response.status_code}
+
+
+def run_cold(database_url, template_cache_dir):
+    env = dict(os.environ, TEMPLATE_CACHE_DIR=template_cache_dir)
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_home_render', '--cold',
+                             '--database-url', database_url], env=env, capture_output=True, text=True,
+                            check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--output', help='also write the results as JSON')
+    parser.add_argument('--database-url', help=argparse.SUPPRESS)
+    parser.add_argument('--cold', action='store_true', help=argparse.SUPPRESS)  # Child process
+    args = parser.parse_args()
+
+    if args.cold:
+        print(json.dumps(measure_cold(args.database_url)))
+        return
+
+    with tempfile.TemporaryDirectory() as scratch:
+        database_url = 'sqlite:///' + os.path.join(scratch, 'render.db')
+        results = {
+            'warm': measure_warm(database_url, args.products, args.repeat, 'memory://'),
+            'uncached': measure_warm(database_url, args.products, args.repeat, 'null://'),
+        }
+        template_cache_dir = os.path.join(scratch, 'jinja')
+        os.makedirs(template_cache_dir)
+        results['cold'] = run_cold(database_url, template_cache_dir)
+        results['cold_bytecode'] = run_cold(database_url, template_cache_dir)
+
+    for name in ('warm', 'uncached'):
+        row = results[name]
+        print(f"{name:<14}{row['median_ms']:>9.2f} ms {row['bytes']:>8} bytes  (HTTP {row['status']})")
+    for name in ('cold', 'cold_bytecode'):
+        row = results[name]
+        print(f"{name:<14}templates {row['template_load_ms']:>7.2f} ms, first /home {row['first_home_ms']:>7.2f} ms")
+    if args.output:
+        commit, dirty = git_revision()
+        with open(args.output, 'w') as f:
+            json.dump({'meta': {'commit': commit, 'dirty': dirty, 'products': args.products,
+                                'repeat': args.repeat}, 'results': results}, f, indent=2)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""CPU cost of producing image URLs for one /home page of cards.
+
+Compares building the Cloudinary URL on every request (the old home() code)
+with reading the URLs precomputed at upload time, and with the LRU fallback
+used for rows that have no stored URLs yet.
+
+    python -m benchmarks.bench_image_urls [--cards 8] [--repeat 2000]
+"""
+import argparse
+import os
+import timeit
+from types import SimpleNamespace
+
+os.environ.setdefault('CLOUDINARY_CLOUD_NAME', 'demo')
+os.environ.setdefault('CLOUDINARY_API_KEY', 'bench')
+os.environ.setdefault('CLOUDINARY_API_SECRET', 'bench')
+
+import cloudinary
+from flask import Flask
+
+from config import Config
+import images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cards', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    cloudinary.config(cloud_name=app.config['CLOUDINARY_CLOUD_NAME'])
+
+    with app.app_context():
+        public_ids = [f'product_images/bench{i}' for i in range(args.cards)]
+        stored = [
+            SimpleNamespace(image_file=public_id, image_urls=images.build_image_urls(public_id))
+            for public_id in public_ids
+        ]
+        legacy = [SimpleNamespace(image_file=public_id, image_urls=None) for public_id in public_ids]
+
+        def per_request():
+            return [
+                cloudinary.CloudinaryImage(public_id).build_url(width=300, height=300, crop='fill')
+                for public_id in public_ids
+            ]
+
+        def precomputed():
+            return [images.product_image_urls(product)['thumbnail'] for product in stored]
+
+        def lru_fallback():
+            return [images.product_image_urls(product)['thumbnail'] for product in legacy]
+
+        results = {}
+        for name, func in (('build_url per request', per_request),
+                           ('precomputed (stored on product)', precomputed),
+                           ('LRU fallback (warm)', lru_fallback)):
+            func()
+            seconds = min(timeit.repeat(func, number=args.repeat, repeat=5)) / args.repeat
+            results[name] = seconds
+
+    baseline = results['build_url per request']
+    print(f'{args.cards} cards per page, best of 5 x {args.repeat} pages')
+    for name, seconds in results.items():
+        print(f'  {name:34s} {seconds * 1e6:9.1f} us/page  ({baseline / seconds:5.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
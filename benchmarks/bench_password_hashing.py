@@ -0,0 +1,67 @@
+"""Password hashes per second per core for candidate PASSWORD_HASH_METHOD values.
+
+Each method is timed on one thread (one core) and then with ``--threads``
+hashing at once, which shows how far PASSWORD_HASH_CONCURRENCY can go before
+hashes only queue. Memory per hash is listed for scrypt (128 * N * r bytes).
+
+    python -m benchmarks.bench_password_hashing [--seconds 2] [--threads 4]
+        [--method scrypt:32768:8:1 --method pbkdf2:sha256:600000 ...]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+from passwords import normalize_method
+
+DEFAULT_METHODS = (
+    'scrypt:32768:8:1',
+    'scrypt:16384:8:1',
+    'scrypt:16384:8:2',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:260000',
+)
+
+
+def rate(method, seconds, threads):
+    """Hashes per second with ``threads`` hashing concurrently for about ``seconds``."""
+    def worker(deadline):
+        done = 0
+        while time.perf_counter() < deadline:
+            generate_password_hash('correct horse battery staple', method=method)
+            done += 1
+        return done
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        total = sum(pool.map(worker, [started + seconds] * threads))
+    return total / (time.perf_counter() - started)
+
+
+def memory(method):
+    name, *params = normalize_method(method).split(':')
+    if name != 'scrypt':
+        return '-'
+    n, r = int(params[0]), int(params[1])
+    return f'{128 * n * r / 2**20:.0f} MiB'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--method', action='append', help='werkzeug method string (repeatable)')
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--threads', type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPUs; {args.seconds:g}s per measurement')
+    print(f"{'method':24s} {'memory':>8s} {'1 thread':>12s} {f'{args.threads} threads':>12s} {'ms/hash':>9s}")
+    for method in args.method or DEFAULT_METHODS:
+        single = rate(method, args.seconds, 1)
+        parallel = rate(method, args.seconds, args.threads)
+        print(f'{method:24s} {memory(method):>8s} {single:10.1f}/s {parallel:10.1f}/s {1000 / single:9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Peak memory of a large upload on its way in.
+
+Every scenario runs in a fresh process and reports how far its peak RSS
+grew above the idle app, for a file of ``--size-mb``:
+
+* ``request``: POST the file to /add_product. The body is spooled to disk
+  and staged without being read into memory.
+* ``request-buffered``: the same POST into a view that calls
+  ``file.read()``, as ``upload_photo`` used to.
+* ``too-large``: a POST above ``MAX_CONTENT_LENGTH`` is refused before its
+  body is read.
+
+Needs Linux's /proc. The script fails when ``request`` or ``too-large``
+grows by more than ``--max-growth-mb``.
+
+    python -m benchmarks.bench_upload_memory [--size-mb 64] [--max-growth-mb 16]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.harness import create_app
+
+SCENARIOS = ('request', 'request-buffered', 'too-large')
+# Memory must stay flat regardless of the file size for these
+BOUNDED = ('request', 'too-large')
+MB = 1024 * 1024
+
+
+def reset_peak_rss():
+    """Restart the peak RSS count, so setup (password hashing...) doesn't hide the scenario's own peak."""
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+
+def rss_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+
+def write_file(path, size):
+    block = os.urandom(MB)
+    with open(path, 'wb') as f:
+        for _ in range(size // MB):
+            f.write(block)
+
+
+def run_scenario(scenario, size_mb, scratch):
+    """Run one scenario in this process; returns ``(growth_kb, detail)``."""
+    upload_path = os.path.join(scratch, 'upload.jpg')
+    write_file(upload_path, size_mb * MB)
+    limit = MB if scenario == 'too-large' else (size_mb + 1) * MB
+    app = create_app('sqlite:///' + os.path.join(scratch, 'bench.db'), JOB_MODE='external', CACHE_URL='null://',
+                     MAX_CONTENT_LENGTH=limit, UPLOAD_STAGING_DIR=os.path.join(scratch, 'staging'))
+    app.config['WTF_CSRF_ENABLED'] = False
+    from flask import request
+    from models import db
+
+    @app.route('/bench/buffered', methods=['POST'])
+    def buffered():
+        return str(len(request.files['image'].read()))
+
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    client.post('/signup', data={'username': 'uploader', 'email': 'up@example.com', 'password': 'secret12'})
+    client.post('/', data={'username': 'uploader', 'password': 'secret12'})
+    client.get('/add_product')
+
+    reset_peak_rss()
+    before = rss_kb('VmRSS')
+    path = '/bench/buffered' if scenario == 'request-buffered' else '/add_product'
+    with open(upload_path, 'rb') as f:
+        response = client.post(path, data={'name': 'Large', 'price': '1', 'image': (f, 'upload.jpg')},
+                               content_type='multipart/form-data')
+    detail = f'HTTP {response.status_code}'
+    if scenario == 'too-large' and b'too large' not in client.get('/add_product').data:
+        detail += ', no "too large" message'
+    return rss_kb('VmHWM') - before, detail
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=64)
+    parser.add_argument('--max-growth-mb', type=float, default=16, help='allowed growth for the streaming paths')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--scenario', help=argparse.SUPPRESS)  # Child process: run just this one
+    args = parser.parse_args()
+
+    if args.scenario:
+        with tempfile.TemporaryDirectory() as scratch:
+            growth_kb, detail = run_scenario(args.scenario, args.size_mb, scratch)
+        print(json.dumps({'growth_kb': growth_kb, 'detail': detail}))
+        return
+
+    bound_mb = args.max_growth_mb
+    failures = 0
+    print(f"{'scenario':<18}{'peak growth MB':>16}  detail")
+    for scenario in args.scenarios.split(','):
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_upload_memory', '--scenario', scenario,
+                                 '--size-mb', str(args.size_mb)],
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        growth_mb = result['growth_kb'] / 1024
+        failed = scenario in BOUNDED and (growth_mb > bound_mb or 'no "too large"' in result['detail'])
+        failures += failed
+        print(f"{scenario:<18}{growth_mb:>16.1f}  {result['detail']}{'  FAIL' if failed else ''}")
+    if failures:
+        print(f'{failures} scenario(s) exceeded {bound_mb:g} MB', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""Throughput and memory per concurrent request for each gunicorn worker profile.
+
+Each profile in ``gunicorn.conf.py`` is started with the same number of
+worker processes on ``benchmarks.wsgi_app`` and driven over HTTP by
+``benchmarks.loadtest``. Meanwhile the resident memory of the server's
+processes (the workers and their helpers, not the master) is sampled.
+Divided by the number of requests the server can have in flight, that gives
+memory per concurrent request. The comparison shows what threads or
+greenlets gain without adding processes. ``--query-latency`` adds a
+simulated network round trip to every SQL statement, because SQLite answers
+too fast to be I/O bound.
+
+Needs gunicorn and Linux's /proc. Profiles whose worker package (gevent)
+is missing are skipped.
+
+    python -m benchmarks.seed --reset
+    python -m benchmarks.bench_workers [--profiles sync,gthread,gevent] [--workers 2]
+        [--threads 8] [--users 32] [--duration 20] [--query-latency 0.002]
+        [--upload-latency 0.2] [--database-url sqlite:///bench.db] [--output workers.json]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.harness import DEFAULT_DATABASE_URL, git_revision
+
+# Profile -> module its worker class needs besides gunicorn
+WORKER_PACKAGES = {'sync': None, 'gthread': None, 'gevent': 'gevent'}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def descendants(pid):
+    """PIDs of every process below ``pid``."""
+    found = []
+    pending = [pid]
+    while pending:
+        parent = pending.pop()
+        try:
+            with open(f'/proc/{parent}/task/{parent}/children') as f:
+                children = [int(child) for child in f.read().split()]
+        except FileNotFoundError:
+            continue
+        found.extend(children)
+        pending.extend(children)
+    return found
+
+
+def rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return 0
+
+
+class MemorySampler(threading.Thread):
+    """Peak combined RSS of a server's processes, sampled twice a second."""
+
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.peak_kb = 0
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.wait(0.5):
+            self.peak_kb = max(self.peak_kb, sum(rss_kb(pid) for pid in descendants(self.pid)))
+
+
+def wait_until_ready(server, url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {server.returncode}')
+        try:
+            urllib.request.urlopen(url, timeout=2).close()
+            return
+        except urllib.error.HTTPError:
+            return  # Any HTTP answer means a worker is up
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError(f'gunicorn did not answer on {url} within {timeout}s')
+
+
+def run_profile(profile, args):
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    env = dict(
+        os.environ,
+        GUNICORN_PROFILE=profile,
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_WORKER_CONNECTIONS=str(args.users),
+        BENCH_DATABASE_URL=args.database_url,
+        BENCH_UPLOAD_LATENCY=str(args.upload_latency),
+        BENCH_QUERY_LATENCY=str(args.query_latency),
+        JOB_MODE=args.job_mode,
+    )
+    with tempfile.TemporaryDirectory() as scratch:
+        log_path = os.path.join(scratch, 'gunicorn.log')
+        report_path = os.path.join(scratch, 'report.json')
+        with open(log_path, 'w') as log:
+            server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                                       'benchmarks.wsgi_app:app'], env=env, stdout=log, stderr=log)
+        sampler = MemorySampler(server.pid)
+        try:
+            wait_until_ready(server, url + '/')
+            sampler.start()
+            subprocess.run([sys.executable, '-m', 'benchmarks.loadtest', '--url', url,
+                            '--users', str(args.users), '--duration', str(args.duration),
+                            '--warmup', str(args.warmup), '--output', report_path], check=True)
+        except (RuntimeError, subprocess.CalledProcessError):
+            with open(log_path) as f:
+                sys.stderr.write(f.read()[-4000:])
+            raise
+        finally:
+            sampler.stop.set()
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        with open(report_path) as f:
+            report = json.load(f)
+
+    home = report['endpoints'].get('GET /home', {})
+    per_worker = {'sync': 1, 'gthread': args.threads, 'gevent': args.users}[profile]
+    concurrency = args.workers * per_worker
+    return {
+        'profile': profile,
+        'workers': args.workers,
+        'concurrency': concurrency,
+        'rps': report['totals']['rps'],
+        'errors': report['totals']['errors'],
+        'home_p50_ms': home.get('p50_ms'),
+        'home_p95_ms': home.get('p95_ms'),
+        'peak_rss_mb': round(sampler.peak_kb / 1024, 1),
+        # Memory per request the server can have in flight at once
+        'rss_per_slot_kb': round(sampler.peak_kb / concurrency),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', default='sync,gthread,gevent')
+    parser.add_argument('--workers', type=int, default=2, help='worker processes, the same for every profile')
+    parser.add_argument('--threads', type=int, default=8, help='threads per gthread worker')
+    parser.add_argument('--users', type=int, default=32, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--query-latency', type=float, default=0.002, help='simulated seconds per SQL statement')
+    parser.add_argument('--upload-latency', type=float, default=0.2, help='simulated image host seconds')
+    parser.add_argument('--job-mode', default='thread', choices=('thread', 'inline'),
+                        help='inline runs uploads inside the request, as on Vercel')
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--output', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    if importlib.util.find_spec('gunicorn') is None:
+        sys.exit('gunicorn is not installed')
+    results = []
+    for profile in args.profiles.split(','):
+        package = WORKER_PACKAGES[profile]
+        if package and importlib.util.find_spec(package) is None:
+            print(f'{profile}: skipped, {package} is not installed', file=sys.stderr)
+            continue
+        print(f'{profile}: running...', file=sys.stderr)
+        results.append(run_profile(profile, args))
+
+    print(f"{'profile':<9}{'workers':>8}{'concurrency':>12}{'req/s':>9}{'errors':>8}"
+          f"{'/home p95':>11}{'RSS MB':>9}{'KB/slot':>9}")
+    for row in results:
+        print(f"{row['profile']:<9}{row['workers']:>8}{row['concurrency']:>12}{row['rps']:>9}{row['errors']:>8}"
+              f"{row['home_p95_ms'] or '-':>11}{row['peak_rss_mb']:>9}{row['rss_per_slot_kb']:>9}")
+    if args.output:
+        commit, dirty = git_revision()
+        with open(args.output, 'w') as f:
+            json.dump({'meta': {'commit': commit, 'dirty': dirty, **{key: value for key, value in vars(args).items()
+                                                                     if key != 'output'}},
+                       'results': results}, f, indent=2)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Check read-replica routing and read-your-writes against two local SQLite files.
+
+A primary and a "replica" database are created in a scratch directory.
+Replication is simulated by copying the primary over the replica (SQLite's
+backup API) only when the script says so, so the replica lags behind on
+purpose. With the page cache off, every statement is counted per engine
+while a user:
+
+1. logs in and browses /home: reads go to the replica;
+2. adds a product: the write goes to the primary and the following /home
+   reads the primary, so the new product shows up although the replica
+   hasn't got it;
+3. waits out ``REPLICA_STICKY_SECONDS``: /home reads the (stale) replica
+   again, then sees the product once it is replicated.
+
+    python -m benchmarks.check_replica_routing
+"""
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from PIL import Image
+from sqlalchemy import event
+
+from benchmarks.harness import create_app
+
+STICKY_SECONDS = 1
+
+
+def main():
+    scratch = tempfile.mkdtemp(prefix='replica-check-')
+    primary_path = os.path.join(scratch, 'primary.db')
+    replica_path = os.path.join(scratch, 'replica.db')
+    app = create_app('sqlite:///' + primary_path, DATABASE_REPLICA_URLS='sqlite:///' + replica_path,
+                     REPLICA_STICKY_SECONDS=STICKY_SECONDS, JOB_MODE='external', CACHE_URL='null://')
+    app.config['WTF_CSRF_ENABLED'] = False
+    from models import db
+
+    def replicate():
+        with sqlite3.connect(primary_path) as source, sqlite3.connect(replica_path) as target:
+            source.backup(target)
+
+    statements = Counter()
+    with app.app_context():
+        db.create_all()
+        engines = {'primary': db.engine, 'replica': db.engines['replica_0']}
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *args, name=name: statements.update([name]))
+
+    failures = 0
+
+    def step(description, method, path, expect, contains=None, **kwargs):
+        nonlocal failures
+        statements.clear()
+        response = getattr(client, method)(path, **kwargs)
+        body = response.get_data(as_text=True)
+        used = {name for name, count in statements.items() if count}
+        ok = used == expect and (contains is None or (contains[0] in body) == contains[1])
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {description}: {dict(statements)}"
+              + (f", {contains[0]!r} {'shown' if contains[0] in body else 'not shown'}" if contains else ''))
+
+    client = app.test_client()
+    client.post('/signup', data={'username': 'replica', 'email': 'replica@example.com', 'password': 'secret12'})
+    replicate()
+    time.sleep(STICKY_SECONDS + 0.1)  # Signing up was a write too
+
+    step('login reads the replica', 'post', '/', {'replica'},
+         data={'username': 'replica', 'password': 'secret12'})
+    step('/home reads the replica', 'get', '/home', {'replica'})
+    image = io.BytesIO()
+    Image.new('RGB', (32, 32), 'red').save(image, 'PNG')
+    image.seek(0)
+    step('adding a product writes the primary', 'post', '/add_product', {'primary'},
+         data={'name': 'Lagging lantern', 'price': '5', 'image': (image, 'a.png')},
+         content_type='multipart/form-data')
+    step('/home right after the write reads the primary', 'get', '/home', {'primary'},
+         contains=('Lagging lantern', True))
+    time.sleep(STICKY_SECONDS + 0.1)
+    step('/home after the sticky window reads the stale replica', 'get', '/home', {'replica'},
+         contains=('Lagging lantern', False))
+    replicate()
+    step('/home after replication shows the product', 'get', '/home', {'replica'},
+         contains=('Lagging lantern', True))
+
+    if failures:
+        print(f'{failures} check(s) failed', file=sys.stderr)
+        sys.exit(1)
+    print('Routing behaves as expected')
+
+
+if __name__ == '__main__':
+    main()
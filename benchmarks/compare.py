@@ -0,0 +1,56 @@
+"""Compare two ``benchmarks.loadtest`` reports endpoint by endpoint.
+
+    python -m benchmarks.compare baseline.json candidate.json [--fail-over 10]
+
+With ``--fail-over`` the exit status is 1 when any endpoint's p95 got worse
+by more than that many percent, so the comparison can gate a CI job.
+"""
+import argparse
+import json
+import sys
+
+COLUMNS = ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'sql_queries_mean')
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return ''
+    return f'{(new - old) / old * 100:+.0f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--fail-over', type=float, help='p95 regression (percent) that fails the comparison')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline['meta']['commit']}  {baseline['totals']['rps']} req/s")
+    print(f"candidate {candidate['meta']['commit']}  {candidate['totals']['rps']} req/s")
+    print(f"{'endpoint':34s}" + ''.join(f'{column:>24s}' for column in COLUMNS))
+
+    regressions = []
+    for endpoint in sorted(set(baseline['endpoints']) | set(candidate['endpoints'])):
+        old = baseline['endpoints'].get(endpoint, {})
+        new = candidate['endpoints'].get(endpoint, {})
+        cells = []
+        for column in COLUMNS:
+            a, b = old.get(column), new.get(column)
+            cells.append(f"{a if a is not None else '-'} -> {b if b is not None else '-'} {change(a, b):>5s}")
+        print(f'{endpoint:34s}' + ''.join(f'{cell:>24s}' for cell in cells))
+        if args.fail_over is not None and old.get('p95_ms') and new.get('p95_ms'):
+            if (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 > args.fail_over:
+                regressions.append(endpoint)
+
+    if regressions:
+        print(f"p95 regressed by more than {args.fail_over:g}%: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
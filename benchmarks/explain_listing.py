@@ -0,0 +1,114 @@
+"""Check that the /home listing queries are served by indexes, without a sort.
+
+Runs the owner-first listing for a seeded user (first page, a cursor page
+inside each range, the page that straddles the two ranges and a ``?page=N``
+link), captures every SELECT on ``products`` and asks the database for its
+plan. Exits 1 if any plan sorts: ``USE TEMP B-TREE FOR ORDER BY`` on
+SQLite, a ``Sort`` node on Postgres.
+
+Searches are shown with ``--verbose`` but not checked: the planner may
+rightly sort just the rows the search index matched rather than walk the
+whole table in order.
+
+    python -m benchmarks.seed --products 100000 --reset
+    python -m benchmarks.explain_listing [--database-url sqlite:///bench.db] [--verbose]
+"""
+import argparse
+import re
+import sys
+
+from sqlalchemy import event
+
+from benchmarks.harness import DEFAULT_DATABASE_URL, create_app
+
+SORT_IN_PLAN = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (ORDER BY|RIGHT PART OF ORDER BY)'),
+    'postgresql': re.compile(r'\bSort\b'),
+}
+
+
+def capture_statements(engine, run):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'FROM products' in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        run()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--per-page', type=int, default=8)
+    parser.add_argument('--verbose', action='store_true', help='print every plan')
+    args = parser.parse_args()
+
+    app = create_app(args.database_url)
+    from metrics import explain
+    from models import db, Product
+    from pagination import paginate
+    from search import listing_query
+
+    with app.test_request_context():
+        # The owner with the most products, so the first range spans several pages
+        viewer_id, owned = db.session.execute(
+            db.select(Product.user_id, db.func.count()).group_by(Product.user_id)
+            .order_by(db.func.count().desc()).limit(1)
+        ).one()
+        total = db.session.scalar(db.select(db.func.count()).select_from(Product))
+        boundary_page = owned // args.per_page + 1
+        scope = (viewer_id, '', '')
+        query, order_by, partitions = listing_query(viewer_id, '', '')
+
+        def listing(**kwargs):
+            return paginate(query, order_by, args.per_page, scope=scope, partitions=partitions, **kwargs)
+
+        def walk():
+            first = listing()
+            listing(cursor=first.next_cursor)
+            straddling = listing(page=boundary_page)
+            listing(cursor=straddling.prev_cursor)
+            following = listing(cursor=straddling.next_cursor)
+            listing(cursor=following.next_cursor)
+
+        def search():
+            searched_query, searched_order, searched_partitions = listing_query(viewer_id, 'fox', '')
+            paginate(searched_query, searched_order, args.per_page, scope=(viewer_id, 'fox', ''),
+                     partitions=searched_partitions)
+
+        statements = capture_statements(db.engine, walk)
+        sorts = SORT_IN_PLAN.get(db.engine.dialect.name)
+        print(f'{total} products, viewer {viewer_id} owns {owned}; {len(statements)} listing statements')
+
+        failures = 0
+        for statement, parameters in statements:
+            plan = explain(statement, parameters)
+            sorted_plan = sorts is not None and any(sorts.search(line) for line in plan)
+            failures += sorted_plan
+            if args.verbose or sorted_plan:
+                print(('SORTS  ' if sorted_plan else 'ok     ') + ' '.join(statement.split())[:160])
+                for line in plan:
+                    print('         ' + line)
+        if args.verbose:
+            for statement, parameters in capture_statements(db.engine, search):
+                print('search ' + ' '.join(statement.split())[:160])
+                for line in explain(statement, parameters):
+                    print('         ' + line)
+
+    if sorts is None:
+        print(f'No sort pattern known for {db.engine.dialect.name}; plans not checked')
+    elif failures:
+        print(f'{failures} statement(s) sort the listing', file=sys.stderr)
+        sys.exit(1)
+    else:
+        print('No listing statement needs a sort')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""In-process stand-in for the Cloudinary SDK.
+
+``install()`` swaps ``storage.cloudinary_client`` for an object with the same
+surface the app uses (``uploader.upload``, ``api.ping``, ``api.resources``,
+``api.delete_resources`` and ``CloudinaryImage``). Uploads are kept in memory
+with an optional simulated latency; delivery URLs are built by the real SDK,
+which is pure string work and needs no network, against a made-up cloud name.
+"""
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+CLOUD_NAME = 'bench'
+
+
+class FakeUploader:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.stored = {}
+        self._lock = threading.Lock()
+
+    def upload(self, source, folder=None, **options):
+        time.sleep(self.latency)
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                size = len(f.read())
+        else:
+            size = len(source.read())
+        public_id = f'{folder}/{uuid.uuid4().hex}' if folder else uuid.uuid4().hex
+        with self._lock:
+            self.stored[public_id] = {'public_id': public_id, 'bytes': size,
+                                      'created_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}
+        return {'public_id': public_id, 'bytes': size}
+
+
+class FakeAdminApi:
+    def __init__(self, uploader):
+        self.uploader = uploader
+
+    def ping(self):
+        return {'status': 'ok'}
+
+    def delete_resources(self, public_ids, **options):
+        time.sleep(self.uploader.latency)
+        with self.uploader._lock:
+            return {'deleted': {
+                public_id: 'deleted' if self.uploader.stored.pop(public_id, None) else 'not_found'
+                for public_id in public_ids
+            }}
+
+    def resources(self, prefix='', max_results=10, next_cursor=None, **options):
+        with self.uploader._lock:
+            matching = sorted(key for key in self.uploader.stored if key.startswith(prefix))
+            start = int(next_cursor or 0)
+            page = [dict(self.uploader.stored[key]) for key in matching[start:start + max_results]]
+        more = start + max_results < len(matching)
+        return {'resources': page, **({'next_cursor': str(start + max_results)} if more else {})}
+
+
+def install(upload_latency=0.0):
+    """Route every image-host call made by the Cloudinary driver to the fake; returns it."""
+    import cloudinary
+
+    import images
+    import storage
+
+    cloudinary.config(cloud_name=CLOUD_NAME, api_key='bench', api_secret='bench')
+    uploader = FakeUploader(upload_latency)
+    fake = SimpleNamespace(uploader=uploader, api=FakeAdminApi(uploader), CloudinaryImage=cloudinary.CloudinaryImage)
+    storage.cloudinary_client = lambda verify=False: fake
+    images._cached_url.cache_clear()
+    return fake
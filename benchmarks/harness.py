@@ -0,0 +1,50 @@
+"""Shared setup for the benchmark scripts: the app pointed at a benchmark
+database with the image host replaced by ``fake_cloudinary``.
+
+The environment is overwritten (not defaulted) before ``run`` is imported so
+values from a developer's ``.env`` — the real database and Cloudinary
+account — are never picked up by a benchmark.
+"""
+import os
+import subprocess
+
+from benchmarks import fake_cloudinary
+
+DEFAULT_DATABASE_URL = 'sqlite:///' + os.path.abspath('bench.db')
+
+# Names are built from these so searches hit a realistic share of rows
+ADJECTIVES = ('red', 'blue', 'green', 'golden', 'quiet', 'wild', 'tiny', 'giant', 'misty', 'bright',
+              'ancient', 'frozen', 'velvet', 'paper', 'silver', 'sunny', 'dark', 'lucky', 'rusty', 'crystal')
+NOUNS = ('fox', 'river', 'castle', 'garden', 'dragon', 'harbor', 'forest', 'lantern', 'mountain', 'owl',
+         'portrait', 'city', 'ship', 'meadow', 'tiger', 'window', 'bridge', 'island', 'robot', 'whale')
+
+USERNAME_FORMAT = 'bench{:06d}'
+PASSWORD = 'benchpass1!'
+
+
+def create_app(database_url, upload_latency=0.0, **environment):
+    """Import the app against ``database_url`` with the fake image host installed."""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['CLOUDINARY_CLOUD_NAME'] = fake_cloudinary.CLOUD_NAME
+    os.environ['CLOUDINARY_API_KEY'] = 'bench'
+    os.environ['CLOUDINARY_API_SECRET'] = 'bench'
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Every virtual user comes from one IP; measure the app, not the limiter
+    os.environ.setdefault('RATELIMIT_ENABLED', '0')
+    os.environ.update({key: str(value) for key, value in environment.items()})
+
+    from run import app
+    fake_cloudinary.install(upload_latency=upload_latency)
+    return app
+
+
+def git_revision():
+    """``(commit, dirty)`` of the working tree, or ``(None, None)`` outside git."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
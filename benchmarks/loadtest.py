@@ -0,0 +1,288 @@
+"""Drive concurrent virtual users through the app and report latency per endpoint.
+
+Each virtual user logs in as one of the seeded accounts (see
+``benchmarks.seed``) and then repeatedly picks a scenario by weight:
+browsing /home and its next page, searching, liking through the form or the
+JSON API, uploading a product, or logging out and back in. Requests go to
+the app in-process (default, with the fake image host) or, with ``--url``,
+to a running server.
+
+The report is JSON: throughput plus p50/p95/p99 per endpoint, the SQL
+statements per request taken from ``Server-Timing``, and the git commit,
+so two runs can be diffed with ``benchmarks.compare``.
+
+    python -m benchmarks.loadtest [--users 16] [--duration 30] [--warmup 3]
+        [--mix browse=50,search=20,like=15,like_api=5,upload=5,login=5]
+        [--database-url sqlite:///bench.db | --url http://127.0.0.1:8000]
+        [--output results.json]
+"""
+import argparse
+import io
+import json
+import math
+import platform
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from benchmarks.harness import ADJECTIVES, DEFAULT_DATABASE_URL, NOUNS, PASSWORD, USERNAME_FORMAT, create_app, git_revision
+
+DEFAULT_MIX = 'browse=50,search=20,like=15,like_api=5,upload=5,login=5'
+
+CSRF_INPUT = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"|value="([^"]+)"[^>]*name="csrf_token"')
+PRODUCT_ID = re.compile(r'data-product-id="(\d+)"')
+NEXT_LINK = re.compile(r'href="([^"]*cursor=[^"]*)">Next<')
+SQL_TIMING = re.compile(r'desc="(\d+) queries"')
+
+
+class InProcessClient:
+    """The Flask test client behind the same tiny interface as ``HttpClient``."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, files=None, json=None, headers=None):
+        if files:
+            data = dict(data or {}, **{name: (io.BytesIO(content), filename)
+                                       for name, (filename, content) in files.items()})
+        response = self.client.open(path, method=method, data=data, json=json, headers=headers)
+        return response.status_code, response.get_data(as_text=True), response.headers
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method, path, data=None, files=None, json=None, headers=None):
+        response = self.session.request(method, self.base_url + path, data=data, files=files, json=json,
+                                        headers=headers, allow_redirects=False)
+        return response.status_code, response.text, response.headers
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)  # endpoint -> [(seconds, ok, sql statements or None)]
+        self.recording = False
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, seconds, ok, queries):
+        if self.recording:
+            with self._lock:
+                self.samples[endpoint].append((seconds, ok, queries))
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, number, client, recorder, mix, deadline, seed):
+        super().__init__(daemon=True)
+        self.number = number
+        self.client = client
+        self.recorder = recorder
+        self.mix = mix
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.csrf_token = None
+        self.product_ids = []
+        self.next_page = None
+        self.stopped = False
+
+    def call(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            status, body, headers = self.client.request(method, path, **kwargs)
+        except Exception:
+            self.recorder.add(endpoint, time.perf_counter() - started, False, None)
+            return None, ''
+        elapsed = time.perf_counter() - started
+        timing = SQL_TIMING.search(headers.get('Server-Timing', ''))
+        self.recorder.add(endpoint, elapsed, status < 400, int(timing.group(1)) if timing else None)
+        self.remember(body)
+        return status, body
+
+    def remember(self, body):
+        match = CSRF_INPUT.search(body)
+        if match:
+            self.csrf_token = match.group(1) or match.group(2)
+        ids = PRODUCT_ID.findall(body)
+        if ids:
+            self.product_ids = [int(product_id) for product_id in ids]
+            link = NEXT_LINK.search(body)
+            self.next_page = link.group(1).replace('&amp;', '&') if link else None
+
+    def login(self):
+        self.call('GET /', 'GET', '/')
+        username = USERNAME_FORMAT.format(self.number)
+        status, _ = self.call('POST /', 'POST', '/', data={
+            'username': username, 'password': PASSWORD, 'csrf_token': self.csrf_token,
+        })
+        if status != 302:
+            raise RuntimeError(f'Login as {username} failed ({status}); seed the database with benchmarks.seed')
+
+    # Scenarios
+
+    def browse(self):
+        self.call('GET /home', 'GET', '/home')
+        if self.next_page and self.rng.random() < 0.5:
+            self.call('GET /home?cursor', 'GET', self.next_page)
+
+    def search(self):
+        term = self.rng.choice(ADJECTIVES + NOUNS)
+        if self.rng.random() < 0.3:
+            self.call('GET /home?search&sort=relevance', 'GET', f'/home?search={term[:-1]}&sort=relevance')
+        else:
+            self.call('GET /home?search', 'GET', f'/home?search={term}')
+
+    def like(self):
+        if not self.product_ids:
+            return self.browse()
+        product_id = self.rng.choice(self.product_ids)
+        self.call('POST /toggle_like', 'POST', f'/toggle_like/{product_id}', data={'csrf_token': self.csrf_token})
+
+    def like_api(self):
+        if not self.product_ids:
+            return self.browse()
+        changes = [{'product_id': product_id, 'liked': self.rng.random() < 0.5}
+                   for product_id in self.rng.sample(self.product_ids, min(3, len(self.product_ids)))]
+        self.call('POST /api/v1/likes', 'POST', '/api/v1/likes', json={'changes': changes},
+                  headers={'X-CSRFToken': self.csrf_token})
+
+    def upload(self):
+        from PIL import Image
+
+        self.call('GET /add_product', 'GET', '/add_product')
+        image = io.BytesIO()
+        # A new colour per upload so deduplication doesn't skip the pipeline
+        Image.new('RGB', (320, 240), tuple(self.rng.randrange(256) for _ in range(3))).save(image, 'PNG')
+        self.call('POST /add_product', 'POST', '/add_product', data={
+            'name': f'{self.rng.choice(ADJECTIVES).title()} {self.rng.choice(NOUNS)} upload',
+            'price': '9.99', 'csrf_token': self.csrf_token,
+        }, files={'image': ('bench.png', image.getvalue())})
+
+    def relogin(self):
+        self.call('GET /logout', 'GET', '/logout')
+        self.login()
+
+    def run(self):
+        scenarios = {'browse': self.browse, 'search': self.search, 'like': self.like,
+                     'like_api': self.like_api, 'upload': self.upload, 'login': self.relogin}
+        names, weights = zip(*self.mix.items())
+        try:
+            self.login()
+            while time.monotonic() < self.deadline:
+                scenarios[self.rng.choices(names, weights)[0]]()
+        except Exception as e:
+            print(f'virtual user {self.number} stopped: {e}', file=sys.stderr)
+            self.stopped = True
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - {'browse', 'search', 'like', 'like_api', 'upload', 'login'}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(samples, seconds):
+    endpoints = {}
+    for endpoint, rows in sorted(samples.items()):
+        latencies = sorted(row[0] for row in rows)
+        queries = [row[2] for row in rows if row[2] is not None]
+        endpoints[endpoint] = {
+            'count': len(rows),
+            'errors': sum(1 for row in rows if not row[1]),
+            'rps': round(len(rows) / seconds, 2),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2),
+            'sql_queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+    total = sum(endpoint['count'] for endpoint in endpoints.values())
+    return {
+        'requests': total,
+        'errors': sum(endpoint['errors'] for endpoint in endpoints.values()),
+        'rps': round(total / seconds, 2),
+    }, endpoints
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=16, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds before measuring starts')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process app')
+    parser.add_argument('--upload-latency', type=float, default=0.2, help='simulated image host seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+        target = args.url
+    else:
+        app = create_app(args.database_url, upload_latency=args.upload_latency)
+        make_client = lambda: InProcessClient(app)
+        target = 'in-process'
+
+    recorder = Recorder()
+    deadline = time.monotonic() + args.warmup + args.duration
+    users = [VirtualUser(i, make_client(), recorder, args.mix, deadline, args.seed * 1000 + i)
+             for i in range(args.users)]
+    for user in users:
+        user.start()
+    time.sleep(args.warmup)
+    recorder.recording = True
+    started = time.monotonic()
+    for user in users:
+        user.join()
+    elapsed = time.monotonic() - started
+
+    totals, endpoints = summarize(recorder.samples, elapsed)
+    commit, dirty = git_revision()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'target': target,
+            'database': None if args.url else args.database_url.split(':', 1)[0],
+            'users': args.users,
+            'duration_s': round(elapsed, 2),
+            'warmup_s': args.warmup,
+            'mix': args.mix,
+            'upload_latency_s': None if args.url else args.upload_latency,
+            'seed': args.seed,
+            'stopped_users': sum(1 for user in users if user.stopped),
+        },
+        'totals': totals,
+        'endpoints': endpoints,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Fill a benchmark database with users, products and likes.
+
+Rows are generated deterministically from ``--seed`` and written with bulk
+INSERTs in batches, so 1M products take minutes rather than hours. Every
+user's password is ``harness.PASSWORD``; products point at a pool of fake
+image IDs with their delivery URLs precomputed, as uploads would leave them.
+
+    python -m benchmarks.seed --products 100000 [--users 1000] [--likes 200000]
+                              [--database-url sqlite:///bench.db] [--reset]
+
+Use a local Postgres with ``--database-url postgresql://localhost/draw_bench``.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import timedelta
+
+from werkzeug.security import generate_password_hash
+
+from benchmarks.harness import ADJECTIVES, DEFAULT_DATABASE_URL, NOUNS, PASSWORD, USERNAME_FORMAT, create_app
+
+# Distinct images shared by the seeded products (the URL work is per image, not per row)
+IMAGE_POOL = 1000
+
+
+def batches(total, size):
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+
+def seed(db, args):
+    from images import build_image_urls
+    from models import Like, Product, User, utcnow
+    from trending import refresh_trending
+
+    rng = random.Random(args.seed)
+    password = generate_password_hash(PASSWORD)
+    started = time.perf_counter()
+
+    for start, stop in batches(args.users, args.batch):
+        db.session.execute(db.insert(User), [
+            {'username': USERNAME_FORMAT.format(i), 'email': f'{USERNAME_FORMAT.format(i)}@example.com',
+             'password': password}
+            for i in range(start, stop)
+        ])
+        db.session.commit()
+    user_ids = list(db.session.scalars(db.select(User.id).where(User.username.like('bench%'))))
+    print(f'users: {len(user_ids)}', file=sys.stderr)
+
+    images = [(f'product_images/seed{i}', build_image_urls(f'product_images/seed{i}')) for i in range(IMAGE_POOL)]
+    for start, stop in batches(args.products, args.batch):
+        rows = []
+        for i in range(start, stop):
+            public_id, urls = images[i % IMAGE_POOL]
+            rows.append({
+                'name': f'{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)} {i}',
+                'price': round(rng.uniform(1, 500), 2),
+                'user_id': rng.choice(user_ids),
+                'image_file': public_id,
+                'image_urls': urls,
+                'image_status': 'ready',
+            })
+        db.session.execute(db.insert(Product), rows)
+        db.session.commit()
+        print(f'products: {stop}/{args.products}', file=sys.stderr)
+
+    if args.likes:
+        low, high = db.session.execute(db.select(db.func.min(Product.id), db.func.max(Product.id))).one()
+        pairs = set()
+        while len(pairs) < args.likes:
+            pairs.add((rng.choice(user_ids), rng.randint(low, high)))
+        pairs = sorted(pairs)
+        now = utcnow()
+        for start, stop in batches(len(pairs), args.batch):
+            # Spread over the last two weeks so the trending sort has something to decay
+            db.session.execute(db.insert(Like), [
+                {'user_id': user_id, 'product_id': product_id,
+                 'created_at': now - timedelta(seconds=rng.uniform(0, 14 * 24 * 3600))}
+                for user_id, product_id in pairs[start:stop]
+            ])
+            db.session.commit()
+        counts = db.select(db.func.count()).where(Like.product_id == Product.id).scalar_subquery()
+        db.session.execute(db.update(Product).values(likes_count=counts))
+        db.session.commit()
+        refresh_trending(now)
+        print(f'likes: {len(pairs)}', file=sys.stderr)
+
+    print(f'seeded in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--likes', type=int, default=None, help='default: 2 per product')
+    parser.add_argument('--batch', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--reset', action='store_true', help='drop and recreate all tables first')
+    args = parser.parse_args()
+    if args.likes is None:
+        args.likes = 2 * args.products
+    args.likes = min(args.likes, args.users * args.products)
+
+    app = create_app(args.database_url)
+    from models import db
+
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        seed(db, args)
+
+
+if __name__ == '__main__':
+    main()
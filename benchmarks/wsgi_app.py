@@ -0,0 +1,34 @@
+"""WSGI entry point for benchmarking a real server (see ``benchmarks.bench_workers``).
+
+The app runs against the benchmark database with the fake image host. Set
+these in the environment:
+
+* ``BENCH_DATABASE_URL`` - the benchmark database.
+* ``BENCH_UPLOAD_LATENCY`` - seconds per fake image host call.
+* ``BENCH_QUERY_LATENCY`` - seconds added to every SQL statement. It stands
+  in for the network round trip to a database on another host, which
+  SQLite doesn't have.
+
+    BENCH_QUERY_LATENCY=0.002 gunicorn -c gunicorn.conf.py benchmarks.wsgi_app:app
+"""
+import os
+import time
+
+from sqlalchemy import event
+
+from benchmarks.harness import DEFAULT_DATABASE_URL, create_app
+
+app = create_app(os.getenv('BENCH_DATABASE_URL', DEFAULT_DATABASE_URL),
+                 upload_latency=float(os.getenv('BENCH_UPLOAD_LATENCY', 0.2)))
+
+QUERY_LATENCY = float(os.getenv('BENCH_QUERY_LATENCY', 0))
+if QUERY_LATENCY:
+    from models import db
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def simulate_round_trip(conn, cursor, statement, parameters, context, executemany):
+        # time.sleep releases the GIL, and yields to other greenlets under gevent
+        time.sleep(QUERY_LATENCY)
@@ -7,4 +7,8 @@ mkdir -p static/images
 # Copy static files if they exist
 if [ -d "src/static" ]; then
     cp -r src/static/* static/
-fi 
\ No newline at end of file
+fi 
+# Fingerprinted, precompressed CSS/JS (see assets.py)
+flask --app run.py build-assets
+# Template bytecode, so cold instances skip compiling (see templating.py)
+flask --app run.py compile-templates
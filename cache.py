@@ -0,0 +1,233 @@
+# cache.py
+"""Shared cache with version-based invalidation.
+
+Cached entries embed the current version of the data they were built from
+(``catalog`` for products, ``likes`` for like counts). Writers bump the
+version after committing, so stale entries are simply never read again and
+age out of the cache; nothing has to be found and deleted. The versions
+also make up the /home ETag, so every process must agree on them.
+
+Backends are chosen with ``CACHE_URL``:
+
+* ``memory://``         - in-process LRU (per worker process)
+* ``redis://host:port`` - any Redis-protocol server (Redis, Valkey, KeyDB...),
+  needs the optional ``redis`` package; entries are shared between processes
+* ``null://``           - caching disabled
+
+With Redis the versions are counters next to the entries. Otherwise they are
+rows of the ``cache_versions`` table: counters kept in one process would
+miss the other workers' writes and start from 0 again after a restart,
+handing out ETags that were already used for older data.
+"""
+import hashlib
+import pickle
+import threading
+import time
+from datetime import timezone
+
+from cachetools import LRUCache
+from flask import current_app, g, has_request_context
+
+from models import db, CacheVersion, utcnow
+
+VERSION_PREFIX = 'v:'
+MODIFIED_PREFIX = 'lm:'
+
+
+class MemoryCache:
+    """Thread-safe in-process LRU with per-entry expiry.
+
+    Version counters live outside the LRU so they are never evicted; losing
+    one would let entries built for an old version become readable again.
+    """
+
+    def __init__(self, maxsize=1024, default_ttl=None):
+        self._entries = LRUCache(maxsize=maxsize)
+        self._counters = {}
+        self._lock = threading.Lock()
+        self.default_ttl = default_ttl
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._counters.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class RedisCache:
+    """Cache stored in a Redis-protocol server; values are pickled."""
+
+    def __init__(self, url, default_ttl=None, prefix='draw:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('CACHE_URL points at Redis but the "redis" package is not installed') from e
+        self._client = redis.Redis.from_url(url)
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        values = self._client.mget([self.prefix + key for key in keys])
+        return [None if value is None else pickle.loads(value) for value in values]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self._client.set(self.prefix + key, pickle.dumps(value), ex=ttl or None)
+
+    def incr(self, key):
+        return self._client.incr(self.prefix + key)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+
+class NullCache(MemoryCache):
+    """Caches nothing; the versions (and so ETags) still work, they are in the database."""
+
+    def set(self, key, value, ttl=None):
+        pass
+
+
+class BackendVersions:
+    """Version counters kept in a shared cache backend, next to the entries."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def read(self, namespaces):
+        """``{namespace: (version, last bump as epoch seconds or None)}``."""
+        values = self.backend.get_many([VERSION_PREFIX + namespace for namespace in namespaces]
+                                       + [MODIFIED_PREFIX + namespace for namespace in namespaces])
+        return {namespace: (values[i] or 0, values[len(namespaces) + i]) for i, namespace in enumerate(namespaces)}
+
+    def bump(self, namespaces):
+        now = time.time()
+        for namespace in namespaces:
+            self.backend.incr(VERSION_PREFIX + namespace)
+            self.backend.set(MODIFIED_PREFIX + namespace, now, ttl=0)
+
+
+class DatabaseVersions:
+    """Version counters in the ``cache_versions`` table.
+
+    Reads go through the request's session, so a ``@read_only`` view takes
+    them from the same replica as its data and they never run ahead of it.
+    A bump is a one-row UPDATE committed right after the writer's own commit.
+    """
+
+    def read(self, namespaces):
+        rows = db.session.execute(
+            db.select(CacheVersion.namespace, CacheVersion.version, CacheVersion.modified_at)
+            .where(CacheVersion.namespace.in_(namespaces))
+        )
+        found = {
+            row.namespace: (row.version, row.modified_at and row.modified_at.replace(tzinfo=timezone.utc).timestamp())
+            for row in rows
+        }
+        return {namespace: found.get(namespace, (0, None)) for namespace in namespaces}
+
+    def bump(self, namespaces):
+        db.session.execute(
+            db.update(CacheVersion).where(CacheVersion.namespace.in_(namespaces))
+            .values(version=CacheVersion.version + 1, modified_at=utcnow())
+        )
+        db.session.commit()
+
+
+def create_backend(url, maxsize=1024, default_ttl=None):
+    if url.startswith('memory://'):
+        return MemoryCache(maxsize=maxsize, default_ttl=default_ttl)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(url, default_ttl=default_ttl)
+    if url.startswith('null://'):
+        return NullCache()
+    raise ValueError(f'Unsupported CACHE_URL: {url}')
+
+
+def get_cache():
+    return current_app.extensions['cache']
+
+
+def make_key(*parts):
+    """Compact, backend-safe key from arbitrary hashable parts."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _current(namespaces):
+    # Read once per request: /home needs the versions and the bump times
+    known = g.setdefault('cache_versions', {}) if has_request_context() else {}
+    missing = [namespace for namespace in namespaces if namespace not in known]
+    if missing:
+        known.update(current_app.extensions['cache_versions'].read(missing))
+    return known
+
+
+def versions(*namespaces):
+    """Current version of each namespace, as a tuple usable in cache keys."""
+    current = _current(namespaces)
+    return tuple(current[namespace][0] for namespace in namespaces)
+
+
+def last_modified(*namespaces):
+    """Most recent bump time (epoch seconds) across ``namespaces``, or ``None``."""
+    current = _current(namespaces)
+    values = [current[namespace][1] for namespace in namespaces if current[namespace][1]]
+    return max(values) if values else None
+
+
+def bump(*namespaces):
+    """Invalidate everything cached under ``namespaces``; call after committing."""
+    current_app.extensions['cache_versions'].bump(namespaces)
+    g.pop('cache_versions', None)
+
+
+def init_app(app):
+    config = app.config
+    backend = create_backend(
+        config['CACHE_URL'], maxsize=config['CACHE_MAX_ENTRIES'], default_ttl=config['CACHE_DEFAULT_TTL'],
+    )
+    app.extensions['cache'] = backend
+    app.extensions['cache_versions'] = BackendVersions(backend) if isinstance(backend, RedisCache) else DatabaseVersions()
+
+    @app.teardown_request
+    def forget_versions(exc):
+        # g outlives the request when an app context was already pushed (CLI, tests)
+        g.pop('cache_versions', None)
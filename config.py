@@ -1,5 +1,6 @@
 # config.py
 import os
+import tempfile
 from dotenv import load_dotenv
 
 
@@ -10,15 +11,124 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'default_secret_key')  # Default key for development
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///site.db')  
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pooling (database.py): pooled | serverless | nullpool | pgbouncer
+    DB_PROFILE = os.getenv('DB_PROFILE', 'serverless' if os.getenv('VERCEL') else 'pooled')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))  # "pooled" only; keep >= threads + JOB_WORKERS
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '0') == '1'
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 500))  # Compiled SQL cache; 0 disables
+    # Comma-separated replica URLs for @read_only views; a user who wrote reads the primary for a while
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+    # Logging: level name and "text" or "json" (one object per line)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+    # Prometheus metrics at /metrics, for clients sending "Authorization: Bearer <METRICS_TOKEN>".
+    # Without a token the endpoint answers 404 (it's open only when running in debug mode)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    # Requests slower than this are logged (0 disables); for these endpoints with the query plan too
+    SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 0))
+    SLOW_REQUEST_EXPLAIN_ENDPOINTS = ['home']
+
+    # Password hashing (passwords.py): werkzeug method string and how many hashes may run
+    # at once per process; past MAX_WAITING queued requests (or WAIT_SECONDS) logins get a 429
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_CONCURRENCY = int(os.getenv('PASSWORD_HASH_CONCURRENCY', 2))
+    PASSWORD_HASH_MAX_WAITING = int(os.getenv('PASSWORD_HASH_MAX_WAITING', 16))
+    PASSWORD_HASH_WAIT_SECONDS = float(os.getenv('PASSWORD_HASH_WAIT_SECONDS', 5))
+
+    # Proxies in front of the app trusted to set X-Forwarded-For, i.e. where the client IP (used by
+    # the per-IP limits) comes from; 0 uses the connecting address, which clients can't spoof
+    PROXY_FIX_X_FOR = int(os.getenv('PROXY_FIX_X_FOR', 0))
+
+    # Admission control for the endpoints that write (ratelimit.py). Token buckets per signed-in
+    # user and per client IP as "<count>/<second|minute|hour|day>" (None disables one), kept in
+    # memory:// (per process) or redis://host:port (shared), and a per-process cap on requests
+    # of each class running at once (0 disables it)
+    RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', '1') == '1'
+    RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL', 'memory://')
+    RATELIMITS = {
+        'auth': {'user': None, 'ip': os.getenv('RATELIMIT_AUTH_IP', '20/minute')},
+        'like': {'user': os.getenv('RATELIMIT_LIKE_USER', '60/minute'), 'ip': os.getenv('RATELIMIT_LIKE_IP', '300/minute')},
+        'upload': {'user': os.getenv('RATELIMIT_UPLOAD_USER', '10/minute'), 'ip': os.getenv('RATELIMIT_UPLOAD_IP', '30/minute')},
+        'write': {'user': os.getenv('RATELIMIT_WRITE_USER', '30/minute'), 'ip': os.getenv('RATELIMIT_WRITE_IP', '120/minute')},
+    }
+    RATELIMIT_CONCURRENCY = {
+        'auth': int(os.getenv('RATELIMIT_AUTH_CONCURRENCY', 16)),
+        'like': int(os.getenv('RATELIMIT_LIKE_CONCURRENCY', 32)),
+        'upload': int(os.getenv('RATELIMIT_UPLOAD_CONCURRENCY', 4)),
+        'write': int(os.getenv('RATELIMIT_WRITE_CONCURRENCY', 16)),
+    }
+
+    # /home listing: cards per page and the cap for the approximate total (0 disables it)
+    HOME_PER_PAGE = int(os.getenv('HOME_PER_PAGE', 8))
+    HOME_COUNT_CAP = int(os.getenv('HOME_COUNT_CAP', 0))
+    # "Trending" sort: a like's weight halves every this many hours, see trending.py
+    TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 24))
+    # A like this many half-lives after the last refresh queues a refresh job
+    TRENDING_REBASE_HALF_LIVES = float(os.getenv('TRENDING_REBASE_HALF_LIVES', 10))
+
+    # JSON API (api.py): default/maximum page size and like changes per batch request
+    API_PER_PAGE = int(os.getenv('API_PER_PAGE', 20))
+    API_MAX_PER_PAGE = 100
+    API_MAX_BATCH = 100
+
+    # Page/fragment cache, see cache.py: memory:// (per process), redis://host:port or null://
+    CACHE_URL = os.getenv('CACHE_URL', 'memory://')
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 2048))
+    CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', 300))  # Seconds; entries of old versions age out
+
+    # Background jobs (image uploads/deletes): thread | inline | external, see jobs.py
+    JOB_MODE = os.getenv('JOB_MODE', 'inline' if os.getenv('VERCEL') else 'thread')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+    JOB_RETRY_BACKOFF = float(os.getenv('JOB_RETRY_BACKOFF', 2.0))  # Seconds before the first retry
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 300))
+    # Uploads wait here until a job sends them to the image host
+    UPLOAD_STAGING_DIR = os.getenv('UPLOAD_STAGING_DIR', os.path.join(tempfile.gettempdir(), 'draw-uploads'))
+    # Request bodies above this many bytes are refused with 413 before they are read (see uploads.py)
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+    # Uploaded files above this many bytes are spooled to UPLOAD_STAGING_DIR rather than kept in memory
+    UPLOAD_SPOOL_THRESHOLD = int(os.getenv('UPLOAD_SPOOL_THRESHOLD', 512 * 1024))
+
+    # Preprocessing before upload (see imaging.py); 0 workers processes in the job thread
+    IMAGE_MAX_EDGE = int(os.getenv('IMAGE_MAX_EDGE', 1600))
+    IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'WEBP')  # WEBP or JPEG
+    IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 82))
+    # Uploads larger than this (width x height) are rejected before being decoded
+    IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 40_000_000))
+    # Delivery transformations, as Cloudinary options (the local backend renders the same);
+    # URLs are precomputed per image. "thumbnail" is the card image and the base of the
+    # responsive srcset.
+    IMAGE_TRANSFORMS = {
+        'thumbnail': {'width': 300, 'height': 300, 'crop': 'fill'},
+        'detail': {'width': 1200, 'crop': 'limit'},
+    }
+    IMAGE_SRCSET_WIDTHS = [300, 600, 900]
+    IMAGE_PROCESS_WORKERS = int(os.getenv('IMAGE_PROCESS_WORKERS', 0 if os.getenv('VERCEL') else 2))
+
+    # Deleted images are tombstoned and removed in batches this many seconds later
+    IMAGE_DELETE_FLUSH_DELAY = int(os.getenv('IMAGE_DELETE_FLUSH_DELAY', 10))
     
-    # Cloudinary configuration - use explicit values for testing
+    # Compiled Jinja templates, written by "flask compile-templates" at build time (see templating.py);
+    # empty disables the bytecode cache
+    TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jinja_cache'))
+
+    # Where images are stored (storage.py): "cloudinary", or "local" for files under MEDIA_ROOT
+    # served by the app at MEDIA_URL_PREFIX. Behind nginx, set MEDIA_ACCEL_REDIRECT to an
+    # internal location aliasing MEDIA_ROOT and the app only sends headers.
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'cloudinary')
+    MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media'))
+    MEDIA_URL_PREFIX = os.getenv('MEDIA_URL_PREFIX', '/media')
+    MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT')
+    MEDIA_MAX_AGE = 365 * 24 * 3600  # Keys are content hashes, so responses never go stale
+
+    # Cloudinary configuration; validated on first use, see storage.cloudinary_client()
     CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME')
     CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY')
     CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET')
-
-    print(f"Cloud Name: {CLOUDINARY_CLOUD_NAME}")  # Debug print
-    print(f"API Key: {CLOUDINARY_API_KEY}")  # Debug print
-    print(f"API Secret: {'*' * len(CLOUDINARY_API_SECRET) if CLOUDINARY_API_SECRET else 'None'}")  # Debug print
-
-    if not all([CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET]):
-        raise ValueError("Missing Cloudinary configuration. Please check your environment variables.")
@@ -0,0 +1,144 @@
+# database.py
+"""Engine profiles and read-replica routing.
+
+``DB_PROFILE`` picks the connection pool for every engine:
+
+* ``pooled`` - a regular pool of ``DB_POOL_SIZE`` (+ ``DB_MAX_OVERFLOW``)
+  connections per process, for long-lived servers.
+* ``serverless`` - one connection (plus one overflow) per instance,
+  pinged before use and recycled after five minutes, since an idle
+  function instance may be frozen for a while and each one has its own pool.
+* ``nullpool`` - no pool, a connection per checkout; for when something in
+  front of the database pools (pgbouncer in session mode, RDS Proxy).
+* ``pgbouncer`` - ``nullpool`` plus no server-side prepared statements,
+  which pgbouncer in transaction mode can't route.
+
+``DB_STATEMENT_CACHE_SIZE`` sizes SQLAlchemy's compiled statement cache (0
+turns it off). SQLite files are opened locally and keep SQLAlchemy's pool.
+
+With ``DATABASE_REPLICA_URLS`` set, views decorated with ``@read_only`` run
+their plain SELECTs on one of the replicas (picked per request); flushes,
+DML and ``SELECT ... FOR UPDATE`` always go to the primary, and so does
+everything outside a request (jobs, CLI). Once a request commits a write,
+the user's session cookie pins their reads to the primary for
+``REPLICA_STICKY_SECONDS`` so they see their own changes despite replica
+lag. Other users may still read slightly stale rows, and pages they render
+then stay in the page cache for up to ``CACHE_DEFAULT_TTL``.
+"""
+import random
+import time
+from functools import wraps
+
+from flask import g, has_request_context, session as http_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql import Select
+
+PROFILES = ('pooled', 'serverless', 'nullpool', 'pgbouncer')
+REPLICA_BIND_PREFIX = 'replica_'
+STICKY_KEY = 'db_primary_until'
+
+
+def engine_options(config):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for ``DB_PROFILE``, applied to the primary and every replica."""
+    profile = config['DB_PROFILE']
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {profile!r}: expected one of {', '.join(PROFILES)}")
+    options = {'query_cache_size': config['DB_STATEMENT_CACHE_SIZE']}
+    url = config['SQLALCHEMY_DATABASE_URI']
+    if url.startswith('sqlite'):
+        return options
+
+    if profile == 'pooled':
+        options.update(pool_size=config['DB_POOL_SIZE'], max_overflow=config['DB_MAX_OVERFLOW'],
+                       pool_recycle=1800, pool_pre_ping=config['DB_POOL_PRE_PING'])
+    elif profile == 'serverless':
+        options.update(pool_size=1, max_overflow=1, pool_timeout=10, pool_recycle=300, pool_pre_ping=True)
+    else:
+        options['poolclass'] = NullPool
+    if profile == 'pgbouncer' and url.startswith('postgresql+psycopg:'):
+        # psycopg 3 prepares repeated statements server side; psycopg2 never does
+        options['connect_args'] = {'prepare_threshold': None}
+    return options
+
+
+def replica_keys(db):
+    return [key for key in db.engines if key and key.startswith(REPLICA_BIND_PREFIX)]
+
+
+def read_only(view):
+    """Let ``view`` read from a replica (writes it makes still go to the primary)."""
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return decorated_function
+
+
+def _pinned_to_primary():
+    return http_session.get(STICKY_KEY, 0) > time.time()
+
+
+class RoutingSession(Session):
+    """Sends plain SELECTs of ``@read_only`` views to a replica, everything else to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and isinstance(clause, Select) and clause._for_update_arg is None and not self._flushing
+                and not self.info.get('wrote') and has_request_context()
+                and g.get('db_read_only') and not g.get('db_wrote')):
+            replica = g.get('db_replica')
+            if replica is None:
+                keys = replica_keys(self._db)
+                g.db_replica = replica = random.choice(keys) if keys and not _pinned_to_primary() else ''
+            if replica:
+                return self._db.engines[replica]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Track writes so the rest of the request and the user's next requests read the primary
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _do_orm_execute(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('wrote', False) and has_request_context():
+        g.db_wrote = True
+
+
+def init_app(app, db):
+    """Apply the engine profile and replica binds, then initialise ``db``.
+
+    ``db`` must be created with ``session_options={'class_': RoutingSession}``.
+    """
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {**engine_options(config), **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    replicas = config['DATABASE_REPLICA_URLS']
+    if replicas:
+        config['SQLALCHEMY_BINDS'] = {
+            **config.get('SQLALCHEMY_BINDS', {}),
+            **{f'{REPLICA_BIND_PREFIX}{i}': url for i, url in enumerate(replicas)},
+        }
+    db.init_app(app)
+    if not replicas:
+        return
+
+    @app.after_request
+    def pin_writer_to_primary(response):
+        if g.get('db_wrote'):
+            http_session[STICKY_KEY] = time.time() + config['REPLICA_STICKY_SECONDS']
+        return response
+
+    @app.teardown_request
+    def forget_routing(exc):
+        # g outlives the request when an app context was already pushed (CLI, tests)
+        for key in ('db_read_only', 'db_replica', 'db_wrote'):
+            g.pop(key, None)
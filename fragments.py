@@ -0,0 +1,37 @@
+# fragments.py
+"""Cached, shared HTML for the /home card grid.
+
+The grid for a page of products is rendered once and shared by every viewer
+of that page; only the per-viewer details (like hearts, Edit buttons) are
+left as markers in ``_card_grid.html`` and filled in for each request by
+``personalize``. The like buttons share the CSRF token of the page's single
+like form, so the grid carries none. Entries are keyed by the catalog and likes
+versions, so any write that changes what a card shows makes them unreachable.
+"""
+import re
+
+from flask import render_template
+
+import cache
+
+MARKERS = re.compile(r'<!--LIKED_(\d+)-->|<!--EDIT_(\d+)-->(.*?)<!--/EDIT-->', re.DOTALL)
+
+
+def card_grid(cards, data_versions):
+    """Shared grid HTML for ``cards``, from the cache when possible."""
+    key = cache.make_key('home:grid', data_versions, tuple(card['id'] for card in cards))
+    backend = cache.get_cache()
+    html = backend.get(key)
+    if html is None:
+        html = render_template('_card_grid.html', cards=cards)
+        backend.set(key, html)
+    return html
+
+
+def personalize(html, liked_ids, owned_ids):
+    """Fill the per-viewer markers left in a shared grid."""
+    def replace(match):
+        if match.group(1):
+            return ' liked' if int(match.group(1)) in liked_ids else ''
+        return match.group(3) if int(match.group(2)) in owned_ids else ''
+    return MARKERS.sub(replace, html)
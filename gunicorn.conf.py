@@ -0,0 +1,71 @@
+# gunicorn.conf.py
+"""Gunicorn settings with a worker profile picked by ``GUNICORN_PROFILE``.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app stays synchronous WSGI. The profiles differ in how many requests
+one process serves while others wait on the database, the image host or
+Redis:
+
+* ``sync``: one request at a time per worker process. Concurrency is
+  ``WEB_CONCURRENCY`` and every process costs a full copy of the app.
+* ``gthread`` (default): ``GUNICORN_THREADS`` request threads per worker. A
+  thread waiting on I/O releases the GIL, so listings, uploads
+  (``JOB_MODE=inline``) and the job threads' Cloudinary calls overlap in one
+  process.
+* ``gevent``: ``GUNICORN_WORKER_CONNECTIONS`` greenlets per worker. Needs
+  the ``gevent`` package, and ``psycogreen`` so PostgreSQL queries yield.
+  CPU-bound work (password hashing, image processing with
+  ``IMAGE_PROCESS_WORKERS=0``) stalls every greenlet of its worker.
+
+Why the app is safe with threads and greenlets:
+
+* Flask-SQLAlchemy scopes its session to the app context. Each request and
+  each job has its own session and checks out its own connection, so the
+  pool must hold at least threads (or connections) + ``JOB_WORKERS`` per
+  process. Anything beyond that waits for a connection.
+* The Cloudinary SDK is configured once under a lock
+  (``storage.cloudinary_client``). Its uploads go through urllib3's
+  thread-safe connection pool.
+* Process-wide state is lock protected: the page cache, metrics, the
+  password hasher, the job pool and the image process pool. With gevent the
+  locks are monkey-patched into greenlet-aware ones.
+"""
+import multiprocessing
+import os
+
+PROFILES = ('sync', 'gthread', 'gevent')
+
+profile = os.getenv('GUNICORN_PROFILE', 'gthread')
+if profile not in PROFILES:
+    raise RuntimeError(f"GUNICORN_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}")
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '8000')}")
+cpus = multiprocessing.cpu_count()
+worker_class = profile
+
+if profile == 'sync':
+    workers = int(os.getenv('WEB_CONCURRENCY', cpus * 2 + 1))
+elif profile == 'gthread':
+    workers = int(os.getenv('WEB_CONCURRENCY', cpus))
+    threads = int(os.getenv('GUNICORN_THREADS', 8))
+else:
+    workers = int(os.getenv('WEB_CONCURRENCY', cpus))
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 100))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = timeout
+keepalive = 5
+# Requests are logged (with timings) by the app, see log.py and metrics.py
+accesslog = None
+
+
+def post_fork(server, worker):
+    if profile != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning('psycogreen is not installed: PostgreSQL queries block the whole gevent worker')
+    else:
+        patch_psycopg()
@@ -0,0 +1,350 @@
+# images.py
+"""Product image handling: staging uploads locally and handing them to the storage backend."""
+import logging
+import os
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import click
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+import cache
+from metrics import time_image_host
+from jobs import enqueue, handler, notify_workers
+from models import db, ImageTombstone, Job, Product, utcnow
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Delivery URLs are pure functions of (public_id, transformation)
+URL_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def _cached_url(public_id, options):
+    return get_storage().url(public_id, **dict(options))
+
+
+def image_url(public_id, **options):
+    """Delivery URL for ``public_id`` with the given transformation, memoized."""
+    return _cached_url(public_id, tuple(sorted(options.items())))
+
+
+def transforms_fingerprint():
+    """Short hash of the transformation settings, computed once per app."""
+    fingerprint = current_app.extensions.get('image_transforms_fingerprint')
+    if fingerprint is None:
+        config = current_app.config
+        settings = repr((get_storage().name, sorted(config['IMAGE_TRANSFORMS'].items()),
+                         config['IMAGE_SRCSET_WIDTHS']))
+        fingerprint = format(zlib.crc32(settings.encode()), 'x')
+        current_app.extensions['image_transforms_fingerprint'] = fingerprint
+    return fingerprint
+
+
+def build_image_urls(public_id):
+    """Every configured delivery URL for an image, plus a ``srcset`` for the thumbnail.
+
+    The result is stored on the product when its upload finishes; ``v``
+    records the transformation settings it was built with.
+    """
+    config = current_app.config
+    transforms = config['IMAGE_TRANSFORMS']
+    urls = {name: image_url(public_id, **options) for name, options in transforms.items()}
+
+    thumbnail = transforms['thumbnail']
+    aspect = thumbnail['height'] / thumbnail['width']
+    urls['srcset'] = ', '.join(
+        f"{image_url(public_id, **dict(thumbnail, width=width, height=round(width * aspect)))} {width}w"
+        for width in config['IMAGE_SRCSET_WIDTHS']
+    )
+    urls['v'] = transforms_fingerprint()
+    return urls
+
+
+def product_image_urls(product):
+    """Stored URLs for ``product``, rebuilt (through the LRU) if missing or outdated."""
+    if not product.image_file:
+        return None
+    urls = product.image_urls
+    if urls and urls.get('v') == transforms_fingerprint():
+        return urls
+    return build_image_urls(product.image_file)
+
+
+def staging_dir():
+    path = current_app.config['UPLOAD_STAGING_DIR']
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def stage_upload(file):
+    """Save an incoming upload to the staging directory and return its path.
+
+    Large uploads are already spooled to disk (``uploads.SpooledRequest``)
+    and ``FileStorage.save`` copies the stream in chunks, so the request
+    never holds the whole image in memory; the upload job picks the file up
+    later.
+    """
+    extension = os.path.splitext(file.filename)[1].lower()
+    path = os.path.join(staging_dir(), uuid.uuid4().hex + extension)
+    file.save(path)
+    return path
+
+
+def discard_staged(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def upload_photo(source):
+    """Store a file path or file object with the storage backend and return its public_id.
+
+    Raises on failure so the calling job can retry it.
+    """
+    with time_image_host('upload'):
+        return get_storage().put(source)
+
+
+# Most public IDs the Admin API's delete_resources accepts per call
+DELETE_BATCH_SIZE = 100
+
+
+def delete_photos(public_ids):
+    """Delete up to ``DELETE_BATCH_SIZE`` images in one call; returns the IDs that are gone.
+
+    Raises when the call itself fails so the calling job can retry it.
+    """
+    with time_image_host('delete'):
+        return get_storage().delete(public_ids)
+
+
+def list_photos():
+    """Yield every stored image under ``storage.UPLOAD_FOLDER`` as ``{'public_id', 'created_at', ...}``."""
+    return get_storage().list()
+
+
+def _upload_failed(product_id, path):
+    product = db.session.get(Product, product_id)
+    if product is not None:
+        product.image_status = 'failed'
+        db.session.commit()
+        cache.bump('catalog')
+    discard_staged(path)
+
+
+def find_image_by_hash(digest):
+    """public_id of an already stored image with this content hash, if any."""
+    return db.session.scalar(
+        db.select(Product.image_file)
+        .where(Product.image_hash == digest, Product.image_file.isnot(None))
+        .limit(1)
+    )
+
+
+def image_in_use(public_id):
+    return db.session.scalar(
+        db.select(Product.id).where(Product.image_file == public_id).limit(1)
+    ) is not None
+
+
+def _processing_settings():
+    config = current_app.config
+    return config['IMAGE_MAX_EDGE'], config['IMAGE_FORMAT'], config['IMAGE_QUALITY']
+
+
+def image_digest(path):
+    """Content hash of an image file, salted with the processing settings."""
+    # Pillow is only needed here, keep it out of the web process's import path
+    from imaging import content_hash, settings_salt
+
+    return content_hash(path, settings_salt(*_processing_settings()))
+
+
+def upload_image_file(path, upload=None):
+    """Preprocess the image at ``path`` and store the result; returns its public_id.
+
+    ``upload`` defaults to ``upload_photo``; the processed copy is removed
+    afterwards, the original is left alone.
+    """
+    from imaging import run_preprocess
+
+    config = current_app.config
+    processed = run_preprocess(path, *_processing_settings(), workers=config['IMAGE_PROCESS_WORKERS'],
+                               max_pixels=config['IMAGE_MAX_PIXELS'])
+    try:
+        return (upload or upload_photo)(processed)
+    finally:
+        discard_staged(processed)
+
+
+@handler('upload_image', on_failure=_upload_failed)
+def process_upload(product_id, path):
+    """Job: preprocess a staged upload, send it to the image host and attach it to its product.
+
+    Identical images (same bytes, same processing settings) are stored once:
+    when the content hash is already known its public_id is reused and
+    nothing is processed or uploaded.
+    """
+    if db.session.get(Product, product_id) is None:
+        # Product was deleted while the upload was queued
+        discard_staged(path)
+        return
+
+    digest = image_digest(path)
+    public_id = find_image_by_hash(digest)
+    if public_id is None:
+        public_id = upload_image_file(path)
+
+    product = db.session.get(Product, product_id, populate_existing=True, with_for_update=True)
+    if product is None:
+        discard_image(public_id)
+    else:
+        replaced = product.image_file
+        product.image_file = public_id
+        product.image_urls = build_image_urls(public_id)
+        product.image_hash = digest
+        product.image_status = 'ready'
+        if replaced and replaced != public_id:
+            discard_image(replaced)
+    db.session.commit()
+    cache.bump('catalog')
+    discard_staged(path)
+
+
+def schedule_delete_flush():
+    """Make sure a ``flush_image_deletes`` job is queued; joins the caller's transaction.
+
+    The job waits ``IMAGE_DELETE_FLUSH_DELAY`` seconds so deletes made close
+    together share API calls.
+    """
+    queued = db.session.scalar(
+        db.select(Job.id).where(Job.kind == 'flush_image_deletes', Job.status == 'queued').limit(1)
+    )
+    if queued is None:
+        job = enqueue('flush_image_deletes')
+        job.run_at = utcnow() + timedelta(seconds=current_app.config['IMAGE_DELETE_FLUSH_DELAY'])
+
+
+def discard_image(public_id):
+    """Mark an image as no longer needed; it is deleted later, in a batch.
+
+    Only writes a tombstone row in the caller's transaction, so the request
+    never waits on the image host and a delete can't be lost once committed.
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.execute(db.insert(ImageTombstone).values(public_id=public_id))
+    except IntegrityError:
+        # Already waiting to be deleted
+        pass
+    schedule_delete_flush()
+
+
+@handler('flush_image_deletes')
+def flush_image_deletes():
+    """Job: delete tombstoned images from the image host, ``DELETE_BATCH_SIZE`` per call.
+
+    Images a product uses again (deduplicated uploads) are spared. IDs the
+    host refuses to delete stay tombstoned, move to the back of the line and
+    fail the job so it is retried with backoff.
+    """
+    failures = 0
+    seen = set()
+    while True:
+        batch = db.session.scalars(
+            db.select(ImageTombstone.public_id)
+            .where(ImageTombstone.public_id.notin_(seen))
+            .order_by(ImageTombstone.attempts, ImageTombstone.created_at)
+            .limit(DELETE_BATCH_SIZE)
+        ).all()
+        if not batch:
+            break
+        seen.update(batch)
+        in_use = set(db.session.scalars(db.select(Product.image_file).where(Product.image_file.in_(batch))))
+        to_delete = [public_id for public_id in batch if public_id not in in_use]
+        gone = set(delete_photos(to_delete)) if to_delete else set()
+        db.session.execute(db.delete(ImageTombstone).where(ImageTombstone.public_id.in_(in_use | gone)))
+        failed = [public_id for public_id in to_delete if public_id not in gone]
+        if failed:
+            failures += len(failed)
+            db.session.execute(
+                db.update(ImageTombstone)
+                .where(ImageTombstone.public_id.in_(failed))
+                .values(attempts=ImageTombstone.attempts + 1, last_error='Not deleted by the image host')
+            )
+        db.session.commit()
+    if failures:
+        raise RuntimeError(f'{failures} image(s) could not be deleted')
+
+
+@handler('delete_image')
+def process_delete(public_id):
+    """Job queued by older releases: hand the image over to the batched deletes."""
+    discard_image(public_id)
+    db.session.commit()
+
+
+def reconcile_images(min_age, dry_run=False):
+    """Tombstone stored images that no product references; returns their public IDs.
+
+    Images younger than ``min_age`` are left alone since an upload job may
+    not have attached them to their product yet.
+    """
+    cutoff = utcnow() - min_age
+    orphans = []
+    page = []
+
+    def check(page):
+        ids = [resource['public_id'] for resource in page]
+        known = set(db.session.scalars(db.select(Product.image_file).where(Product.image_file.in_(ids))))
+        known.update(db.session.scalars(
+            db.select(ImageTombstone.public_id).where(ImageTombstone.public_id.in_(ids))
+        ))
+        orphans.extend(public_id for public_id in ids if public_id not in known)
+
+    for resource in list_photos():
+        created = datetime.fromisoformat(resource['created_at'].replace('Z', '+00:00'))
+        if created.replace(tzinfo=None) - created.utcoffset() < cutoff:
+            page.append(resource)
+        if len(page) >= 500:
+            check(page)
+            page = []
+    if page:
+        check(page)
+
+    if orphans and not dry_run:
+        for public_id in orphans:
+            discard_image(public_id)
+        db.session.commit()
+        notify_workers()
+    return orphans
+
+
+@click.group('images')
+def images_cli():
+    """Maintain the images stored on the image host."""
+
+
+@images_cli.command('flush-deletes')
+def flush_deletes_command():
+    """Delete every tombstoned image now."""
+    pending = db.session.scalar(db.select(db.func.count()).select_from(ImageTombstone))
+    flush_image_deletes()
+    click.echo(f'Processed {pending} tombstone(s)')
+
+
+@images_cli.command('reconcile')
+@click.option('--min-age-hours', default=24.0, show_default=True, help='Ignore images younger than this.')
+@click.option('--dry-run', is_flag=True, help='Only list the orphans.')
+def reconcile_command(min_age_hours, dry_run):
+    """Find images no product references and queue them for deletion (run from cron)."""
+    orphans = reconcile_images(timedelta(hours=min_age_hours), dry_run=dry_run)
+    for public_id in orphans:
+        click.echo(public_id)
+    click.echo(f"{len(orphans)} orphaned image(s){' found' if dry_run else ' queued for deletion'}", err=True)
@@ -0,0 +1,111 @@
+# imaging.py
+"""Image preprocessing run before uploads leave the server.
+
+Kept free of Flask and database imports so it can run in worker processes;
+decoding and re-encoding large photos is CPU bound and would otherwise hold
+the GIL in the process serving requests.
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+# Extension used for each output format
+FORMAT_EXTENSIONS = {'WEBP': '.webp', 'JPEG': '.jpg'}
+# Modes Image.reduce() works in; palette and bilevel images are left to thumbnail()
+REDUCIBLE_MODES = {'L', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'YCbCr', 'I', 'F'}
+# Largest image (width x height) preprocess_image accepts unless told otherwise
+MAX_PIXELS = 40_000_000
+
+# Pillow warns above this and refuses twice as much in any Image.open; its
+# default (~89 megapixels, ~180 refused) lets a small file decode to gigabytes
+Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def content_hash(path, salt=''):
+    """SHA-256 of a file's bytes, read in chunks; ``salt`` mixes in processing settings."""
+    digest = hashlib.sha256(salt.encode())
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def settings_salt(max_edge, fmt, quality):
+    # Same photo processed with different settings is a different asset
+    return f'{max_edge}:{fmt}:{quality}:'
+
+
+def preprocess_image(path, max_edge, fmt='WEBP', quality=82, max_pixels=MAX_PIXELS):
+    """Downscale, strip metadata and re-encode the image at ``path``.
+
+    Returns the path of the processed file, written next to the original.
+    EXIF orientation is applied to the pixels first, then all metadata is
+    dropped. Animated images keep only their first frame. Raises
+    ``ValueError`` for images of more than ``max_pixels`` pixels, checked
+    from the header before anything is decoded.
+    """
+    fmt = fmt.upper()
+    with Image.open(path) as image:
+        width, height = image.size
+        if width * height > max_pixels:
+            raise ValueError(f'Image of {width}x{height} pixels is over the limit of {max_pixels}')
+        # JPEGs decode straight at a reduced scale, so a huge photo never sits in memory at full size
+        reducible = image.mode in REDUCIBLE_MODES and max(image.size) >= 2 * max_edge
+        if image.draft(None, (max_edge, max_edge)) is None and reducible:
+            # Other formats decode in full; shrink by a whole factor first (cheap box filter)
+            # so the LANCZOS pass below works on a few megapixels at most
+            image = image.reduce(max(image.size) // max_edge)
+        image = ImageOps.exif_transpose(image)
+        if fmt == 'JPEG':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        output = os.path.splitext(path)[0] + '.processed' + FORMAT_EXTENSIONS[fmt]
+        # Saving without exif=/icc_profile= leaves the metadata behind
+        image.save(output, fmt, quality=quality, optimize=True)
+    return output
+
+
+def render_variant(path, output, width, height, crop, quality=82):
+    """Write a resized copy of ``path`` to ``output``, in the format its extension names.
+
+    ``crop`` follows Cloudinary's names: ``fill`` covers exactly
+    ``width`` x ``height`` and crops the overflow, ``limit`` only shrinks to
+    fit within the given bounds (either may be 0 for unbounded).
+    """
+    with Image.open(path) as image:
+        if crop == 'fill' and width and height:
+            image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            image = image.copy()
+            image.thumbnail((width or image.width, height or image.height), Image.LANCZOS)
+        if output.lower().endswith(('.jpg', '.jpeg')):
+            image = image.convert('RGB')
+        image.save(output, quality=quality, optimize=True)
+    return output
+
+
+def _executor(workers):
+    global _pool
+    # Job threads and request threads (gthread workers) may get here at once
+    with _pool_lock:
+        if _pool is None:
+            # Never fork: the parent runs job threads and holds DB connections
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def run_preprocess(path, max_edge, fmt, quality, workers, max_pixels=MAX_PIXELS):
+    """Run ``preprocess_image`` in the process pool, or inline when ``workers`` is 0."""
+    if not workers:
+        return preprocess_image(path, max_edge, fmt, quality, max_pixels)
+    return _executor(workers).submit(preprocess_image, path, max_edge, fmt, quality, max_pixels).result()
@@ -0,0 +1,209 @@
+# importer.py
+"""``flask import-products``: bulk-load a catalogue from a manifest and an image folder.
+
+The manifest (CSV with a header row, or JSON Lines) is streamed one batch at
+a time; each row needs ``name``, ``price`` and ``image`` (a path relative to
+the image folder) and may name an ``owner`` username. For each batch the
+images are hashed, deduplicated against what is already stored and what
+this import uploaded before, then processed and uploaded by a bounded thread
+pool through the same code path as the upload job. The batch's products
+are written with one bulk INSERT and the checkpoint file records how many
+rows are done, so an interrupted import continues where it stopped (a
+crash between a commit and its checkpoint repeats that one batch).
+
+Processed copies are written next to the originals while they upload, so
+the image folder must be writable. Rows that fail are appended to an
+errors file with their 1-based row number.
+"""
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import click
+from flask import current_app
+
+import cache
+from images import build_image_urls, image_digest, upload_image_file
+from models import db, Product, User
+from storage import LocalStorage
+
+
+def read_manifest(path):
+    """Yield manifest rows as dicts, streaming the file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)['done']
+    except FileNotFoundError:
+        return 0
+
+
+def save_checkpoint(path, done):
+    # Write-then-rename so a crash never leaves a half-written checkpoint
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'done': done}, f)
+    os.replace(path + '.tmp', path)
+
+
+class Importer:
+    def __init__(self, app, image_dir, default_owner_id, workers, upload=None):
+        self.app = app
+        self.image_dir = image_dir
+        self.default_owner_id = default_owner_id
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix='import')
+        self.upload = upload
+        self.known = {}  # content hash -> public_id uploaded by this import
+        self.owners = {}  # username -> user id
+        self.stats = {'imported': 0, 'uploaded': 0, 'reused': 0, 'failed': 0}
+
+    def _in_app(self, func, *args):
+        # Pool threads need their own app context for config and the session
+        with self.app.app_context():
+            return func(*args)
+
+    def _map(self, func, items):
+        futures = [self.pool.submit(self._in_app, func, item) for item in items]
+        results = []
+        for future in futures:
+            try:
+                results.append((future.result(), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+    def _owner_id(self, row):
+        username = (row.get('owner') or '').strip()
+        if not username:
+            return self.default_owner_id
+        if username not in self.owners:
+            self.owners[username] = db.session.scalar(db.select(User.id).where(User.username == username))
+        if self.owners[username] is None:
+            raise ValueError(f'unknown owner {username!r}')
+        return self.owners[username]
+
+    def import_batch(self, rows, first_row, errors):
+        """Upload the images of ``rows`` and insert their products; returns rows inserted."""
+        paths = [os.path.join(self.image_dir, (row.get('image') or '').strip()) for row in rows]
+        digests = self._map(image_digest, paths)
+
+        wanted = {digest for digest, error in digests if digest and digest not in self.known}
+        if wanted:
+            self.known.update(db.session.execute(
+                db.select(Product.image_hash, Product.image_file)
+                .where(Product.image_hash.in_(wanted), Product.image_file.isnot(None))
+            ).all())
+
+        # One upload per distinct new image, even if several rows share it
+        to_upload = {}
+        for path, (digest, error) in zip(paths, digests):
+            if digest and digest not in self.known:
+                to_upload.setdefault(digest, path)
+        for (digest, path), (public_id, error) in zip(
+                to_upload.items(), self._map(lambda path: upload_image_file(path, self.upload), to_upload.values())):
+            if public_id:
+                self.known[digest] = public_id
+                self.stats['uploaded'] += 1
+
+        products = []
+        for offset, (row, (digest, error)) in enumerate(zip(rows, digests)):
+            try:
+                if error:
+                    raise error
+                public_id = self.known.get(digest)
+                if public_id is None:
+                    raise RuntimeError('image upload failed')
+                if digest not in to_upload:
+                    self.stats['reused'] += 1
+                products.append({
+                    'name': row['name'].strip(),
+                    'price': float(row['price']),
+                    'user_id': self._owner_id(row),
+                    'image_file': public_id,
+                    'image_urls': build_image_urls(public_id),
+                    'image_hash': digest,
+                    'image_status': 'ready',
+                })
+            except Exception as e:
+                self.stats['failed'] += 1
+                errors.write(json.dumps({'row': first_row + offset, 'data': row, 'error': str(e)}) + '\n')
+
+        if products:
+            db.session.execute(db.insert(Product), products)
+        db.session.commit()
+        self.stats['imported'] += len(products)
+        return len(products)
+
+
+@click.command('import-products')
+@click.argument('manifest', type=click.Path(exists=True, dir_okay=False))
+@click.option('--images', 'image_dir', required=True, type=click.Path(exists=True, file_okay=False),
+              help='Folder the manifest\'s image paths are relative to.')
+@click.option('--owner', required=True, help='Username owning rows without an "owner" column.')
+@click.option('--workers', default=8, show_default=True, help='Concurrent image uploads.')
+@click.option('--batch-size', default=500, show_default=True, help='Rows per bulk INSERT and checkpoint.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), help='Default: MANIFEST.checkpoint')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help='Default: MANIFEST.errors.jsonl')
+@click.option('--offline', type=click.Path(file_okay=False),
+              help='Store images in this folder with the local storage driver, whatever STORAGE_BACKEND says.')
+def import_products_command(manifest, image_dir, owner, workers, batch_size, checkpoint, errors_path, offline):
+    """Bulk-import products from a CSV or JSONL MANIFEST."""
+    owner_id = db.session.scalar(db.select(User.id).where(User.username == owner))
+    if owner_id is None:
+        raise click.ClickException(f'No user named {owner!r}')
+    checkpoint = checkpoint or manifest + '.checkpoint'
+    errors_path = errors_path or manifest + '.errors.jsonl'
+
+    done = load_checkpoint(checkpoint)
+    if done:
+        click.echo(f'Resuming after {done} rows (checkpoint {checkpoint})', err=True)
+    app = current_app._get_current_object()
+    if offline:
+        # Stored URLs then point at MEDIA_URL_PREFIX; serve the folder as MEDIA_ROOT
+        app.extensions['storage'] = LocalStorage.from_config(app.config, root=offline)
+    importer = Importer(app, image_dir, owner_id, workers)
+    rows = read_manifest(manifest)
+    for _ in islice(rows, done):
+        pass
+
+    started = time.perf_counter()
+    processed = 0
+    try:
+        with open(errors_path, 'a', encoding='utf-8') as errors:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                importer.import_batch(batch, done + 1, errors)
+                done += len(batch)
+                processed += len(batch)
+                save_checkpoint(checkpoint, done)
+                elapsed = time.perf_counter() - started
+                stats = importer.stats
+                click.echo(f"{done} rows: {stats['imported']} imported, {stats['uploaded']} uploaded, "
+                           f"{stats['reused']} reused, {stats['failed']} failed; "
+                           f"{processed / elapsed:.1f} rows/s", err=True)
+    finally:
+        importer.pool.shutdown()
+        if importer.stats['imported']:
+            cache.bump('catalog')
+
+    stats = importer.stats
+    elapsed = time.perf_counter() - started
+    click.echo(json.dumps(dict(stats, rows=processed, seconds=round(elapsed, 2),
+                               rows_per_second=round(processed / elapsed, 1) if elapsed else None)))
+    if stats['failed']:
+        click.echo(f"{stats['failed']} rows failed, see {errors_path}", err=True)
+        sys.exit(1)
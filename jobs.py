@@ -0,0 +1,227 @@
+# jobs.py
+"""Durable background jobs stored in the application database.
+
+Views enqueue work (image uploads and deletes) in the same transaction as the
+row it belongs to, then call ``notify_workers()``. How the job gets executed
+depends on ``JOB_MODE``:
+
+* ``thread``   - a small pool of worker threads inside the web process
+* ``inline``   - run after the response has been sent (serverless friendly)
+* ``external`` - left for ``flask jobs work`` running elsewhere
+
+Failed jobs are retried with exponential backoff up to ``JOB_MAX_ATTEMPTS``.
+"""
+import logging
+import random
+import threading
+import time
+from datetime import timedelta
+
+import click
+from flask import after_this_request, current_app, g
+
+from models import db, Job, utcnow
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def handler(kind, on_failure=None):
+    """Register ``func(**payload)`` as the handler for jobs of ``kind``.
+
+    ``on_failure(**payload)`` is called once the job has run out of attempts;
+    it runs in a fresh transaction and must commit its own changes.
+    """
+    def register(func):
+        _handlers[kind] = (func, on_failure)
+        return func
+    return register
+
+
+def enqueue(kind, **payload):
+    """Add a job to the current session; it is committed with the caller's transaction."""
+    job = Job(kind=kind, payload=payload)
+    db.session.add(job)
+    return job
+
+
+def backoff_delay(attempts, base):
+    # base, 2*base, 4*base, ... with some jitter so retries don't line up
+    return base * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+
+
+def claim_next():
+    """Atomically move the next due job to running and return it.
+
+    A claimed job's ``run_at`` becomes its lease expiry, so work abandoned by a
+    crashed worker is picked up again once ``JOB_LEASE_SECONDS`` have passed.
+    """
+    lease = timedelta(seconds=current_app.config['JOB_LEASE_SECONDS'])
+    while True:
+        now = utcnow()
+        candidate = db.session.execute(
+            db.select(Job.id, Job.status)
+            .where(Job.status.in_(('queued', 'running')), Job.run_at <= now)
+            .order_by(Job.run_at, Job.id)
+            .limit(1)
+        ).first()
+        if candidate is None:
+            return None
+        claimed = db.session.execute(
+            db.update(Job)
+            .where(Job.id == candidate.id, Job.status == candidate.status, Job.run_at <= now)
+            .values(status='running', attempts=Job.attempts + 1, run_at=now + lease)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, candidate.id)
+        # Another worker got there first; look for the next one
+
+
+def run_job(job):
+    func, on_failure = _handlers[job.kind]
+    job_id, payload = job.id, dict(job.payload)
+    try:
+        func(**payload)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.last_error = repr(e)
+        config = current_app.config
+        gave_up = job.attempts >= config['JOB_MAX_ATTEMPTS']
+        if gave_up:
+            job.status = 'failed'
+            logger.exception("Job %s (%s) failed permanently", job_id, job.kind)
+        else:
+            job.status = 'queued'
+            job.run_at = utcnow() + timedelta(seconds=backoff_delay(job.attempts, config['JOB_RETRY_BACKOFF']))
+            logger.warning("Job %s (%s) failed, retrying at %s: %s", job_id, job.kind, job.run_at, e)
+        db.session.commit()
+        if gave_up and on_failure:
+            on_failure(**payload)
+        return False
+    db.session.delete(db.session.get(Job, job_id))
+    db.session.commit()
+    return True
+
+
+def run_pending(limit=None):
+    """Run due jobs until the queue is empty (or ``limit`` is reached); returns how many ran."""
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
+
+
+class WorkerPool:
+    """Daemon threads that drain the job table, woken by ``notify()`` or a poll timer."""
+
+    def __init__(self, app):
+        self.app = app
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    @property
+    def started(self):
+        return bool(self._threads)
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.app.config['JOB_WORKERS']):
+                thread = threading.Thread(target=self._loop, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def notify(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stop.clear()
+
+    def _loop(self):
+        poll_interval = self.app.config['JOB_POLL_INTERVAL']
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    run_pending()
+            except Exception:
+                logger.exception("Job worker crashed; restarting loop")
+                time.sleep(poll_interval)
+            self._wake.wait(poll_interval)
+            self._wake.clear()
+
+
+def notify_workers():
+    """Tell whichever executor ``JOB_MODE`` selects that new jobs were committed."""
+    mode = current_app.config['JOB_MODE']
+    if mode == 'thread':
+        pool = current_app.extensions['jobs']
+        pool.start()
+        pool.notify()
+    elif mode == 'inline' and not g.get('_jobs_scheduled'):
+        g._jobs_scheduled = True
+        app = current_app._get_current_object()
+
+        @after_this_request
+        def run_after_response(response):
+            def run():
+                with app.app_context():
+                    run_pending()
+            response.call_on_close(run)
+            return response
+
+
+@click.group('jobs')
+def jobs_cli():
+    """Inspect and run background jobs."""
+
+
+@jobs_cli.command('work')
+@click.option('--once', is_flag=True, help='Exit once the queue is empty.')
+def work_command(once):
+    """Process jobs in the foreground."""
+    poll_interval = current_app.config['JOB_POLL_INTERVAL']
+    while True:
+        ran = run_pending()
+        if ran:
+            click.echo(f'Ran {ran} job(s)')
+        if once:
+            break
+        time.sleep(poll_interval)
+
+
+@jobs_cli.command('retry-failed')
+def retry_failed_command():
+    """Put permanently failed jobs back on the queue."""
+    count = db.session.execute(
+        db.update(Job).where(Job.status == 'failed').values(status='queued', attempts=0, run_at=utcnow())
+    ).rowcount
+    db.session.commit()
+    click.echo(f'Requeued {count} job(s)')
+
+
+def init_app(app):
+    pool = WorkerPool(app)
+    app.extensions['jobs'] = pool
+    app.cli.add_command(jobs_cli)
+
+    if app.config['JOB_MODE'] == 'thread':
+        # Start lazily so CLI commands (migrations etc.) never spawn workers
+        @app.before_request
+        def start_job_workers():
+            if not pool.started:
+                pool.start()
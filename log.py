@@ -0,0 +1,56 @@
+# log.py
+"""Application logging: levelled, one line per record, optionally JSON."""
+import json
+import logging
+import sys
+import time
+
+from flask import g, has_request_context, request, session
+
+# LogRecord attributes that are not user-supplied ``extra`` fields
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with request context and any ``extra`` fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if has_request_context():
+            entry['method'] = request.method
+            entry['path'] = request.path
+            entry['user_id'] = session.get('user_id')
+            if 'request_id' in g:
+                entry['request_id'] = g.request_id
+        entry.update({key: value for key, value in vars(record).items() if key not in _RESERVED})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable line with any ``extra`` fields appended as key=value."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(name)s] %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        extras = {key: value for key, value in vars(record).items() if key not in _RESERVED}
+        if extras:
+            line += ' ' + ' '.join(f'{key}={value!r}' for key, value in extras.items())
+        return line
+
+
+def configure_logging(app):
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if app.config['LOG_FORMAT'] == 'json' else TextFormatter())
+    root = logging.getLogger()
+    # Replace rather than add, so re-imports (tests, reloader) don't duplicate output
+    root.handlers = [handler]
+    root.setLevel(app.config['LOG_LEVEL'])
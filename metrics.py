@@ -0,0 +1,259 @@
+# metrics.py
+"""Request, database and image-host metrics in Prometheus text format.
+
+A small in-process registry (no extra dependency) holding counters and
+histograms; ``GET /metrics`` renders it for scrapers sending
+``METRICS_TOKEN`` (without a token it is a 404 outside debug mode). Each
+worker process keeps its own numbers, so scrape every process or run one
+worker per target.
+
+Per request, SQLAlchemy cursor events count statements and their time; the
+totals feed histograms, a ``Server-Timing`` header and the slow-request log,
+which also records the query plan of the slowest listing query, explained
+on the engine (primary or replica) it ran on.
+"""
+import bisect
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import Blueprint, Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_value(self, key, value):
+        return [f'{self.name}{self._format_labels(key)} {value}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_value(self, key, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{self.name}_bucket{self._format_labels(key, [("le", le)])} {cumulative}')
+        lines.append(f'{self.name}_sum{self._format_labels(key)} {total}')
+        lines.append(f'{self.name}_count{self._format_labels(key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text, labelnames=()):
+    return REGISTRY.register(Counter(name, help_text, labelnames))
+
+
+def histogram(name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, help_text, labelnames, buckets))
+
+
+REQUESTS = counter('http_requests_total', 'HTTP requests handled.', ('method', 'endpoint', 'status'))
+REQUEST_SECONDS = histogram('http_request_duration_seconds', 'Time spent handling a request.', ('method', 'endpoint'))
+SQL_QUERIES = histogram('db_queries_per_request', 'SQL statements executed per request.', ('endpoint',), COUNT_BUCKETS)
+SQL_SECONDS = histogram('db_query_seconds_per_request', 'Total SQL time per request.', ('endpoint',))
+IMAGE_HOST_SECONDS = histogram('image_host_operation_seconds', 'Image host call duration.', ('operation', 'outcome'))
+
+
+@contextmanager
+def time_image_host(operation):
+    """Time an image host call, labelled with whether it raised."""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        IMAGE_HOST_SECONDS.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+
+
+# --- SQL accounting ----------------------------------------------------------
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_count' in g:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not (has_request_context() and 'sql_count' in g):
+        return
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    g.sql_count += 1
+    g.sql_seconds += elapsed
+    # Remember the slowest read of products as the query to EXPLAIN if the request is slow
+    if g.get('capture_plan') and statement.lstrip().upper().startswith('SELECT') and 'products' in statement:
+        if elapsed > g.slowest_query[0]:
+            g.slowest_query = (elapsed, statement, parameters, conn.engine)
+
+
+def explain(statement, parameters, engine=None):
+    """Query plan of an already executed statement, as text lines.
+
+    Runs on ``engine`` (the one the statement ran on, a replica perhaps) or
+    by default on the session's connection.
+    """
+    if engine is not None:
+        with engine.connect() as connection:
+            return _explain(connection, statement, parameters)
+    return _explain(db.session.connection(), statement, parameters)
+
+
+def _explain(connection, statement, parameters):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = connection.exec_driver_sql(prefix + statement, parameters).fetchall()
+    return [' | '.join(str(column) for column in row) for row in rows]
+
+
+# --- Flask wiring ------------------------------------------------------------
+
+bp = Blueprint('metrics', __name__)
+
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    token = current_app.config['METRICS_TOKEN']
+    if not token and not current_app.debug:
+        abort(404)  # Route and query timings aren't for the public
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _start_request():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+    g.sql_count = 0
+    g.sql_seconds = 0.0
+    g.capture_plan = (
+        current_app.config['SLOW_REQUEST_MS'] > 0
+        and request.endpoint in current_app.config['SLOW_REQUEST_EXPLAIN_ENDPOINTS']
+    )
+    g.slowest_query = (0.0, None, None, None)
+
+
+def _finish_request(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unmatched'
+    REQUESTS.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+    REQUEST_SECONDS.observe(elapsed, method=request.method, endpoint=endpoint)
+    SQL_QUERIES.observe(g.sql_count, endpoint=endpoint)
+    SQL_SECONDS.observe(g.sql_seconds, endpoint=endpoint)
+    response.headers['Server-Timing'] = (
+        f'app;dur={elapsed * 1000:.1f}, db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_count} queries"'
+    )
+
+    slow_ms = current_app.config['SLOW_REQUEST_MS']
+    if slow_ms and elapsed * 1000 >= slow_ms:
+        details = {
+            'endpoint': endpoint, 'status': response.status_code, 'duration_ms': round(elapsed * 1000, 1),
+            'sql_count': g.sql_count, 'sql_ms': round(g.sql_seconds * 1000, 1),
+        }
+        _, statement, parameters, engine = g.slowest_query
+        if statement:
+            try:
+                details['query'] = statement
+                details['plan'] = explain(statement, parameters, engine)
+            except Exception as e:
+                details['plan_error'] = repr(e)
+        logger.warning('Slow request %s %s', request.method, request.path, extra=details)
+    return response
+
+
+def init_app(app):
+    if app.config['METRICS_ENABLED']:
+        app.register_blueprint(bp)
+        app.before_request(_start_request)
+        app.after_request(_finish_request)
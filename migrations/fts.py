@@ -0,0 +1,38 @@
+"""SQLite full-text search DDL shared by the migrations and ``search.py``.
+
+``products_fts`` (revision 0003) is kept in sync with ``products`` by
+triggers. ``batch_alter_table`` on SQLite rebuilds ``products`` for an
+ALTER or DROP COLUMN, and the triggers go with the old table: any migration
+that batch-alters ``products`` calls ``restore_sqlite_triggers()`` after it.
+``search.py`` runs the same statements after ``db.create_all()``.
+"""
+from alembic import op
+
+SQLITE_FTS_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+    "name, content='products', content_rowid='id', tokenize='trigram')"
+)
+
+SQLITE_FTS_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name); END",
+]
+
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS products_fts_au",
+    "DROP TRIGGER IF EXISTS products_fts_ad",
+    "DROP TRIGGER IF EXISTS products_fts_ai",
+    "DROP TABLE IF EXISTS products_fts",
+]
+
+
+def restore_sqlite_triggers():
+    """Recreate the FTS triggers on SQLite (no-op elsewhere)."""
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_FTS_TRIGGERS:
+            op.execute(statement)
@@ -0,0 +1,50 @@
+"""baseline schema as created by db.create_all()
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+Databases that were bootstrapped with ``db.create_all()`` already have these
+tables; mark them with ``flask db stamp 0001`` before running ``flask db upgrade``.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=80), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password', sa.String(length=200), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username'),
+    )
+    columns = [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('image_file', sa.String(length=100), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    ]
+    if op.get_bind().dialect.name == 'postgresql':
+        # ARRAY only exists on Postgres; it is replaced by the likes table in 0002
+        columns.insert(3, sa.Column('like_count', sa.ARRAY(sa.Integer()), nullable=True))
+    op.create_table('products', *columns)
+
+
+def downgrade():
+    op.drop_table('products')
+    op.drop_table('user')
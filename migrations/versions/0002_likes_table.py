@@ -0,0 +1,68 @@
+"""replace products.like_count array with a likes table and counter
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _has_like_array():
+    columns = sa.inspect(op.get_bind()).get_columns('products')
+    return any(column['name'] == 'like_count' for column in columns)
+
+
+def upgrade():
+    op.create_table(
+        'likes',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'product_id'),
+    )
+    op.create_index('ix_likes_product_id', 'likes', ['product_id'])
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(sa.Column('likes_count', sa.Integer(), nullable=False, server_default='0'))
+
+    if _has_like_array():
+        # Backfill: one row per (user, product) pair, skipping duplicates and
+        # IDs of users that no longer exist, then derive the counter from it.
+        op.execute("""
+            INSERT INTO likes (user_id, product_id)
+            SELECT DISTINCT liked.user_id, p.id
+            FROM products p
+            CROSS JOIN LATERAL unnest(p.like_count) AS liked(user_id)
+            JOIN "user" u ON u.id = liked.user_id
+        """)
+        op.execute("""
+            UPDATE products p
+            SET likes_count = l.total
+            FROM (SELECT product_id, count(*) AS total FROM likes GROUP BY product_id) l
+            WHERE l.product_id = p.id
+        """)
+        op.drop_column('products', 'like_count')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.add_column('products', sa.Column('like_count', sa.ARRAY(sa.Integer()), nullable=True))
+        op.execute("""
+            UPDATE products p
+            SET like_count = l.user_ids
+            FROM (SELECT product_id, array_agg(user_id) AS user_ids FROM likes GROUP BY product_id) l
+            WHERE l.product_id = p.id
+        """)
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('likes_count')
+    op.drop_index('ix_likes_product_id', table_name='likes')
+    op.drop_table('likes')
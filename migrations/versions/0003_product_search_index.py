@@ -0,0 +1,38 @@
+"""indexed product name search (pg_trgm on Postgres, FTS5 on SQLite)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 10:15:00.000000
+
+"""
+from alembic import op
+
+from migrations.fts import SQLITE_FTS_DROP, SQLITE_FTS_TABLE, SQLITE_FTS_TRIGGERS
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE INDEX ix_products_name_trgm ON products USING gin (name gin_trgm_ops)')
+    elif dialect == 'sqlite':
+        for statement in [SQLITE_FTS_TABLE, *SQLITE_FTS_TRIGGERS]:
+            op.execute(statement)
+        # Index the rows that existed before the triggers
+        op.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_products_name_trgm')
+    elif dialect == 'sqlite':
+        for statement in SQLITE_FTS_DROP:
+            op.execute(statement)
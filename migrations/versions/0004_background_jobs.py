@@ -0,0 +1,48 @@
+"""background job table and product image status
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.fts import restore_sqlite_triggers
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_jobs_status_run_at', 'jobs', ['status', 'run_at'])
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(sa.Column('image_status', sa.String(length=10), nullable=False, server_default='ready'))
+        batch_op.alter_column('image_file', existing_type=sa.String(length=100), nullable=True)
+    restore_sqlite_triggers()
+
+
+def downgrade():
+    op.execute("DELETE FROM products WHERE image_file IS NULL")
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.alter_column('image_file', existing_type=sa.String(length=100), nullable=False)
+        batch_op.drop_column('image_status')
+    restore_sqlite_triggers()
+    op.drop_index('ix_jobs_status_run_at', table_name='jobs')
+    op.drop_table('jobs')
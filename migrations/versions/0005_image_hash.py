@@ -0,0 +1,30 @@
+"""content hash for deduplicating product images
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 11:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.fts import restore_sqlite_triggers
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('products', sa.Column('image_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_products_image_hash', 'products', ['image_hash'])
+
+
+def downgrade():
+    op.drop_index('ix_products_image_hash', table_name='products')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('image_hash')
+    restore_sqlite_triggers()
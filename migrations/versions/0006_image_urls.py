@@ -0,0 +1,31 @@
+"""precomputed image delivery URLs
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 12:30:00.000000
+
+Existing rows are left empty and fall back to the in-process URL cache
+until their image is replaced.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.fts import restore_sqlite_triggers
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('products', sa.Column('image_urls', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('image_urls')
+    restore_sqlite_triggers()
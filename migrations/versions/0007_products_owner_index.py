@@ -0,0 +1,23 @@
+"""composite (user_id, id) index for the owner-first listing
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_products_user_id_id', 'products', ['user_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_products_user_id_id', table_name='products')
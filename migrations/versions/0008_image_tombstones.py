@@ -0,0 +1,31 @@
+"""tombstones for batched image deletes
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'image_tombstones',
+        sa.Column('public_id', sa.String(length=100), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('public_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('image_tombstones')
@@ -0,0 +1,58 @@
+"""like timestamps, trending scores and the listing sort indexes
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 18:00:00.000000
+
+Existing likes get the migration time, so every product starts with
+``trending_score = likes_count`` at that anchor.
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.fts import restore_sqlite_triggers
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    op.add_column('likes', sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.execute(sa.text('UPDATE likes SET created_at = :now').bindparams(now=now))
+    with op.batch_alter_table('likes') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_index('ix_likes_created_at', 'likes', ['created_at'])
+
+    op.add_column('products', sa.Column('trending_score', sa.Float(), nullable=False, server_default='0'))
+    op.execute('UPDATE products SET trending_score = likes_count')
+    op.create_index('ix_products_likes_count_id', 'products', ['likes_count', 'id'])
+    op.create_index('ix_products_trending_score_id', 'products', ['trending_score', 'id'])
+
+    trending_state = op.create_table(
+        'trending_state',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('anchor', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.bulk_insert(trending_state, [{'id': 1, 'anchor': now}])
+
+
+def downgrade():
+    op.drop_table('trending_state')
+    op.drop_index('ix_products_trending_score_id', table_name='products')
+    op.drop_index('ix_products_likes_count_id', table_name='products')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('trending_score')
+    restore_sqlite_triggers()
+    op.drop_index('ix_likes_created_at', table_name='likes')
+    with op.batch_alter_table('likes') as batch_op:
+        batch_op.drop_column('created_at')
@@ -0,0 +1,38 @@
+"""cache versions shared by every process
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 20:00:00.000000
+
+The counters start at the migration time in seconds, past anything an
+in-process counter reached before, so ETags handed out until now don't
+match the new ones.
+
+"""
+import time
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    cache_versions = op.create_table(
+        'cache_versions',
+        sa.Column('namespace', sa.String(length=20), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('modified_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('namespace'),
+    )
+    start = int(time.time())
+    op.bulk_insert(cache_versions, [{'namespace': namespace, 'version': start} for namespace in ('catalog', 'likes')])
+
+
+def downgrade():
+    op.drop_table('cache_versions')
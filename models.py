@@ -1,9 +1,17 @@
 # <<<<<<< HEAD
 # models.py
 
+import math
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from database import RoutingSession
 
-db = SQLAlchemy()  # Initialize SQLAlchemy
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # Reads may go to a replica, see database.py
 
 
 class User(db.Model):
@@ -14,15 +22,208 @@ class User(db.Model):
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        # Serves one owner's products newest first (the first range of the /home listing)
+        db.Index('ix_products_user_id_id', 'user_id', 'id'),
+        # The "most liked" and "trending" sorts, read backwards
+        db.Index('ix_products_likes_count_id', 'likes_count', 'id'),
+        db.Index('ix_products_trending_score_id', 'trending_score', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     price = db.Column(db.Float, nullable=False)
-    like_count = db.Column(db.ARRAY(db.Integer), default=list)  # Array for user IDs who liked the product
+    likes_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Denormalized count of rows in likes
+    trending_score = db.Column(db.Float, nullable=False, default=0, server_default='0')  # Time-decayed likes, see TrendingState
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # Foreign key to User model
-    image_file = db.Column(db.String(100), nullable=False)  # Field for storing image filenames
+    image_file = db.Column(db.String(100), nullable=True)  # Image host public_id; empty until the upload job finishes
+    image_urls = db.Column(db.JSON)  # Delivery URLs per transformation, built once in images.build_image_urls
+    image_hash = db.Column(db.String(64), index=True)  # Content hash used to deduplicate uploads
+    image_status = db.Column(db.String(10), nullable=False, default='ready', server_default='ready')  # pending | ready | failed
 
     user = db.relationship('User', backref='products')  # Relationship to User model
 
     def __repr__(self):
         return f'<Product {self.name}>'
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Like(db.Model):
+    __tablename__ = 'likes'
+
+    # The composite primary key doubles as the unique (user_id, product_id) constraint
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
+
+    def __repr__(self):
+        return f'<Like user={self.user_id} product={self.product_id}>'
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (db.Index('ix_jobs_status_run_at', 'status', 'run_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # Name of the handler registered in jobs.py
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued | running | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_at = db.Column(db.DateTime, nullable=False, default=utcnow)  # Not picked up before this time (UTC)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+
+class ImageTombstone(db.Model):
+    """An image host asset no product needs any more, waiting for a batched delete."""
+    __tablename__ = 'image_tombstones'
+
+    public_id = db.Column(db.String(100), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # Failed delete attempts so far
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    def __repr__(self):
+        return f'<ImageTombstone {self.public_id}>'
+
+
+class TrendingState(db.Model):
+    """The single row holding the time ``products.trending_score`` is expressed at.
+
+    ``trending_score`` is the sum over a product's likes of
+    ``exp(-(anchor - liked_at) / tau)`` with ``tau`` derived from
+    ``TRENDING_HALF_LIFE_HOURS``. Every score shares the anchor, so a like made
+    later simply adds ``exp((liked_at - anchor) / tau)`` and the order stays
+    exact between refreshes; ``flask refresh-trending`` recomputes the scores
+    at a new anchor so the numbers stay small (see trending.py).
+    """
+    __tablename__ = 'trending_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    anchor = db.Column(db.DateTime, nullable=False)
+
+
+# A like's trending weight is at most exp(this) (~1e260), leaving room to sum them in a float
+MAX_WEIGHT_EXPONENT = 600
+
+# Namespaces versioned by cache.py; each has a row in cache_versions
+CACHE_NAMESPACES = ('catalog', 'likes')
+
+
+class CacheVersion(db.Model):
+    """Version of a cached namespace, shared by every process using the database (see cache.py)."""
+    __tablename__ = 'cache_versions'
+
+    namespace = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    modified_at = db.Column(db.DateTime)  # Time of the last bump
+
+
+@event.listens_for(CacheVersion.__table__, 'after_create')
+def _add_cache_namespaces(table, connection, **kwargs):
+    # db.create_all() databases; the migration adds the rows otherwise
+    connection.execute(table.insert(), [{'namespace': namespace, 'version': 0} for namespace in CACHE_NAMESPACES])
+
+
+def trending_tau():
+    return current_app.config['TRENDING_HALF_LIFE_HOURS'] * 3600 / math.log(2)
+
+
+def trending_weight(liked_at, anchor):
+    """Contribution of a like made at ``liked_at`` to a score expressed at ``anchor``."""
+    if liked_at is None or anchor is None:
+        return 1.0  # Not refreshed yet: every like weighs the same
+    # Capped so an anchor nobody moved can't overflow; _add_like queues a refresh long before
+    return math.exp(min((liked_at - anchor).total_seconds() / trending_tau(), MAX_WEIGHT_EXPONENT))
+
+
+def trending_anchor():
+    """The current anchor, share-locked until commit so a refresh can't move it under a like's delta."""
+    return db.session.scalar(
+        db.select(TrendingState.anchor).where(TrendingState.id == 1).with_for_update(read=True)
+    )
+
+
+def _add_like(product_id, user_id):
+    """Insert the like; returns ``(count delta, trending score delta)``."""
+    liked_at = utcnow()
+    try:
+        with db.session.begin_nested():
+            db.session.execute(db.insert(Like).values(user_id=user_id, product_id=product_id, created_at=liked_at))
+    except IntegrityError:
+        # A concurrent request inserted the same like first; it already counted it
+        return 0, 0.0
+    anchor = trending_anchor()
+    half_life = timedelta(hours=current_app.config['TRENDING_HALF_LIFE_HOURS'])
+    if anchor is not None and liked_at - anchor > half_life * current_app.config['TRENDING_REBASE_HALF_LIVES']:
+        # New likes weigh 2 ** (half-lives since the anchor); move it to now before they get huge
+        from trending import schedule_refresh
+
+        schedule_refresh()
+    return 1, trending_weight(liked_at, anchor)
+
+
+def _remove_like(product_id, user_id):
+    """Delete the like; returns ``(count delta, trending score delta)``."""
+    removed = db.session.execute(
+        db.delete(Like).where(Like.user_id == user_id, Like.product_id == product_id).returning(Like.created_at)
+    ).scalars().all()
+    if not removed:
+        return 0, 0.0
+    anchor = trending_anchor()
+    return -len(removed), -sum(trending_weight(liked_at, anchor) for liked_at in removed)
+
+
+def _apply_like_delta(product_id, delta, score_delta):
+    return db.session.execute(
+        db.update(Product)
+        .where(Product.id == product_id)
+        .values(likes_count=Product.likes_count + delta, trending_score=Product.trending_score + score_delta)
+        .returning(Product.likes_count)
+    ).scalar_one()
+
+
+def toggle_like(product_id, user_id):
+    """Flip a user's like on a product and return ``(liked, likes_count)``.
+
+    Works with single INSERT/DELETE statements against ``likes`` and an
+    in-place increment of ``products.likes_count`` and ``trending_score`` so
+    concurrent clicks never overwrite each other. The caller is responsible
+    for committing.
+    """
+    delta, score_delta = _remove_like(product_id, user_id)
+    liked = not delta
+    if liked:
+        delta, score_delta = _add_like(product_id, user_id)
+    return liked, _apply_like_delta(product_id, delta, score_delta)
+
+
+def set_like(product_id, user_id, liked):
+    """Like or unlike a product and return its ``likes_count``.
+
+    Unlike ``toggle_like`` this is idempotent, so a client retrying a request
+    (or sending a stale batch) cannot flip the state back. The caller is
+    responsible for committing.
+    """
+    delta, score_delta = _add_like(product_id, user_id) if liked else _remove_like(product_id, user_id)
+    return _apply_like_delta(product_id, delta, score_delta)
+
+
+def liked_product_ids(user_id, product_ids):
+    """Return the subset of ``product_ids`` that ``user_id`` has liked."""
+    if not product_ids:
+        return set()
+    return set(db.session.scalars(
+        db.select(Like.product_id).where(Like.user_id == user_id, Like.product_id.in_(product_ids))
+    ))
+
+
+def delete_product_likes(product_id):
+    """Remove every like of a product ahead of deleting the product row."""
+    db.session.execute(db.delete(Like).where(Like.product_id == product_id))
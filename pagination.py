@@ -0,0 +1,175 @@
+# pagination.py
+"""Keyset (cursor) pagination for listing views.
+
+Instead of ``COUNT(*)`` plus ``OFFSET`` on every page view, the next page is
+fetched by seeking past the sort key of the last row shown. The position is
+carried in signed, opaque ``cursor`` tokens, and the pager only knows about a
+small window of page numbers around the current one.
+"""
+import zlib
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import and_, func, or_, select
+
+from models import db
+
+# Page-number links shown on either side of the current page
+PAGE_WINDOW = 2
+
+
+class KeysetPage:
+    """One page of results plus the tokens needed to move to its neighbours."""
+
+    def __init__(self, items, page, per_page, has_prev, has_next,
+                 prev_cursor=None, next_cursor=None, approx_total=None, total_capped=False):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self.approx_total = approx_total
+        self.total_capped = total_capped
+
+    @property
+    def last_known_page(self):
+        if self.approx_total is not None:
+            return max(1, -(-self.approx_total // self.per_page))
+        return self.page + 1 if self.has_next else self.page
+
+    @property
+    def window(self):
+        """Page numbers to link to, bounded to ``PAGE_WINDOW`` around the current page."""
+        first = max(1, self.page - PAGE_WINDOW)
+        last = min(self.last_known_page, self.page + PAGE_WINDOW)
+        return range(first, max(last, self.page) + 1)
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.secret_key, salt='keyset-pagination')
+
+
+def _scope_id(scope):
+    return format(zlib.crc32(repr(scope).encode()), 'x')
+
+
+def encode_cursor(values, direction, page, scope):
+    return _serializer().dumps({'k': list(values), 'd': direction, 'p': page, 's': _scope_id(scope)})
+
+
+def decode_cursor(token, scope):
+    """Return ``(values, direction, page)`` or ``None`` for foreign or tampered tokens."""
+    try:
+        data = _serializer().loads(token)
+    except BadSignature:
+        return None
+    if not isinstance(data, dict) or data.get('s') != _scope_id(scope) or data.get('d') not in ('next', 'prev'):
+        return None
+    return data['k'], data['d'], max(int(data.get('p', 1)), 1)
+
+
+def _seek(order_by, values, forward):
+    # Lexicographic "comes after (or before) this key" over all sort columns
+    clauses = []
+    for i, ((expression, descending), value) in enumerate(zip(order_by, values)):
+        equal_prefix = [order_by[j][0] == values[j] for j in range(i)]
+        past = expression < value if descending == forward else expression > value
+        clauses.append(and_(*equal_prefix, past))
+    return or_(*clauses)
+
+
+def _ordering(order_by, forward):
+    return [
+        expression.desc() if descending == forward else expression.asc()
+        for expression, descending in order_by
+    ]
+
+
+def count_capped(query, cap):
+    """Count the rows of ``query`` but stop after ``cap``; returns ``(count, capped)``."""
+    total = db.session.scalar(
+        select(func.count()).select_from(query.order_by(None).limit(cap + 1).subquery())
+    )
+    return min(total, cap), total > cap
+
+
+def _count(query):
+    return db.session.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+
+
+def paginate(query, order_by, per_page, cursor=None, page=1, scope=None, count_cap=0, partitions=None):
+    """Paginate ``query`` by seeking on ``order_by``.
+
+    ``order_by`` is a list of ``(expression, descending)`` pairs whose last
+    entry must be unique (normally the primary key) so the order is total.
+    Without a cursor, ``page`` is honoured with a single OFFSET query so old
+    ``?page=N`` links keep working; no ``COUNT(*)`` is issued unless
+    ``count_cap`` asks for an approximate total, which is capped.
+
+    ``partitions`` splits the listing into consecutive ranges, each a filter
+    criterion on ``query`` read in ``order_by`` order: all rows of the first,
+    then the second, and so on. Each range can then be served by its own
+    index instead of sorting on a computed "which range" expression; a page
+    that straddles a boundary is stitched from two queries.
+    """
+    partitions = partitions or [None]
+    labels = [expression.label(f'_key{i}') for i, (expression, _) in enumerate(order_by)]
+    keyed = query.add_columns(*labels)
+
+    def partition(index):
+        criterion = partitions[index]
+        return keyed if criterion is None else keyed.filter(criterion)
+
+    wanted = per_page + 1
+    rows = []  # (partition index, row)
+    decoded = decode_cursor(cursor, scope) if cursor else None
+    # Keys are (partition index, *sort values); anything else is from another listing
+    if decoded and len(decoded[0]) == len(order_by) + 1 and 0 <= decoded[0][0] < len(partitions):
+        values, direction, page = decoded
+        forward = direction == 'next'
+        index, seek = values[0], values[1:]
+        while 0 <= index < len(partitions) and len(rows) < wanted:
+            ranged = partition(index)
+            if seek is not None:
+                ranged = ranged.filter(_seek(order_by, seek, forward))
+            fetched = ranged.order_by(*_ordering(order_by, forward)).limit(wanted - len(rows)).all()
+            rows.extend((index, row) for row in fetched)
+            index, seek = index + (1 if forward else -1), None
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        if not forward:
+            rows.reverse()
+        has_next = more if forward else True
+        has_prev = page > 1 if forward else more
+    else:
+        page = max(page, 1)
+        offset = (page - 1) * per_page
+        for index in range(len(partitions)):
+            fetched = partition(index).order_by(*_ordering(order_by, True)) \
+                .offset(offset).limit(wanted - len(rows)).all()
+            rows.extend((index, row) for row in fetched)
+            if len(rows) >= wanted or index == len(partitions) - 1:
+                break
+            # The next range starts after whatever of this one the offset skipped
+            offset = 0 if fetched else max(offset - _count(query.filter(partitions[index])), 0)
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = page > 1
+
+    items = [row[0] for _, row in rows]
+    keys = [(index, *row[1:]) for index, row in rows]
+    next_cursor = encode_cursor(keys[-1], 'next', page + 1, scope) if has_next and keys else None
+    prev_cursor = encode_cursor(keys[0], 'prev', page - 1, scope) if has_prev and keys else None
+
+    approx_total, capped = (None, False)
+    if count_cap:
+        approx_total, capped = count_capped(query, count_cap)
+
+    return KeysetPage(items, page, per_page, has_prev, has_next,
+                      prev_cursor=prev_cursor, next_cursor=next_cursor,
+                      approx_total=approx_total, total_capped=capped)
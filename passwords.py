@@ -0,0 +1,129 @@
+# passwords.py
+"""Password hashing with bounded concurrency.
+
+Hashes are deliberately expensive (scrypt by default needs 32 MiB and on
+the order of 100 ms of CPU per call), so a burst of logins — credential stuffing
+included — could otherwise take every CPU and a lot of memory away from the
+rest of the app. At most ``PASSWORD_HASH_CONCURRENCY`` hashes run at once
+per process; up to ``PASSWORD_HASH_MAX_WAITING`` requests may queue for a
+slot, and anything beyond that (or waiting longer than
+``PASSWORD_HASH_WAIT_SECONDS``) gets a 429 with ``Retry-After``.
+
+Stored hashes record their own parameters, so changing
+``PASSWORD_HASH_METHOD`` takes effect for each user at their next login.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+from werkzeug.exceptions import TooManyRequests
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from metrics import counter, histogram
+from models import db
+
+HASH_SECONDS = histogram('password_hash_seconds', 'Time spent hashing or verifying a password.', ('operation',))
+HASH_REJECTED = counter('password_hash_rejected_total', 'Password hashes refused because of load.', ('reason',))
+
+
+def normalize_method(method):
+    """Spell out werkzeug's defaults so stored and configured methods compare equal."""
+    name, *params = method.split(':')
+    if name == 'scrypt':
+        return 'scrypt:' + ':'.join(params or ['32768', '8', '1'])
+    if name == 'pbkdf2':
+        digest = params[0] if params else 'sha256'
+        iterations = params[1] if len(params) > 1 else str(DEFAULT_PBKDF2_ITERATIONS)
+        return f'pbkdf2:{digest}:{iterations}'
+    return method
+
+
+class PasswordHasher:
+    def __init__(self, method, concurrency, max_waiting, wait_seconds):
+        self.method = normalize_method(method)
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.wait_seconds = wait_seconds
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._average = 0.1  # Running mean of one hash, for Retry-After
+
+    def _overloaded(self, reason):
+        HASH_REJECTED.inc(reason=reason)
+        # Rough time for the current backlog to drain; read without the lock, it's only an estimate
+        retry_after = max(1, math.ceil(self._average * (self._waiting + self.concurrency) / self.concurrency))
+        return TooManyRequests('Too many sign-in attempts right now, please try again shortly.',
+                               retry_after=retry_after)
+
+    @contextmanager
+    def _slot(self, operation):
+        with self._lock:
+            if self._waiting >= self.max_waiting:
+                raise self._overloaded('queue_full')
+            self._waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=self.wait_seconds)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if not acquired:
+            raise self._overloaded('timeout')
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._slots.release()
+            elapsed = time.perf_counter() - started
+            self._average += (elapsed - self._average) * 0.2
+            HASH_SECONDS.observe(elapsed, operation=operation)
+
+    def hash(self, password):
+        with self._slot('hash'):
+            return generate_password_hash(password, method=self.method)
+
+    def verify(self, stored, password):
+        with self._slot('verify'):
+            return check_password_hash(stored, password)
+
+    def needs_rehash(self, stored):
+        return normalize_method(stored.split('$', 1)[0]) != self.method
+
+
+def _hasher():
+    return current_app.extensions['passwords']
+
+
+def hash_password(password):
+    """Hash a new password; raises ``TooManyRequests`` when hashing is saturated."""
+    return _hasher().hash(password)
+
+
+def check_password(user, password):
+    """Verify ``password`` for ``user``, upgrading the stored hash if its parameters are outdated.
+
+    Raises ``TooManyRequests`` when hashing is saturated. A rehash that can't
+    get a slot is skipped; it is retried at the next login.
+    """
+    hasher = _hasher()
+    if not hasher.verify(user.password, password):
+        return False
+    if hasher.needs_rehash(user.password):
+        try:
+            user.password = hasher.hash(password)
+            db.session.commit()
+        except TooManyRequests:
+            pass
+    return True
+
+
+def init_app(app):
+    config = app.config
+    app.extensions['passwords'] = PasswordHasher(
+        config['PASSWORD_HASH_METHOD'],
+        config['PASSWORD_HASH_CONCURRENCY'],
+        config['PASSWORD_HASH_MAX_WAITING'],
+        config['PASSWORD_HASH_WAIT_SECONDS'],
+    )
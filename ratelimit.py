@@ -0,0 +1,204 @@
+# ratelimit.py
+"""Admission control for the endpoints that write.
+
+Views are tagged with an endpoint class (``@limit('like')``, next to
+``login_required``/``logout_required``). Requests to a tagged view pass
+through, in this order:
+
+* a per-process concurrency cap (``RATELIMIT_CONCURRENCY``): at most that
+  many requests of the class run at once in this process, so a flood of
+  uploads can't take every thread and database connection;
+* token buckets (``RATELIMITS``) per signed-in user and per client IP; a
+  ``"30/minute"`` limit allows bursts of 30 and refills at 30 a minute.
+  A request costs one token; a view doing the work of several (a batch of
+  like changes) is ``deferred`` and charges its cost with
+  ``AdmissionControl.charge``.
+
+The checks run in a ``before_request`` hook registered ahead of CSRF
+protection, so a rejected request is answered with a 429 and
+``Retry-After`` before its body (an upload, a form) is read. Only
+``LIMITED_METHODS`` count: showing the upload form is free.
+
+The client IP is ``request.remote_addr``: behind a proxy, set
+``PROXY_FIX_X_FOR`` so it is read from ``X-Forwarded-For``, and leave it 0
+otherwise or clients could pick a fresh bucket per request.
+
+Buckets live in ``RATELIMIT_STORAGE_URL``: ``memory://`` keeps them per
+process (each worker enforces the limit on its own), ``redis://host:port``
+shares them between every process through an atomic Lua script. Rejections
+are counted in ``ratelimit_rejected_total``.
+"""
+import math
+import threading
+import time
+
+from cachetools import LRUCache
+from flask import current_app, g, request, session
+from werkzeug.exceptions import BadRequest, TooManyRequests
+
+from metrics import counter
+
+LIMITED_METHODS = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+REJECTED = counter('ratelimit_rejected_total', 'Requests refused by admission control.',
+                   ('endpoint_class', 'reason'))
+
+
+def parse_limit(value):
+    """``"30/minute"`` -> ``(capacity, tokens per second)``; ``None`` for an empty limit."""
+    if not value:
+        return None
+    count, _, period = value.partition('/')
+    if period not in PERIODS:
+        raise ValueError(f"Rate limit {value!r} must look like '<count>/<{'|'.join(PERIODS)}>'")
+    return int(count), int(count) / PERIODS[period]
+
+
+def limit(endpoint_class, deferred=False):
+    """Put a view under the admission control of ``endpoint_class``.
+
+    A ``deferred`` view takes its own tokens with ``AdmissionControl.charge``
+    once it knows what the request costs; the concurrency cap still applies
+    up front.
+    """
+    def decorator(view):
+        view.rate_limit_class = endpoint_class
+        view.rate_limit_deferred = deferred
+        return view
+    return decorator
+
+
+class MemoryBuckets:
+    """Token buckets in this process; the least recently used are forgotten (i.e. refilled)."""
+
+    def __init__(self, maxsize=10000):
+        self._buckets = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1):
+        """Take ``cost`` tokens (all or none); returns 0 if there were enough, else the seconds until there are."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+        return (cost - tokens) / rate
+
+
+# KEYS[1] bucket; ARGV capacity, rate, now, cost. Returns the wait in milliseconds (0 = allowed).
+TAKE_SCRIPT = """
+local capacity, rate, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(state[1]) or capacity
+local stamp = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - stamp) * rate)
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = math.ceil((cost - tokens) / rate * 1000) end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'stamp', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return wait
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared through a Redis-protocol server."""
+
+    def __init__(self, url, prefix='draw:rl:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('RATELIMIT_STORAGE_URL points at Redis but the "redis" package is not installed') from e
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(TAKE_SCRIPT)
+        self.prefix = prefix
+
+    def take(self, key, capacity, rate, cost=1):
+        return self._take(keys=[self.prefix + key], args=[capacity, rate, time.time(), cost]) / 1000
+
+
+def create_buckets(url):
+    if url.startswith('memory://'):
+        return MemoryBuckets()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBuckets(url)
+    raise ValueError(f'Unsupported RATELIMIT_STORAGE_URL: {url}')
+
+
+class AdmissionControl:
+    def __init__(self, buckets, limits, concurrency, enabled=True):
+        self.buckets = buckets
+        self.enabled = enabled
+        self.limits = {
+            endpoint_class: {scope: parse_limit(value) for scope, value in scopes.items()}
+            for endpoint_class, scopes in limits.items()
+        }
+        self.slots = {
+            endpoint_class: threading.BoundedSemaphore(size)
+            for endpoint_class, size in concurrency.items() if size
+        }
+
+    def _reject(self, endpoint_class, reason, retry_after):
+        REJECTED.inc(endpoint_class=endpoint_class, reason=reason)
+        return TooManyRequests('Too many requests, please slow down and try again shortly.',
+                               retry_after=max(1, math.ceil(retry_after)))
+
+    def admit(self, endpoint_class, deferred=False):
+        """Raise ``TooManyRequests`` unless the current request may go ahead."""
+        slots = self.slots.get(endpoint_class)
+        if slots is not None:
+            if not slots.acquire(blocking=False):
+                raise self._reject(endpoint_class, 'concurrency', 1)
+            g.rate_limit_slots = slots
+        if not deferred:
+            self.charge(endpoint_class, 1)
+
+    def charge(self, endpoint_class, cost):
+        """Take ``cost`` tokens from each of the current request's buckets; raise ``TooManyRequests`` if short.
+
+        A bucket is charged all of ``cost`` or nothing. A cost larger than a
+        bucket's capacity can never be paid and is refused with a 400.
+        """
+        if not self.enabled or cost <= 0:
+            return
+        limits = self.limits.get(endpoint_class, {})
+        subjects = {'user': session.get('user_id'), 'ip': request.remote_addr}
+        for scope, subject in subjects.items():
+            if limits.get(scope) is None or subject is None:
+                continue
+            capacity, rate = limits[scope]
+            if cost > capacity:
+                REJECTED.inc(endpoint_class=endpoint_class, reason=scope)
+                raise BadRequest(f'This request needs {cost} tokens but the limit holds at most {capacity}')
+            wait = self.buckets.take(f'{endpoint_class}:{scope}:{subject}', capacity, rate, cost)
+            if wait:
+                raise self._reject(endpoint_class, scope, wait)
+
+    def release(self):
+        slots = g.pop('rate_limit_slots', None)
+        if slots is not None:
+            slots.release()
+
+
+def init_app(app):
+    """Register the checks; call before ``CSRFProtect(app)`` so they run first."""
+    config = app.config
+    control = AdmissionControl(create_buckets(config['RATELIMIT_STORAGE_URL']), config['RATELIMITS'],
+                               config['RATELIMIT_CONCURRENCY'], enabled=config['RATELIMIT_ENABLED'])
+    app.extensions['ratelimit'] = control
+
+    @app.before_request
+    def admit_request():
+        if not control.enabled or request.method not in LIMITED_METHODS or request.endpoint is None:
+            return
+        view = current_app.view_functions[request.endpoint]
+        endpoint_class = getattr(view, 'rate_limit_class', None)
+        if endpoint_class is not None:
+            control.admit(endpoint_class, view.rate_limit_deferred)
+
+    @app.teardown_request
+    def release_slot(exc):
+        control.release()
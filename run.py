@@ -1,15 +1,30 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, session, make_response
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_wtf.csrf import CSRFProtect
-from flask_migrate import Migrate
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
+from markupsafe import Markup
 from config import Config
-from forms import SignupForm, LoginForm, PictureForm, ToggleLikeForm
-from models import db, User, Product
+from forms import SignupForm, LoginForm, PictureForm
+from passwords import hash_password, check_password, init_app as init_passwords
+from models import db, User, Product, toggle_like as toggle_product_like, liked_product_ids, delete_product_likes
 from utils import login_required, logout_required
+from database import read_only, init_app as init_database
+from search import listing_query
+from pagination import paginate
+from images import stage_upload, product_image_urls, discard_image
+from jobs import enqueue, notify_workers, init_app as init_jobs
+from ratelimit import limit, init_app as init_ratelimit
+from fragments import card_grid as card_grid_html, personalize
+from api import bp as api_bp
+import assets
+import templating
+import trending  # noqa: F401 (registers the refresh_trending job)
+import cache
+import startup
+import storage
+import uploads
+import metrics
+from log import configure_logging
+import logging
 import os
 from werkzeug.middleware.proxy_fix import ProxyFix
 
@@ -17,99 +32,35 @@ app = Flask(__name__,
     static_url_path='/static',
     static_folder='static'
 )
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 app.config.from_object(Config)
-db.init_app(app)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'], x_proto=1, x_host=1)
+configure_logging(app)
+logger = logging.getLogger(__name__)
+init_database(app, db)
+# Before CSRF protection: requests are timed and rate limited before their form body is parsed
+metrics.init_app(app)
+init_ratelimit(app)
 csrf = CSRFProtect(app)
-migrate = Migrate(app, db)
+init_jobs(app)
+init_passwords(app)
+cache.init_app(app)
+assets.init_app(app)
+templating.init_app(app)
+storage.init_app(app)
+uploads.init_app(app)
+app.register_blueprint(api_bp)
 
-# Define the verification function first
-def verify_cloudinary_config():
-    try:
-        # Test Cloudinary configuration
-        cloudinary.api.ping()
-        print("Cloudinary configuration verified successfully")
-    except Exception as e:
-        print(f"Cloudinary configuration error: {str(e)}")
-
-# Initialize Cloudinary and verify config
-cloudinary.config(
-    cloud_name=app.config['CLOUDINARY_CLOUD_NAME'],
-    api_key=app.config['CLOUDINARY_API_KEY'],
-    api_secret=app.config['CLOUDINARY_API_SECRET']
-)
-
-# Verify Cloudinary config during app initialization
-with app.app_context():
-    verify_cloudinary_config()
-
-# Function to upload image to Cloudinary
-def upload_photo(file):
-    if not file:
-        print("No file provided")
-        return None
-        
-    try:
-        # Print Cloudinary config for debugging
-        print(f"Cloudinary Config - Cloud Name: {app.config['CLOUDINARY_CLOUD_NAME']}")
-        print(f"Cloudinary Config - API Key: {app.config['CLOUDINARY_API_KEY']}")
-        print(f"API Secret exists: {bool(app.config['CLOUDINARY_API_SECRET'])}")
-        
-        # Read file data
-        file_data = file.read()
-        if not file_data:
-            print("Empty file data")
-            return None
-            
-        # Upload to cloudinary
-        upload_result = cloudinary.uploader.upload(
-            file_data,
-            folder="product_images",
-            resource_type="auto",
-            api_key=app.config['CLOUDINARY_API_KEY'],
-            api_secret=app.config['CLOUDINARY_API_SECRET'],
-            cloud_name=app.config['CLOUDINARY_CLOUD_NAME']
-        )
-        
-        print(f"Upload result: {upload_result}")  # Debug print
-        
-        if 'public_id' in upload_result:
-            return upload_result['public_id']
-        else:
-            print(f"Upload failed: {upload_result}")
-            return None
-            
-    except Exception as e:
-        print(f"Detailed Cloudinary upload error: {str(e)}")
-        import traceback
-        traceback.print_exc()  # Print full stack trace
-        return None
-    finally:
-        # Reset file pointer
-        file.seek(0)
-
-# Function to delete image from Cloudinary
-def delete_photo(public_id):
-    try:
-        cloudinary.uploader.destroy(public_id)
-    except Exception as e:
-        print(f"An error occurred while deleting the file: {e}")
-
-# Update database initialization
-if os.getenv('VERCEL_ENV') == 'production':
-    with app.app_context():
-        try:
-            db.create_all()
-        except Exception as e:
-            print(f"Database initialization error: {e}")
+# CLI-only setup (migrations, startup profiling); never runs when serving
+startup.init_cli(app)
 
 # Signup route
 @app.route('/signup', methods=['GET', 'POST'])
 @logout_required
+@limit('auth')
 def signup():
     form = SignupForm()
     if form.validate_on_submit():
-        hashed_password = generate_password_hash(form.password.data)
+        hashed_password = hash_password(form.password.data)
         new_user = User(username=form.username.data, email=form.email.data, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
@@ -120,11 +71,13 @@ def signup():
 # Login route
 @app.route('/', methods=['GET', 'POST'])
 @logout_required
+@limit('auth')
+@read_only
 def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user and check_password_hash(user.password, form.password.data):
+        if user and check_password(user, form.password.data):
             session['user_id'] = user.id
             flash('Login successful!', 'success')
             return redirect(url_for('home'))
@@ -134,38 +87,72 @@ def login():
 # Home route
 @app.route('/home')
 @login_required
+@read_only
 def home():
     current_user_id = session.get('user_id')
-    form = ToggleLikeForm()
     search_term = request.args.get('search', '').strip()
+    sort = request.args.get('sort', '')
     page = request.args.get('page', 1, type=int)
-    per_page = 8
-    query = Product.query
+    cursor = request.args.get('cursor')
+    data_versions = cache.versions('catalog', 'likes')
+
+    # Conditional GET: same data, viewer and page means the same HTML. Skipped
+    # while flash messages are pending since rendering the page consumes them.
+    etag = None
+    if '_flashes' not in session:
+        etag = cache.make_key('home', data_versions, current_user_id, search_term, sort, page, cursor,
+                              session.get('csrf_token'))
+        if request.if_none_match.contains(etag):
+            return conditional_headers(app.response_class(status=304), etag)
+
+    listing_key = cache.make_key('home:listing', data_versions, current_user_id, search_term, sort, page, cursor)
+    listing = cache.get_cache().get(listing_key)
+    if listing is None:
+        listing = load_home_listing(current_user_id, search_term, sort, page, cursor)
+        cache.get_cache().set(listing_key, listing)
+    products, cards, liked_ids = listing
 
-    if search_term:
-        query = query.filter(Product.name.ilike(f'%{search_term}%'))
-    query = query.order_by(
-        db.case((Product.user_id == current_user_id, 1), else_=0).desc()
+    owned_ids = {card['id'] for card in cards if card['user'] == current_user_id}
+    card_grid = personalize(card_grid_html(cards, data_versions), liked_ids, owned_ids)
+    response = make_response(render_template(
+        'home.html', card_grid=Markup(card_grid), search_term=search_term, sort=sort, products=products
+    ))
+    return conditional_headers(response, etag) if etag else response
+
+def load_home_listing(current_user_id, search_term, sort, page, cursor):
+    """Run the /home queries; returns ``(pager, cards, liked_ids)`` in a cacheable form."""
+    query, order_by, partitions = listing_query(current_user_id, search_term, sort)
+    products = paginate(
+        query, order_by, app.config['HOME_PER_PAGE'],
+        cursor=cursor, page=page,
+        scope=(current_user_id, search_term, sort),
+        count_cap=app.config['HOME_COUNT_CAP'],
+        partitions=partitions,
     )
-    products = query.paginate(page=page, per_page=per_page)
     cards = [
         {
             "id": product.id,
             "name": product.name,
             "price": product.price,
-            "count": len(product.like_count),
-            "users_list": product.like_count,
-            "image_url": cloudinary.CloudinaryImage(product.image_file).build_url(
-                width=300,
-                height=300,
-                crop="fill"
-            ),
+            "count": product.likes_count,
+            "image_url": urls['thumbnail'] if urls else url_for('static', filename='placeholder.svg'),
+            "image_srcset": urls['srcset'] if urls else None,
+            "image_pending": product.image_status == 'pending',
             "user": product.user_id
-        } for product in products.items
+        } for product, urls in ((product, product_image_urls(product)) for product in products.items)
     ]
-    for i in cards:
-        print(i)
-    return render_template('home.html', cards=cards, search_term=search_term, products=products, form=form)
+    # Keep only IDs on the pager so the listing can be cached without ORM objects
+    products.items = [card['id'] for card in cards]
+    return products, cards, liked_product_ids(current_user_id, products.items)
+
+def conditional_headers(response, etag):
+    response.set_etag(etag)
+    modified = cache.last_modified('catalog', 'likes')
+    if modified:
+        response.last_modified = modified
+    # Per-user page: browsers may keep it but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 # Logout route
 @app.route('/logout')
@@ -178,6 +165,7 @@ def logout():
 # Add product route
 @app.route('/add_product', methods=['GET', 'POST'])
 @login_required
+@limit('upload')
 def add_product():
     form = PictureForm()
     if form.validate_on_submit():
@@ -195,34 +183,28 @@ def add_product():
             return render_template('product_form.html', form=form)
 
         try:
-            print(f"Processing file: {file.filename}")
-            print(f"File content type: {file.content_type}")
-            print(f"File size: {file.content_length if hasattr(file, 'content_length') else 'unknown'}")
-            
-            file_id = upload_photo(file)
-            
-            if not file_id:
-                flash('Error uploading image to Cloudinary. Please try again.', 'error')
-                return render_template('product_form.html', form=form)
+            logger.info("Staging upload %s (%s)", file.filename, file.content_type)
+            staged_path = stage_upload(file)
 
-            print(f"Successfully uploaded with ID: {file_id}")
-            
             new_product = Product(
                 name=form.name.data,
                 price=form.price.data,
                 user_id=session['user_id'],
-                image_file=file_id
+                image_status='pending'
             )
-            
             db.session.add(new_product)
+            db.session.flush()
+            # The image is sent to Cloudinary in the background
+            enqueue('upload_image', product_id=new_product.id, path=staged_path)
             db.session.commit()
-            flash('Product added successfully!', 'success')
+            cache.bump('catalog')
+            notify_workers()
+            flash('Product added successfully! The image will appear once it has been processed.', 'success')
             return redirect(url_for('home'))
-            
-        except Exception as e:
-            print(f"Error in add_product: {str(e)}")
-            import traceback
-            traceback.print_exc()
+
+        except Exception:
+            db.session.rollback()
+            logger.exception("Error in add_product")
             flash('An error occurred while processing your request.', 'error')
             return render_template('product_form.html', form=form)
 
@@ -237,6 +219,7 @@ def allowed_file(filename):
 # Update product route
 @app.route('/update_product/<int:product_id>', methods=['GET', 'POST'])
 @login_required
+@limit('upload')
 def update_product(product_id):
     product = Product.query.get_or_404(product_id)
     form = PictureForm()
@@ -245,15 +228,9 @@ def update_product(product_id):
         if 'image' in request.files and request.files['image']:
             file = request.files['image']
             if allowed_file(file.filename):
-                if product.image_file:
-                    delete_photo(product.image_file)
-                
-                file_id = upload_photo(file)
-                if file_id:
-                    product.image_file = file_id
-                else:
-                    flash('Error uploading image to Cloudinary.', 'error')
-                    return render_template('product_form.html', form=form, product=product)
+                # The current image stays visible until the upload job replaces it
+                product.image_status = 'pending'
+                enqueue('upload_image', product_id=product.id, path=stage_upload(file))
             else:
                 flash('Invalid file type. Allowed types are: png, jpg, jpeg, gif', 'error')
                 return render_template('product_form.html', form=form, product=product)
@@ -261,6 +238,8 @@ def update_product(product_id):
         product.name = form.name.data
         product.price = form.price.data
         db.session.commit()
+        cache.bump('catalog')
+        notify_workers()
 
         flash('Product updated successfully!', 'success')
         return redirect(url_for('home'))
@@ -272,37 +251,39 @@ def update_product(product_id):
 # Delete product route
 @app.route('/delete_product/<int:product_id>', methods=['POST'])
 @login_required
+@limit('write')
 def delete_product(product_id):
     product = Product.query.get_or_404(product_id)
 
     if product.image_file:
-        delete_photo(product.image_file)
+        discard_image(product.image_file)
 
+    delete_product_likes(product.id)
     db.session.delete(product)
     db.session.commit()
+    cache.bump('catalog')
+    notify_workers()
     flash('Product deleted successfully!', 'success')
     return redirect(url_for('home'))
 
 # Toggle like route
 @app.route('/toggle_like/<int:product_id>', methods=['POST'])
 @login_required
+@limit('like')
 def toggle_like(product_id):
-    product = Product.query.get_or_404(product_id)
-    user_id = session['user_id']
-    if user_id in product.like_count:
-        product.like_count.remove(user_id)
-        flash('You unliked this product.', 'success')
-    else:
-        product.like_count.append(user_id)
-        flash('You liked this product!', 'success')
+    Product.query.get_or_404(product_id)
+    liked, _ = toggle_product_like(product_id, session['user_id'])
     db.session.commit()
+    cache.bump('likes')
+    if liked:
+        flash('You liked this product!', 'success')
+    else:
+        flash('You unliked this product.', 'success')
+    # Back to the same search and page when the form was posted from /home
+    if request.referrer and request.referrer.startswith(request.host_url):
+        return redirect(request.referrer)
     return redirect(url_for('home'))
 
-# Add this route for serving static files
-@app.route('/static/<path:path>')
-def serve_static(path):
-    return send_from_directory(app.static_folder, path)
-
 if __name__ == '__main__':
     if os.getenv('VERCEL_ENV') == 'production':
         app.run()
@@ -0,0 +1,163 @@
+# search.py
+"""Indexed product-name search for the /home search box.
+
+Postgres uses a pg_trgm GIN index on ``products.name``, which serves both the
+plain substring filter (ILIKE) and the typo-tolerant ``<%`` word-similarity
+operator. SQLite uses an external-content FTS5 table with the trigram
+tokenizer, kept in sync with ``products`` by triggers, so every insert, update
+and delete done by the product views is reflected without extra code.
+"""
+import sqlite3
+
+from sqlalchemy import DDL, Float, Index, cast, event, func, literal, literal_column, or_, table
+from sqlalchemy.engine import Engine
+
+from migrations.fts import SQLITE_FTS_DROP, SQLITE_FTS_TABLE, SQLITE_FTS_TRIGGERS
+from models import db, Product
+
+# Trigram indexes cannot answer queries shorter than one trigram
+MIN_INDEXED_LENGTH = 3
+# Fraction of the search term's trigrams a name must contain to match in
+# ranked mode; mirrors pg_trgm's word_similarity threshold
+SIMILARITY_THRESHOLD = 0.5
+
+# --- Postgres: pg_trgm GIN index -------------------------------------------
+
+event.listen(
+    db.metadata, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'),
+)
+
+Index(
+    'ix_products_name_trgm', Product.name,
+    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'},
+).ddl_if(dialect='postgresql')
+
+# --- SQLite: FTS5 trigram table maintained by triggers -----------------------
+
+# The migrations' DDL, so db.create_all() databases match migrated ones
+for statement in [SQLITE_FTS_TABLE, *SQLITE_FTS_TRIGGERS]:
+    event.listen(Product.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in SQLITE_FTS_DROP:
+    event.listen(Product.__table__, 'before_drop', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def _padded_trigrams(text):
+    # Same word padding as pg_trgm so both backends agree on what is "similar"
+    trigrams = set()
+    for word in text.lower().split():
+        padded = f'  {word} '
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def trigram_similarity(term, name):
+    """Share of ``term``'s trigrams that also occur in ``name`` (0.0 - 1.0)."""
+    wanted = _padded_trigrams(term or '')
+    if not wanted:
+        return 0.0
+    return len(wanted & _padded_trigrams(name or '')) / len(wanted)
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('trigram_similarity', 2, trigram_similarity, deterministic=True)
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _fts_phrase(text):
+    # FTS5 string literal: double quotes, embedded quotes doubled
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _fts_matches(expression):
+    return db.select(
+        literal_column('rowid').label('product_id'),
+        literal_column('rank').label('rank'),
+    ).select_from(table('products_fts')).where(literal_column('products_fts').op('MATCH')(expression))
+
+
+def _trigrams(text):
+    text = text.lower()
+    return sorted({text[i:i + 3] for i in range(len(text) - 2)})
+
+
+def filter_products(query, term):
+    """Restrict ``query`` to products whose name contains ``term`` (case-insensitive)."""
+    if len(term) >= MIN_INDEXED_LENGTH and _dialect() == 'sqlite':
+        matches = _fts_matches(_fts_phrase(term)).subquery()
+        return query.filter(Product.id.in_(db.select(matches.c.product_id)))
+    # On Postgres the trigram GIN index serves ILIKE '%term%' directly
+    return query.filter(Product.name.icontains(term, autoescape=True))
+
+
+def rank_products(query, term):
+    """Typo-tolerant search ordered by relevance, best match first.
+
+    Names sharing enough trigrams with ``term`` match even when the term is
+    misspelt or only a prefix of a word; exact substrings always match.
+    Returns the filtered query and its sort keys as ``(expression, descending)``
+    pairs, ready for ``pagination.paginate``.
+    """
+    newest_first = (Product.id, True)
+    if len(term) < MIN_INDEXED_LENGTH:
+        return filter_products(query, term), [newest_first]
+
+    substring = Product.name.icontains(term, autoescape=True)
+    if _dialect() == 'sqlite':
+        expression = ' OR '.join(_fts_phrase(trigram) for trigram in _trigrams(term))
+        matches = _fts_matches(expression).subquery()
+        # The FTS index narrows the candidates; similarity is only computed for those
+        similarity = func.trigram_similarity(term, Product.name)
+        query = query.join(matches, matches.c.product_id == Product.id).filter(
+            (similarity >= SIMILARITY_THRESHOLD) | substring
+        )
+        return query, [(similarity, True), newest_first]
+
+    if _dialect() == 'postgresql':
+        similar = literal(term).op('<%')(Product.name)
+        query = query.filter(similar | substring)
+        # word_similarity() is a float4; as float8 it compares equal to the value the cursor carries back
+        similarity = cast(func.word_similarity(term, Product.name), Float(53))
+        return query, [(similarity, True), newest_first]
+
+    return filter_products(query, term), [newest_first]
+
+
+# Sorts backed by a counter kept up to date on every like (models.py)
+SORT_COLUMNS = {'likes': Product.likes_count, 'trending': Product.trending_score}
+
+
+def listing_query(viewer_id, term, sort):
+    """The product listing shared by /home and the JSON API.
+
+    Returns ``(query, order_by, partitions)`` for ``pagination.paginate``:
+
+    * ``relevance`` (with a search term): best match first.
+    * ``likes``, ``trending``: the maintained ``likes_count`` or
+      ``trending_score`` descending, read backwards along its ``(column, id)``
+      index; ties newest first.
+    * ``newest``: the primary key descending (IDs follow insertion order).
+    * anything else: the viewer's own products followed by everyone else's,
+      newest first within each. The two ranges are read separately, the first
+      through ``ix_products_user_id_id`` and the second along the primary key.
+
+    None of these needs a sort when there is no search term.
+    """
+    query = Product.query
+    if term and sort == 'relevance':
+        return (*rank_products(query, term), None)
+    if term:
+        query = filter_products(query, term)
+    if sort in SORT_COLUMNS:
+        return query, [(SORT_COLUMNS[sort], True), (Product.id, True)], None
+    if sort == 'newest':
+        return query, [(Product.id, True)], None
+    return query, [(Product.id, True)], [
+        Product.user_id == viewer_id,
+        or_(Product.user_id != viewer_id, Product.user_id.is_(None)),
+    ]
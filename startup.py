@@ -0,0 +1,124 @@
+# startup.py
+"""Keeping cold starts cheap.
+
+Serving processes (Vercel functions, gunicorn workers) import ``run`` and
+should only pay for what a request needs: no network calls, no schema DDL and
+no CLI-only packages. Everything here is registered only when the app is
+loaded by the ``flask`` command.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import click
+from flask import current_app
+
+from models import db
+
+
+def running_under_cli():
+    # The flask command loads the app while resolving a click command
+    return click.get_current_context(silent=True) is not None
+
+
+def init_cli(app):
+    if not running_under_cli():
+        return
+    # Flask-Migrate pulls in Alembic and every DDL dialect; only "flask db" needs it
+    from flask_migrate import Migrate
+
+    from assets import build_assets_command
+    from images import images_cli
+    from importer import import_products_command
+    from templating import compile_templates_command
+    from trending import refresh_trending_command
+
+    Migrate(app, db)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(import_products_command)
+    app.cli.add_command(images_cli)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(compile_templates_command)
+    app.cli.add_command(refresh_trending_command)
+    app.cli.add_command(check_cloudinary_command)
+    app.cli.add_command(startup_profile_command)
+
+
+@click.command('init-db')
+def init_db_command():
+    """Bring the database schema up to date (runs the migrations)."""
+    from flask_migrate import upgrade
+
+    upgrade()
+    click.echo('Database is up to date.')
+
+
+@click.command('check-cloudinary')
+def check_cloudinary_command():
+    """Verify the Cloudinary credentials with a ping."""
+    from storage import cloudinary_client
+
+    try:
+        cloudinary_client().api.ping()
+    except Exception as e:
+        raise click.ClickException(f'Cloudinary configuration error: {e}')
+    click.echo('Cloudinary configuration verified successfully')
+
+
+def parse_importtime(stderr):
+    """Turn ``python -X importtime`` output into ``[(module, self_us, cumulative_us, depth)]``."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+@click.command('startup-profile')
+@click.option('--module', default='run', show_default=True, help='Module a cold process imports.')
+@click.option('--top', default=15, show_default=True, help='Rows to show per table.')
+@click.option('--budget-ms', type=float, help='Exit non-zero if importing takes longer than this.')
+@click.option('--json', 'as_json', is_flag=True, help='Print a machine-readable report.')
+def startup_profile_command(module, top, budget_ms, as_json):
+    """Profile importing the app in a fresh interpreter."""
+    code = (
+        'import time; started = time.perf_counter(); '
+        f'import {module}; '
+        'print(time.perf_counter() - started)'
+    )
+    env = dict(os.environ)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, env=env, cwd=current_app.root_path,
+    )
+    if result.returncode != 0:
+        raise click.ClickException(f'Importing {module} failed:\n{result.stderr[-2000:]}')
+
+    total_ms = float(result.stdout.strip().splitlines()[-1]) * 1000
+    rows = parse_importtime(result.stderr)
+    top_level = sorted((row for row in rows if row[3] == 1), key=lambda row: row[2], reverse=True)[:top]
+    by_self = sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+    if as_json:
+        click.echo(json.dumps({
+            'module': module,
+            'import_ms': round(total_ms, 1),
+            'modules_imported': len(rows),
+            'top_cumulative': [{'module': r[0], 'cumulative_ms': r[2] / 1000} for r in top_level],
+            'top_self': [{'module': r[0], 'self_ms': r[1] / 1000} for r in by_self],
+        }, indent=2))
+    else:
+        click.echo(f'import {module}: {total_ms:.1f} ms, {len(rows)} modules')
+        click.echo('\nDirect imports by cumulative time:')
+        for name, _, cumulative_us, _ in top_level:
+            click.echo(f'  {cumulative_us / 1000:8.1f} ms  {name}')
+        click.echo('\nSlowest modules by own time:')
+        for name, self_us, _, _ in by_self:
+            click.echo(f'  {self_us / 1000:8.1f} ms  {name}')
+
+    if budget_ms is not None and total_ms > budget_ms:
+        raise click.ClickException(f'Import took {total_ms:.1f} ms, over the {budget_ms:.0f} ms budget')
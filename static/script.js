@@ -57,6 +57,76 @@ function validateLoginPassword() {
 }
 
 
-function toggleLove(element) {
-    element.classList.toggle("active");
-}
\ No newline at end of file
+// Like buttons: update the card in place through the JSON API instead of
+// posting #like-form and re-rendering /home. Clicks made in quick succession
+// are sent together in one batch request. Without fetch the form posts as usual.
+const LIKE_BATCH_DELAY_MS = 150;
+const pendingLikes = new Map();
+let likesFlushTimer = null;
+
+function likeButton(productId) {
+    return document.querySelector(`button.like-button[data-product-id="${productId}"]`);
+}
+
+function showLike(button, liked, count) {
+    button.classList.toggle("liked", liked);
+    const loveCount = button.parentElement.querySelector(".love-count");
+    if (loveCount && count !== undefined) {
+        loveCount.textContent = count > 1 ? count : "";
+    }
+}
+
+function flushLikes() {
+    likesFlushTimer = null;
+    const changes = Array.from(pendingLikes, ([productId, liked]) => ({ product_id: productId, liked: liked }));
+    pendingLikes.clear();
+    const grid = likeButton(changes[0].product_id).closest("[data-likes-url]");
+
+    fetch(grid.dataset.likesUrl, {
+        method: "POST",
+        credentials: "same-origin",
+        headers: {
+            "Content-Type": "application/json",
+            "X-CSRFToken": document.querySelector("#like-form input[name=csrf_token]").value,
+        },
+        body: JSON.stringify({ changes: changes }),
+    })
+        .then((response) => {
+            if (!response.ok) {
+                throw new Error(`Like request failed: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then((data) => {
+            data.results.forEach((result) => {
+                const button = likeButton(result.product_id);
+                if (button && !result.error) {
+                    showLike(button, result.liked, result.likes_count);
+                }
+            });
+        })
+        .catch(() => {
+            // Put the hearts back the way they were before the click
+            changes.forEach((change) => {
+                const button = likeButton(change.product_id);
+                if (button) {
+                    showLike(button, !change.liked);
+                }
+            });
+        });
+}
+
+document.addEventListener("submit", (event) => {
+    const button = event.submitter;
+    if (event.target.id !== "like-form" || !button || !button.classList.contains("like-button") || !window.fetch) {
+        return;
+    }
+    event.preventDefault();
+    const productId = Number(button.dataset.productId);
+    const liked = !button.classList.contains("liked");
+    showLike(button, liked);
+    pendingLikes.set(productId, liked);
+    if (likesFlushTimer === null) {
+        likesFlushTimer = setTimeout(flushLikes, LIKE_BATCH_DELAY_MS);
+    }
+});
\ No newline at end of file
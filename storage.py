@@ -0,0 +1,374 @@
+# storage.py
+"""Where product image files live: Cloudinary or a local directory.
+
+``STORAGE_BACKEND`` picks the driver. Both implement the same small
+interface (``Storage``) and identify files by an opaque key, the
+``public_id`` stored on products:
+
+* ``cloudinary``: the image host stores the files and its CDN resizes them.
+* ``local``: files are kept under ``MEDIA_ROOT`` at content-addressed paths
+  (``product_images/ab/<sha256>.webp``) and served by this app at
+  ``MEDIA_URL_PREFIX``. Resized variants are rendered on first request and
+  kept on disk next to the originals, so self-hosted and test deployments
+  need no network round trip per image.
+
+Only the variants the configured transformations can produce are served,
+so the resize endpoint can't be used to fill the disk. Responses carry the
+content hash as a strong ETag, can be cached forever (a key never changes
+content) and support Range requests. Under gunicorn the body goes out
+through ``sendfile``; with ``MEDIA_ACCEL_REDIRECT`` set the app only answers
+the headers and leaves the file to nginx (``X-Accel-Redirect``).
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+import urllib.request
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from flask import Blueprint, abort, current_app, request, send_file
+
+from metrics import time_image_host
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_FOLDER = 'product_images'
+
+_cloudinary_lock = threading.Lock()
+_cloudinary_state = {'configured': False, 'verified': False}
+
+
+def cloudinary_client(verify=False):
+    """Import and configure the Cloudinary SDK on first use.
+
+    Nothing about the image host is touched at import time, so cold starts
+    don't pay for the SDK import or a network round trip. With ``verify``
+    (used from background jobs, never from request handlers) the credentials
+    are checked once with ``cloudinary.api.ping()``.
+    """
+    import cloudinary
+    import cloudinary.api
+    import cloudinary.uploader
+
+    if _cloudinary_state['configured'] and (_cloudinary_state['verified'] or not verify):
+        return cloudinary
+    with _cloudinary_lock:
+        if not _cloudinary_state['configured']:
+            config = current_app.config
+            settings = [config['CLOUDINARY_CLOUD_NAME'], config['CLOUDINARY_API_KEY'], config['CLOUDINARY_API_SECRET']]
+            if not all(settings):
+                raise ValueError("Missing Cloudinary configuration. Please check your environment variables.")
+            cloudinary.config(cloud_name=settings[0], api_key=settings[1], api_secret=settings[2])
+            _cloudinary_state['configured'] = True
+        if verify and not _cloudinary_state['verified']:
+            try:
+                cloudinary.api.ping()
+                logger.info("Cloudinary configuration verified successfully")
+            except Exception as e:
+                logger.error("Cloudinary configuration error: %s", e)
+            # Only ever attempted once per process; failures surface on the real call
+            _cloudinary_state['verified'] = True
+    return cloudinary
+
+
+class Storage(ABC):
+    """Interface of the storage drivers; a driver missing a method can't be instantiated.
+
+    Transformations are given as Cloudinary-style keyword arguments:
+    ``width``, ``height`` and ``crop`` (``fill`` or ``limit``).
+    """
+    name = None
+
+    @abstractmethod
+    def put(self, source):
+        """Store a file path or file object; returns its key. Raises on failure."""
+
+    @abstractmethod
+    def get(self, key):
+        """Bytes of the stored original."""
+
+    @abstractmethod
+    def delete(self, keys):
+        """Delete a batch of keys; returns the ones that are gone (including never stored)."""
+
+    @abstractmethod
+    def list(self):
+        """Yield ``{'public_id', 'created_at'}`` (ISO 8601) for every stored original."""
+
+    @abstractmethod
+    def url(self, key, **transform):
+        """Delivery URL of ``key`` with the transformation applied."""
+
+    @abstractmethod
+    def transform(self, key, **transform):
+        """Bytes of ``key`` with the transformation applied."""
+
+
+def _download(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return response.read()
+
+
+class CloudinaryStorage(Storage):
+    name = 'cloudinary'
+
+    def put(self, source):
+        config = current_app.config
+        client = cloudinary_client(verify=True)
+        upload_result = client.uploader.upload(
+            source,
+            folder=UPLOAD_FOLDER,
+            resource_type="auto",
+            api_key=config['CLOUDINARY_API_KEY'],
+            api_secret=config['CLOUDINARY_API_SECRET'],
+            cloud_name=config['CLOUDINARY_CLOUD_NAME']
+        )
+        if 'public_id' not in upload_result:
+            raise RuntimeError(f"Upload failed: {upload_result}")
+        return upload_result['public_id']
+
+    def get(self, key):
+        return _download(self.url(key))
+
+    def delete(self, keys):
+        result = cloudinary_client(verify=True).api.delete_resources(keys)
+        statuses = result.get('deleted', {})
+        # "not_found" means a previous attempt already removed it
+        return [key for key in keys if statuses.get(key) in ('deleted', 'not_found')]
+
+    def list(self):
+        client = cloudinary_client(verify=True)
+        cursor = None
+        while True:
+            options = {'next_cursor': cursor} if cursor else {}
+            with time_image_host('list'):
+                result = client.api.resources(type='upload', prefix=UPLOAD_FOLDER + '/', max_results=500, **options)
+            yield from result.get('resources', [])
+            cursor = result.get('next_cursor')
+            if not cursor:
+                return
+
+    def url(self, key, **transform):
+        return cloudinary_client().CloudinaryImage(key).build_url(**transform)
+
+    def transform(self, key, **transform):
+        return _download(self.url(key, **transform))
+
+
+# Keys the local driver hands out: folder/first two hex digits/full digest + extension
+LOCAL_KEY = re.compile(r'^[\w-]+/[0-9a-f]{2}/([0-9a-f]{64})(\.[a-z0-9]+)?$')
+DERIVED_FOLDER = '_derived'
+CHUNK_SIZE = 1024 * 1024
+
+
+def _variant(width=None, height=None, crop=None, **ignored):
+    return int(width or 0), int(height or 0), crop or 'limit'
+
+
+class LocalStorage(Storage):
+    """Files on disk under ``root``; variants are rendered lazily into ``root/_derived``.
+
+    ``variants`` is the set of ``(width, height, crop)`` the media endpoint
+    agrees to render; anything else is a 404.
+    """
+    name = 'local'
+
+    def __init__(self, root, url_prefix='/media', variants=(), quality=82):
+        self.root = os.path.abspath(root)
+        self.url_prefix = url_prefix.rstrip('/')
+        self.variants = set(variants)
+        self.quality = quality
+
+    @classmethod
+    def from_config(cls, config, root=None):
+        variants = {_variant(**options) for options in config['IMAGE_TRANSFORMS'].values()}
+        thumbnail = config['IMAGE_TRANSFORMS']['thumbnail']
+        aspect = thumbnail['height'] / thumbnail['width']
+        variants.update(_variant(**dict(thumbnail, width=width, height=round(width * aspect)))
+                        for width in config['IMAGE_SRCSET_WIDTHS'])
+        return cls(root or config['MEDIA_ROOT'], config['MEDIA_URL_PREFIX'], variants, config['IMAGE_QUALITY'])
+
+    def path(self, key):
+        """Filesystem path of ``key``; ``KeyError`` for anything that isn't one of our keys."""
+        if not LOCAL_KEY.match(key):
+            raise KeyError(key)
+        return os.path.join(self.root, *key.split('/'))
+
+    def _write(self, target, write):
+        # Write under a unique name and rename, so readers never see a partial file
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        base, extension = os.path.splitext(target)
+        temporary = f'{base}.{uuid.uuid4().hex}.tmp{extension}'
+        try:
+            write(temporary)
+            os.replace(temporary, target)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def put(self, source):
+        opened = isinstance(source, (str, os.PathLike))
+        f = open(source, 'rb') if opened else source
+        try:
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+            digest = digest.hexdigest()
+            extension = os.path.splitext(str(source if opened else getattr(f, 'name', '')))[1].lower()
+            key = f'{UPLOAD_FOLDER}/{digest[:2]}/{digest}{extension}'
+            target = self.path(key)
+            if not os.path.exists(target):
+                f.seek(0)
+
+                def copy(temporary):
+                    with open(temporary, 'wb') as out:
+                        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                            out.write(chunk)
+                self._write(target, copy)
+        finally:
+            if opened:
+                f.close()
+        return key
+
+    def get(self, key):
+        with open(self.path(key), 'rb') as f:
+            return f.read()
+
+    def _derived_path(self, key, variant):
+        digest, extension = LOCAL_KEY.match(key).groups()
+        width, height, crop = variant
+        return os.path.join(self.root, DERIVED_FOLDER, digest[:2],
+                            f'{digest}-{width}x{height}-{crop}{extension or ""}')
+
+    def delete(self, keys):
+        gone = []
+        for key in keys:
+            try:
+                path = self.path(key)
+            except KeyError:
+                gone.append(key)
+                continue
+            derived = os.path.dirname(self._derived_path(key, (0, 0, '')))
+            prefix = LOCAL_KEY.match(key).group(1) + '-'
+            try:
+                for name in os.listdir(derived):
+                    if name.startswith(prefix):
+                        os.remove(os.path.join(derived, name))
+            except FileNotFoundError:
+                pass
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Could not delete %s: %s", path, e)
+                continue
+            gone.append(key)
+        return gone
+
+    def list(self):
+        folder = os.path.join(self.root, UPLOAD_FOLDER)
+        for directory, _, names in os.walk(folder):
+            for name in sorted(names):
+                key = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/')
+                if not LOCAL_KEY.match(key):
+                    continue  # Temporary files of a write in progress
+                stat = os.stat(os.path.join(directory, name))
+                created = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+                yield {'public_id': key, 'bytes': stat.st_size, 'created_at': created.isoformat()}
+
+    def url(self, key, **transform):
+        width, height, crop = _variant(**transform)
+        query = {'w': width, 'h': height, 'c': crop} if transform else {}
+        return f'{self.url_prefix}/{key}' + (f'?{urlencode(query)}' if query else '')
+
+    def variant_path(self, key, variant=None):
+        """Path of the original (``variant`` None) or of a rendered variant, rendering it if needed.
+
+        Raises ``KeyError`` for unknown keys or variants and
+        ``FileNotFoundError`` when the original is missing.
+        """
+        original = self.path(key)
+        if variant is None:
+            if not os.path.exists(original):
+                raise FileNotFoundError(original)
+            return original
+        if variant not in self.variants:
+            raise KeyError(variant)
+        derived = self._derived_path(key, variant)
+        if not os.path.exists(derived):
+            if not os.path.exists(original):
+                raise FileNotFoundError(original)
+            # Pillow is only needed here, keep it out of the web process's import path
+            from imaging import render_variant
+
+            self._write(derived, lambda temporary: render_variant(original, temporary, *variant,
+                                                                  quality=self.quality))
+        return derived
+
+    def transform(self, key, **transform):
+        with open(self.variant_path(key, _variant(**transform)), 'rb') as f:
+            return f.read()
+
+
+def get_storage():
+    return current_app.extensions['storage']
+
+
+bp = Blueprint('media', __name__)
+
+
+@bp.route('/<path:key>')
+def serve(key):
+    """A stored image, or one of its configured variants (``?w=&h=&c=``)."""
+    backend = get_storage()
+    variant = None
+    if request.args:
+        try:
+            variant = (request.args.get('w', 0, type=int), request.args.get('h', 0, type=int),
+                       request.args.get('c', 'limit'))
+        except ValueError:
+            abort(404)
+    try:
+        path = backend.variant_path(key, variant)
+    except (KeyError, FileNotFoundError):
+        abort(404)
+
+    # The key is the content hash, so the file name minus its extension is a strong validator
+    etag = os.path.splitext(os.path.basename(path))[0]
+    config = current_app.config
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    accel = config['MEDIA_ACCEL_REDIRECT']
+    if accel:
+        response = current_app.response_class(mimetype=mimetype)
+        response.set_etag(etag)
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+        else:
+            relative = os.path.relpath(path, backend.root).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = accel.rstrip('/') + '/' + relative
+    else:
+        # Conditional requests and Range are handled by werkzeug; the body goes
+        # through wsgi.file_wrapper (sendfile under gunicorn) or X-Sendfile
+        response = send_file(path, mimetype=mimetype, etag=etag, conditional=True,
+                             max_age=config['MEDIA_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.max_age = config['MEDIA_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    backend = app.config['STORAGE_BACKEND']
+    if backend == 'local':
+        app.extensions['storage'] = LocalStorage.from_config(app.config)
+        app.register_blueprint(bp, url_prefix=app.config['MEDIA_URL_PREFIX'])
+    elif backend == 'cloudinary':
+        app.extensions['storage'] = CloudinaryStorage()
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}: expected 'cloudinary' or 'local'")
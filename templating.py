@@ -0,0 +1,59 @@
+# templating.py
+"""Jinja bytecode cache, filled at build time.
+
+Each process compiles a template from source the first time it renders it,
+which a cold serverless instance pays for on its first request.
+``flask compile-templates`` compiles every template into
+``TEMPLATE_CACHE_DIR`` while building; processes then load the compiled
+code from there. Entries are keyed by template name and checked against a
+checksum of the source and the Python version, so an edited template or a
+different interpreter just compiles again. A directory that can't be
+written (read-only deployments) is only read from.
+"""
+import logging
+import os
+
+import click
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+
+class BytecodeCache(FileSystemBytecodeCache):
+    """``FileSystemBytecodeCache`` that renders anyway when it can't write."""
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError as e:
+            logger.debug("Template bytecode not cached: %s", e)
+
+
+def compile_templates(app):
+    """Compile every template into the bytecode cache; returns their names."""
+    env = app.jinja_env
+    env.cache.clear()  # Force a load, which writes the bytecode
+    names = [name for name in env.list_templates() if name.endswith('.html')]
+    for name in names:
+        env.get_template(name)
+    return names
+
+
+@click.command('compile-templates')
+def compile_templates_command():
+    """Compile the templates into TEMPLATE_CACHE_DIR (run before deploying)."""
+    names = compile_templates(current_app)
+    click.echo(f"Compiled {len(names)} template(s) into {current_app.config['TEMPLATE_CACHE_DIR']}")
+
+
+def init_app(app):
+    directory = app.config['TEMPLATE_CACHE_DIR']
+    if not directory:
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        pass  # Read-only: use whatever the build left there
+    if os.path.isdir(directory):
+        app.jinja_env.bytecode_cache = BytecodeCache(directory)
@@ -0,0 +1,105 @@
+"""Test setup: the app against scratch SQLite files, with the image host faked.
+
+The app is imported once (``run`` builds it at import time) through
+``benchmarks.harness.create_app``, which overwrites the database and
+Cloudinary settings so a developer's ``.env`` is never used. The schema
+comes from the migrations, FTS triggers included; each test starts from a
+copy of the freshly migrated database, an empty cache and an empty staging
+directory.
+
+A read replica is configured so the routing hooks are registered, but its
+engine is taken out of ``db.engines`` unless a test asks for ``replica``:
+everything else reads the primary.
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+SCRATCH = tempfile.mkdtemp(prefix='draw-tests-')
+DATABASE_PATH = os.path.join(SCRATCH, 'primary.db')
+REPLICA_PATH = os.path.join(SCRATCH, 'replica.db')
+MIGRATED_PATH = os.path.join(SCRATCH, 'migrated.db')
+PASSWORD = 'secret12'
+
+
+@pytest.fixture(scope='session')
+def _app():
+    from benchmarks.harness import create_app
+
+    app = create_app('sqlite:///' + DATABASE_PATH, DATABASE_REPLICA_URLS='sqlite:///' + REPLICA_PATH,
+                     JOB_MODE='external', CACHE_URL='memory://', PASSWORD_HASH_METHOD='pbkdf2:sha256:1000',
+                     UPLOAD_STAGING_DIR=os.path.join(SCRATCH, 'staging'), TEMPLATE_CACHE_DIR='',
+                     STORAGE_BACKEND='cloudinary', IMAGE_PROCESS_WORKERS=0, DB_PROFILE='pooled')
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    from flask_migrate import Migrate, upgrade
+
+    from models import db
+
+    Migrate(app, db)
+    with app.app_context():
+        upgrade()
+        replica = db.engines['replica_0']
+        db.engine.dispose()
+    shutil.copy(DATABASE_PATH, MIGRATED_PATH)
+    app.extensions['test_replica'] = replica
+    return app
+
+
+@pytest.fixture
+def app(_app, monkeypatch):
+    from benchmarks import fake_cloudinary
+    from models import db
+
+    with _app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+        shutil.copy(MIGRATED_PATH, DATABASE_PATH)
+        monkeypatch.delitem(db.engines, 'replica_0')
+    shutil.rmtree(_app.config['UPLOAD_STAGING_DIR'], ignore_errors=True)
+    _app.extensions['cache'].clear()
+    _app.extensions['fake_cloudinary'] = fake_cloudinary.install()
+    with _app.app_context():
+        yield _app
+        db.session.remove()
+
+
+@pytest.fixture
+def replica(app, monkeypatch):
+    """Route ``@read_only`` reads to a copy of the database; returns ``replicate()``, which refreshes it."""
+    from models import db
+
+    engine = app.extensions['test_replica']
+
+    def replicate():
+        engine.dispose()
+        db.session.remove()
+        shutil.copy(DATABASE_PATH, REPLICA_PATH)
+
+    replicate()
+    monkeypatch.setitem(db.engines, 'replica_0', engine)
+    return replicate
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    from models import db, User
+    from passwords import hash_password
+
+    account = User(username='tester', email='tester@example.com', password=hash_password(PASSWORD))
+    db.session.add(account)
+    db.session.commit()
+    return account.id
+
+
+@pytest.fixture
+def logged_in(client, user):
+    response = client.post('/', data={'username': 'tester', 'password': PASSWORD})
+    assert response.status_code == 302
+    return client
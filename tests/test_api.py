@@ -0,0 +1,89 @@
+import pytest
+
+from models import db, Product
+
+
+@pytest.fixture
+def products(app):
+    db.session.add_all([Product(name=f'Item {i}', price=i) for i in range(1, 6)])
+    db.session.commit()
+
+
+def ids(response):
+    return [item['id'] for item in response.get_json()['items']]
+
+
+def test_errors_are_json_and_keep_their_headers(logged_in):
+    response = logged_in.get('/api/v1/likes')
+    assert response.status_code == 405
+    assert response.is_json and 'error' in response.get_json()
+    assert 'POST' in response.headers['Allow']
+
+    response = logged_in.post('/api/v1/products/99/like', json={'liked': True})
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Product not found'}
+
+
+def test_anonymous_requests_get_401(client):
+    response = client.get('/api/v1/products')
+    assert response.status_code == 401
+    assert 'error' in response.get_json()
+
+
+def test_cursor_pagination_round_trip(logged_in, products):
+    first = logged_in.get('/api/v1/products?sort=newest&per_page=2&fields=id')
+    assert ids(first) == [5, 4]
+    assert first.get_json()['prev_cursor'] is None
+    second = logged_in.get(f"/api/v1/products?sort=newest&per_page=2&fields=id&cursor={first.get_json()['next_cursor']}")
+    assert ids(second) == [3, 2]
+    last = logged_in.get(f"/api/v1/products?sort=newest&per_page=2&fields=id&cursor={second.get_json()['next_cursor']}")
+    assert ids(last) == [1]
+    assert last.get_json()['has_next'] is False and last.get_json()['next_cursor'] is None
+
+    back = logged_in.get(f"/api/v1/products?sort=newest&per_page=2&fields=id&cursor={last.get_json()['prev_cursor']}")
+    assert ids(back) == [3, 2]
+    assert back.get_json()['has_prev'] is True
+
+
+def test_fields_select_the_keys(logged_in, products):
+    response = logged_in.get('/api/v1/products?fields=name,liked&per_page=1&sort=newest')
+    assert response.get_json()['items'] == [{'name': 'Item 5', 'liked': False}]
+    response = logged_in.get('/api/v1/products?fields=name,secret')
+    assert response.status_code == 400
+    assert 'secret' in response.get_json()['error']
+
+
+def test_oversized_batch_is_rejected(app, logged_in, products, monkeypatch):
+    monkeypatch.setitem(app.config, 'API_MAX_BATCH', 3)
+    response = logged_in.post('/api/v1/likes', json={'changes': [{'product_id': i, 'liked': True} for i in range(1, 5)]})
+    assert response.status_code == 400
+    assert 'At most 3' in response.get_json()['error']
+    assert db.session.scalar(db.select(db.func.sum(Product.likes_count))) == 0
+
+
+def test_batch_reports_each_product(logged_in, products):
+    response = logged_in.post('/api/v1/likes', json={'changes': [
+        {'product_id': 2, 'liked': True},
+        {'product_id': 99, 'liked': True},
+        {'product_id': 1, 'liked': True},
+        {'product_id': 2, 'liked': False},  # The last change for a product wins
+    ]})
+    assert response.status_code == 200
+    assert response.get_json()['results'] == [
+        {'product_id': 1, 'liked': True, 'likes_count': 1},
+        {'product_id': 2, 'liked': False, 'likes_count': 0},
+        {'product_id': 99, 'error': 'not_found'},
+    ]
+
+
+def test_malformed_batch_is_rejected(logged_in, products):
+    for body in ({}, {'changes': []}, {'changes': [{'product_id': '1', 'liked': True}]}):
+        response = logged_in.post('/api/v1/likes', json=body)
+        assert response.status_code == 400 and 'error' in response.get_json()
+
+
+def test_unknown_api_url_is_json_but_pages_are_not(logged_in):
+    response = logged_in.get('/api/v1/nothing-here')
+    assert response.status_code == 404 and 'error' in response.get_json()
+    response = logged_in.get('/nothing-here')
+    assert response.status_code == 404 and not response.is_json
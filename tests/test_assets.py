@@ -0,0 +1,88 @@
+import gzip
+import os
+import shutil
+
+import pytest
+
+import assets
+
+
+@pytest.fixture
+def built(app, tmp_path, monkeypatch):
+    """A build of the assets in a scratch static folder; returns the manifest."""
+    for name in assets.FINGERPRINTED:
+        shutil.copy(os.path.join(app.static_folder, name), tmp_path / name)
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+    manifest = assets.build_assets(str(tmp_path))
+    monkeypatch.setitem(app.extensions, 'assets', manifest)
+    return manifest
+
+
+def url(app, name):
+    with app.test_request_context():
+        return assets.asset_url(name)
+
+
+def test_build_fingerprints_and_compresses(app, built):
+    path = os.path.join(app.static_folder, built['styles.css'])
+    assert assets.FINGERPRINTED_NAME.match(os.path.basename(path))
+    with open(path, 'rb') as f, gzip.open(path + '.gz') as compressed:
+        assert compressed.read() == f.read()
+    assert url(app, 'styles.css') == '/static/' + built['styles.css']
+
+
+def test_gzip_is_served_to_clients_accepting_it(app, client, built):
+    response = client.get(url(app, 'styles.css'), headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.status_code == 200
+    assert response.content_encoding == 'gzip'
+    with open(os.path.join(app.static_folder, 'styles.css'), 'rb') as f:
+        assert gzip.decompress(response.data) == f.read()
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_brotli_is_preferred_when_built(app, client, built):
+    path = os.path.join(app.static_folder, built['styles.css'])
+    with open(path + '.br', 'wb') as f:
+        f.write(b'brotli bytes')
+    response = client.get(url(app, 'styles.css'), headers={'Accept-Encoding': 'gzip, br'})
+    assert response.content_encoding == 'br'
+    assert response.data == b'brotli bytes'
+    response = client.get(url(app, 'styles.css'), headers={'Accept-Encoding': 'gzip'})
+    assert response.content_encoding == 'gzip'
+
+
+def test_identity_without_a_precompressed_file(app, client, built):
+    path = os.path.join(app.static_folder, built['script.js'])
+    for suffix in ('.gz', '.br'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    response = client.get(url(app, 'script.js'), headers={'Accept-Encoding': 'gzip, br'})
+    assert response.status_code == 200
+    assert response.content_encoding is None
+    with open(path, 'rb') as f:
+        assert response.data == f.read()
+    assert 'Accept-Encoding' in response.vary
+
+    response = client.get(url(app, 'styles.css'), headers={'Accept-Encoding': 'identity'})
+    assert response.content_encoding is None
+    assert response.headers['ETag'].endswith('-identity"')
+
+
+def test_only_fingerprinted_urls_are_immutable(app, client, built):
+    response = client.get(url(app, 'styles.css'))
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == assets.ASSET_MAX_AGE
+
+    response = client.get('/static/styles.css')
+    assert response.status_code == 200
+    assert not response.cache_control.immutable
+
+
+def test_unknown_or_unfingerprinted_dist_files_are_404(app, client, built):
+    assert client.get('/static/dist/styles.000000000000.css').status_code == 404
+    assert client.get('/static/dist/manifest.json').status_code == 404
+
+
+def test_without_a_build_urls_fall_back_to_static(app, monkeypatch):
+    monkeypatch.setitem(app.extensions, 'assets', {})
+    assert url(app, 'styles.css') == '/static/styles.css'
@@ -0,0 +1,54 @@
+import cache
+from models import db, CacheVersion, Product
+
+
+def add_product(name='Lamp'):
+    product = Product(name=name, price=1)
+    db.session.add(product)
+    db.session.commit()
+    return product.id
+
+
+def etag_of_home(client):
+    client.get('/home')  # Pages showing flash messages get no ETag
+    return client.get('/home').headers['ETag']
+
+
+def test_unchanged_home_revalidates(logged_in):
+    add_product()
+    etag = etag_of_home(logged_in)
+    response = logged_in.get('/home', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+
+
+def test_restarted_worker_does_not_revalidate_stale_page(app, logged_in):
+    product_id = add_product()
+    etag = etag_of_home(logged_in)
+    logged_in.post(f'/toggle_like/{product_id}')
+    logged_in.get('/home')  # The "liked" flash message
+
+    app.extensions['cache'].clear()  # What a restarted (or another) worker has in memory
+    response = logged_in.get('/home', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_write_in_another_process_invalidates_the_listing(app, logged_in):
+    add_product('Lamp')
+    assert b'Lamp' in logged_in.get('/home').data
+    # Another worker adds a product and bumps the shared version; this process's cache has the old listing
+    add_product('Kettle')
+    db.session.execute(db.update(CacheVersion).where(CacheVersion.namespace == 'catalog')
+                       .values(version=CacheVersion.version + 1))
+    db.session.commit()
+    assert b'Kettle' in logged_in.get('/home').data
+
+
+def test_bump_updates_version_and_last_modified(app):
+    catalog, likes = cache.versions('catalog', 'likes')
+    assert cache.last_modified('catalog', 'likes') is None
+    cache.bump('likes')
+    assert cache.versions('catalog', 'likes') == (catalog, likes + 1)
+    assert cache.last_modified('catalog') is None
+    assert cache.last_modified('catalog', 'likes') is not None
@@ -0,0 +1,43 @@
+import pytest
+from PIL import Image
+
+from imaging import preprocess_image
+
+
+def save(tmp_path, name, size, mode='RGB', **options):
+    path = str(tmp_path / name)
+    Image.new(mode, size, 'white' if mode != 'P' else 0).save(path, **options)
+    return path
+
+
+def test_oversized_image_is_rejected_before_decoding(tmp_path, monkeypatch):
+    path = save(tmp_path, 'huge.png', (5000, 4000))
+    decoded = []
+    monkeypatch.setattr(Image.Image, 'load', lambda self: decoded.append(self) or None)
+    with pytest.raises(ValueError, match='over the limit'):
+        preprocess_image(path, 1600, max_pixels=10_000_000)
+    assert decoded == []
+
+
+def test_large_png_is_reduced_to_the_max_edge(tmp_path):
+    path = save(tmp_path, 'wide.png', (6400, 2000))
+    with Image.open(preprocess_image(path, 1600)) as processed:
+        assert processed.format == 'WEBP'
+        assert processed.size == (1600, 500)
+
+
+def test_reduce_keeps_exif_orientation(tmp_path):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotate 90 degrees
+    path = save(tmp_path, 'rotated.png', (4000, 1000), exif=exif.tobytes())
+    with Image.open(preprocess_image(path, 1000)) as processed:
+        assert processed.size == (250, 1000)
+        assert not processed.getexif()
+
+
+@pytest.mark.parametrize('mode', ['P', '1', 'LA'])
+def test_modes_reduce_does_not_handle_still_shrink(tmp_path, mode):
+    path = save(tmp_path, f'{mode}.png', (4000, 3000), mode=mode)
+    with Image.open(preprocess_image(path, 800, fmt='JPEG')) as processed:
+        assert processed.size == (800, 600)
+        assert processed.mode == 'RGB'
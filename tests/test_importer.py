@@ -0,0 +1,76 @@
+import json
+import shutil
+
+import pytest
+from PIL import Image
+
+import importer
+from models import db, Product
+from storage import LocalStorage
+
+MANIFEST = """name,price,image
+Alpha,1,a.png
+Beta,2,b.png
+Alpha again,3,a_copy.png
+Missing,4,missing.png
+Bad price,abc,c.png
+Gamma,6,c.png
+"""
+
+
+@pytest.fixture
+def catalogue(tmp_path):
+    """A manifest and its images; ``a_copy.png`` has the same bytes as ``a.png``."""
+    images = tmp_path / 'images'
+    images.mkdir()
+    for name, color in (('a', 'red'), ('b', 'green'), ('c', 'blue')):
+        Image.new('RGB', (40, 30), color).save(images / f'{name}.png')
+    shutil.copy(images / 'a.png', images / 'a_copy.png')
+    manifest = tmp_path / 'products.csv'
+    manifest.write_text(MANIFEST)
+    return manifest, images, tmp_path / 'media'
+
+
+def run_import(app, catalogue):
+    manifest, images, media = catalogue
+    # Called directly: CLI commands are only registered when the app is loaded by "flask"
+    return app.test_cli_runner().invoke(importer.import_products_command, [
+        str(manifest), '--images', str(images), '--owner', 'tester',
+        '--batch-size', '2', '--workers', '2', '--offline', str(media),
+    ])
+
+
+def test_interrupted_import_resumes_without_duplicates(app, user, catalogue, monkeypatch):
+    monkeypatch.setitem(app.extensions, 'storage', app.extensions['storage'])  # --offline replaces it
+    manifest, images, media = catalogue
+    import_batch = importer.Importer.import_batch
+    calls = []
+
+    def killed_at_the_second_batch(self, rows, first_row, errors):
+        calls.append(first_row)
+        if len(calls) == 2:
+            raise RuntimeError('killed')
+        return import_batch(self, rows, first_row, errors)
+
+    monkeypatch.setattr(importer.Importer, 'import_batch', killed_at_the_second_batch)
+    result = run_import(app, catalogue)
+    assert str(result.exception) == 'killed'
+    assert importer.load_checkpoint(str(manifest) + '.checkpoint') == 2
+    assert db.session.scalars(db.select(Product.name).order_by(Product.id)).all() == ['Alpha', 'Beta']
+
+    monkeypatch.setattr(importer.Importer, 'import_batch', import_batch)
+    result = run_import(app, catalogue)
+    assert result.exit_code == 1  # Two rows failed
+    assert 'Resuming after 2 rows' in result.output
+    assert importer.load_checkpoint(str(manifest) + '.checkpoint') == 6
+
+    products = db.session.execute(db.select(Product.name, Product.image_file).order_by(Product.id)).all()
+    assert [name for name, _ in products] == ['Alpha', 'Beta', 'Alpha again', 'Gamma']
+    files = dict(products)
+    assert files['Alpha again'] == files['Alpha']  # Same bytes, uploaded once
+    stored = [item['public_id'] for item in LocalStorage(str(media)).list()]
+    assert sorted(stored) == sorted({files['Alpha'], files['Beta'], files['Gamma']})
+
+    with open(str(manifest) + '.errors.jsonl') as f:
+        errors = [json.loads(line) for line in f]
+    assert [(error['row'], error['data']['name']) for error in errors] == [(4, 'Missing'), (5, 'Bad price')]
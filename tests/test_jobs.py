@@ -0,0 +1,92 @@
+import io
+import os
+
+from PIL import Image
+
+from jobs import run_pending
+from models import db, ImageTombstone, Job, Product, utcnow
+
+
+def jpeg(color='red', size=(2400, 1800)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    buffer.seek(0)
+    return buffer
+
+
+def add_product(client, image, name='Poster'):
+    response = client.post('/add_product', data={'name': name, 'price': '3', 'image': (image, 'poster.jpg')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    return db.session.scalar(db.select(Product.id).where(Product.name == name))
+
+
+def staged_files(app):
+    return os.listdir(app.config['UPLOAD_STAGING_DIR'])
+
+
+def test_upload_is_processed_by_the_job(app, logged_in):
+    product_id = add_product(logged_in, jpeg())
+    product = db.session.get(Product, product_id)
+    assert product.image_status == 'pending' and product.image_file is None
+    assert db.session.scalars(db.select(Job.kind)).all() == ['upload_image']
+
+    assert run_pending() == 1
+    db.session.expire_all()
+    product = db.session.get(Product, product_id)
+    assert product.image_status == 'ready'
+    stored = app.extensions['fake_cloudinary'].uploader.stored
+    assert list(stored) == [product.image_file]
+    assert product.image_urls['thumbnail'].endswith(product.image_file)
+    assert staged_files(app) == []
+    assert db.session.scalar(db.select(db.func.count()).select_from(Job)) == 0
+
+
+def test_identical_image_is_uploaded_once(app, logged_in):
+    first = add_product(logged_in, jpeg(), 'First')
+    second = add_product(logged_in, jpeg(), 'Second')
+    assert run_pending() == 2
+    db.session.expire_all()
+    assert db.session.get(Product, first).image_file == db.session.get(Product, second).image_file
+    assert len(app.extensions['fake_cloudinary'].uploader.stored) == 1
+
+
+def test_failed_upload_is_retried_then_marked_failed(app, logged_in, monkeypatch):
+    monkeypatch.setitem(app.config, 'JOB_MAX_ATTEMPTS', 2)
+
+    def unavailable(source, **options):
+        raise ConnectionError('Image host unavailable')
+
+    monkeypatch.setattr(app.extensions['fake_cloudinary'].uploader, 'upload', unavailable)
+    product_id = add_product(logged_in, jpeg())
+
+    run_pending()
+    job = db.session.scalars(db.select(Job)).one()
+    assert (job.status, job.attempts) == ('queued', 1)
+    assert 'Image host unavailable' in job.last_error
+    assert job.run_at > utcnow()
+    assert db.session.get(Product, product_id).image_status == 'pending'
+
+    job.run_at = utcnow()
+    db.session.commit()
+    run_pending()
+    db.session.expire_all()
+    assert db.session.scalars(db.select(Job.status)).one() == 'failed'
+    assert db.session.get(Product, product_id).image_status == 'failed'
+    assert staged_files(app) == []
+
+
+def test_deleted_product_image_is_removed_in_a_batch(app, logged_in, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMAGE_DELETE_FLUSH_DELAY', 0)
+    product_id = add_product(logged_in, jpeg())
+    run_pending()
+    stored = app.extensions['fake_cloudinary'].uploader.stored
+    assert len(stored) == 1
+
+    assert logged_in.post(f'/delete_product/{product_id}').status_code == 302
+    assert db.session.scalar(db.select(db.func.count()).select_from(ImageTombstone)) == 1
+    assert len(stored) == 1  # Not while the request runs
+
+    assert run_pending() == 1
+    assert stored == {}
+    assert db.session.scalar(db.select(db.func.count()).select_from(ImageTombstone)) == 0
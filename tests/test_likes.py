@@ -0,0 +1,69 @@
+import random
+
+import models
+from models import db, Like, Product, User, set_like, toggle_like
+
+
+def add_products(count=3):
+    db.session.add_all([Product(name=f'Item {i}', price=1) for i in range(count)])
+    db.session.commit()
+
+
+def add_users(count):
+    users = [User(username=f'fan{i}', email=f'fan{i}@example.com', password='-') for i in range(count)]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+def counters():
+    """``{product_id: (likes_count, rows in likes)}``."""
+    counted = dict(db.session.execute(db.select(Like.product_id, db.func.count()).group_by(Like.product_id)).all())
+    return {product.id: (product.likes_count, counted.get(product.id, 0))
+            for product in db.session.scalars(db.select(Product))}
+
+
+def test_toggling_twice_restores_the_counter(logged_in):
+    add_products(1)
+    assert logged_in.post('/toggle_like/1').status_code == 302
+    assert db.session.get(Product, 1).likes_count == 1
+    assert logged_in.post('/toggle_like/1').status_code == 302
+    db.session.expire_all()
+    assert db.session.get(Product, 1).likes_count == 0
+    assert counters() == {1: (0, 0)}
+
+
+def test_duplicate_like_from_a_concurrent_request_is_not_counted(app, logged_in, user, monkeypatch):
+    add_products(1)
+    toggle_like(1, user)
+    db.session.commit()
+    # The other request's DELETE ran before this one's like was committed, so it saw nothing to remove
+    monkeypatch.setattr(models, '_remove_like', lambda product_id, user_id: (0, 0.0))
+    response = logged_in.post('/toggle_like/1')
+    assert response.status_code == 302
+    db.session.expire_all()
+    assert counters() == {1: (1, 1)}
+
+
+def test_repeated_set_like_is_idempotent(logged_in):
+    add_products(1)
+    for _ in range(2):
+        response = logged_in.post('/api/v1/products/1/like', json={'liked': True})
+        assert response.status_code == 200
+        assert response.get_json()['likes_count'] == 1
+    assert counters() == {1: (1, 1)}
+
+
+def test_counter_matches_the_likes_after_mixed_changes(app):
+    add_products(3)
+    users = add_users(4)
+    rng = random.Random(7)
+    for _ in range(60):
+        product_id, user_id = rng.randint(1, 3), rng.choice(users)
+        if rng.random() < 0.5:
+            toggle_like(product_id, user_id)
+        else:
+            set_like(product_id, user_id, rng.random() < 0.5)
+        db.session.commit()
+    assert all(count == rows for count, rows in counters().values())
+    assert sum(rows for _, rows in counters().values()) > 0
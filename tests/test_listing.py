@@ -0,0 +1,84 @@
+import pytest
+
+from benchmarks.explain_listing import capture_statements, SORT_IN_PLAN
+from metrics import explain
+from models import db, Product, User
+from pagination import paginate
+from search import listing_query
+
+PER_PAGE = 4
+
+
+@pytest.fixture
+def catalog(app, user):
+    """The viewer's products interleaved with someone else's and ownerless ones; returns (viewer, owned, others)."""
+    other = User(username='other', email='other@example.com', password='-')
+    db.session.add(other)
+    db.session.commit()
+    owners = [user, other.id, None]
+    products = [Product(name=f'Item {i}', price=1, user_id=owners[i % 3]) for i in range(20)]
+    db.session.add_all(products)
+    db.session.commit()
+    owned = [product.id for product in reversed(products) if product.user_id == user]
+    others = [product.id for product in reversed(products) if product.user_id != user]
+    return user, owned, others
+
+
+def walk(viewer_id, **kwargs):
+    """Every page of the owner-first listing, following next cursors; returns the pages' product IDs."""
+    query, order_by, partitions = listing_query(viewer_id, '', '')
+    scope = (viewer_id, '', '')
+    pages, cursor = [], None
+    while True:
+        page = paginate(query, order_by, PER_PAGE, cursor=cursor, scope=scope, partitions=partitions, **kwargs)
+        pages.append([product.id for product in page.items])
+        if not page.next_cursor:
+            return pages
+        cursor, kwargs = page.next_cursor, {}
+
+
+def test_owner_first_listing_pages_across_the_boundary(app, catalog):
+    viewer_id, owned, others = catalog
+    with app.test_request_context():
+        pages = walk(viewer_id)
+    assert sum(pages, []) == owned + others
+    assert len(owned) % PER_PAGE  # One page holds the end of the first range and the start of the second
+    assert all(len(page) == PER_PAGE for page in pages[:-1])
+
+
+def test_page_link_inside_the_second_range(app, catalog):
+    viewer_id, owned, others = catalog
+    with app.test_request_context():
+        pages = walk(viewer_id, page=3)
+    assert sum(pages, []) == (owned + others)[2 * PER_PAGE:]
+
+
+def test_prev_cursor_returns_the_straddling_page(app, catalog):
+    viewer_id, owned, others = catalog
+    query, order_by, partitions = listing_query(viewer_id, '', '')
+    scope = (viewer_id, '', '')
+    with app.test_request_context():
+        straddling = paginate(query, order_by, PER_PAGE, page=2, scope=scope, partitions=partitions)
+        following = paginate(query, order_by, PER_PAGE, cursor=straddling.next_cursor, scope=scope,
+                             partitions=partitions)
+        back = paginate(query, order_by, PER_PAGE, cursor=following.prev_cursor, scope=scope, partitions=partitions)
+    assert [product.id for product in back.items] == [product.id for product in straddling.items] \
+        == (owned + others)[PER_PAGE:2 * PER_PAGE]
+
+
+def test_listing_queries_use_indexes_without_a_sort(app, catalog):
+    viewer_id = catalog[0]
+
+    def listings():
+        walk(viewer_id)
+        walk(viewer_id, page=2)
+
+    with app.test_request_context():
+        statements = capture_statements(db.engine, listings)
+        plans = [explain(statement, parameters) for statement, parameters in statements]
+    assert len(plans) > 5
+    for plan in plans:
+        assert not any(SORT_IN_PLAN['sqlite'].search(line) for line in plan), plan
+    used = ' '.join(sum(plans, []))
+    assert 'ix_products_user_id_id' in used
+    assert 'INTEGER PRIMARY KEY' in used
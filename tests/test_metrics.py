@@ -0,0 +1,56 @@
+import logging
+
+import pytest
+from sqlalchemy import event
+
+from models import db, Product
+
+
+@pytest.fixture
+def explained(app):
+    """Names of the engines ("primary", "replica") EXPLAIN statements ran on."""
+    ran = []
+    engines = {'primary': db.engine, 'replica': app.extensions['test_replica']}
+    listeners = {
+        name: lambda conn, cursor, statement, *args, name=name: ran.append(name) if statement.startswith('EXPLAIN') else None
+        for name in engines
+    }
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute', listeners[name])
+    yield ran
+    for name, engine in engines.items():
+        event.remove(engine, 'before_cursor_execute', listeners[name])
+
+
+def test_metrics_need_a_token(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', None)
+    assert client.get('/metrics').status_code == 404
+
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'scraper')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scraper'})
+    assert response.status_code == 200
+    assert '# TYPE http_requests_total counter' in response.get_data(as_text=True)
+
+
+def test_metrics_are_open_in_debug_mode(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', None)
+    monkeypatch.setattr(app, 'debug', True)
+    assert client.get('/metrics').status_code == 200
+
+
+def test_slow_request_plan_is_explained_on_the_replica(app, logged_in, replica, explained, monkeypatch, caplog):
+    db.session.add(Product(name='Lamp', price=1))
+    db.session.commit()
+    replica()
+    monkeypatch.setitem(app.config, 'SLOW_REQUEST_MS', 0.001)
+    # The migrations' logging.config.fileConfig() disabled the loggers that existed then
+    monkeypatch.setattr(logging.getLogger('metrics'), 'disabled', False)
+
+    with caplog.at_level(logging.WARNING, logger='metrics'):
+        assert logged_in.get('/home').status_code == 200
+    [record] = [record for record in caplog.records if record.getMessage().startswith('Slow request')]
+    assert 'products' in record.query
+    assert record.plan
+    assert explained and set(explained) == {'replica'}
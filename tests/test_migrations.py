@@ -0,0 +1,40 @@
+from flask_migrate import check, downgrade, upgrade
+from sqlalchemy import create_engine, text
+
+from models import db, Product
+from search import filter_products
+
+
+# The table and triggers; FTS5's shadow tables (products_fts_data, ...) follow from the table
+FTS_OBJECTS = text("SELECT type, name, sql FROM sqlite_master WHERE (type = 'trigger' AND tbl_name = 'products') "
+                   "OR name = 'products_fts' ORDER BY name")
+
+
+def triggers():
+    return sorted(db.session.scalars(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")))
+
+
+def test_models_match_the_migrations(app):
+    # Raises (and exits) if autogenerate finds anything to do
+    check()
+
+
+def test_fts_triggers_survive_downgrade_and_upgrade(app):
+    assert triggers() == ['products_fts_ad', 'products_fts_ai', 'products_fts_au']
+    db.session.remove()
+    downgrade(revision='0003')
+    upgrade()
+    assert triggers() == ['products_fts_ad', 'products_fts_ai', 'products_fts_au']
+
+    db.session.add(Product(name='Lantern festival', price=1))
+    db.session.commit()
+    assert [product.name for product in filter_products(Product.query, 'festiv')] == ['Lantern festival']
+
+
+def test_create_all_builds_the_same_fts_objects_as_the_migrations(app):
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    with engine.connect() as connection:
+        created = connection.execute(FTS_OBJECTS).all()
+    assert [name for _, name, _ in created] == ['products_fts', 'products_fts_ad', 'products_fts_ai', 'products_fts_au']
+    assert created == db.session.execute(FTS_OBJECTS).all()
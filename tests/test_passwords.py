@@ -0,0 +1,85 @@
+import time
+
+import pytest
+from werkzeug.exceptions import TooManyRequests
+from werkzeug.security import generate_password_hash
+
+from conftest import PASSWORD
+from models import db, User
+from passwords import PasswordHasher, normalize_method
+
+
+def stored_hash(user_id):
+    db.session.expire_all()
+    return db.session.get(User, user_id).password
+
+
+def login(client, password=PASSWORD):
+    return client.post('/', data={'username': 'tester', 'password': password})
+
+
+@pytest.fixture
+def outdated(user):
+    """The test user with a hash made with fewer iterations than configured."""
+    db.session.get(User, user).password = generate_password_hash(PASSWORD, method='pbkdf2:sha256:500')
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def saturated(app, monkeypatch):
+    """A hasher with one slot, taken, and no room to wait for it."""
+    hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'], concurrency=1, max_waiting=0, wait_seconds=5)
+    monkeypatch.setitem(app.extensions, 'passwords', hasher)
+    hasher._slots.acquire()
+    yield hasher
+    hasher._slots.release()
+
+
+def test_normalize_method_spells_out_defaults():
+    assert normalize_method('scrypt') == 'scrypt:32768:8:1'
+    assert normalize_method('pbkdf2:sha256:1000') == 'pbkdf2:sha256:1000'
+    assert normalize_method('pbkdf2').startswith('pbkdf2:sha256:')
+
+
+def test_login_rehashes_an_outdated_hash(app, client, outdated):
+    assert login(client).status_code == 302
+    assert stored_hash(outdated).startswith(normalize_method(app.config['PASSWORD_HASH_METHOD']) + '$')
+
+
+def test_failed_login_keeps_the_hash(client, outdated):
+    before = stored_hash(outdated)
+    assert login(client, 'wrong').status_code == 200
+    assert stored_hash(outdated) == before
+
+
+def test_current_hash_is_not_rewritten(client, user):
+    before = stored_hash(user)
+    assert login(client).status_code == 302
+    assert stored_hash(user) == before
+
+
+def test_login_succeeds_when_the_rehash_gets_no_slot(app, client, outdated, monkeypatch):
+    def busy(password):
+        raise TooManyRequests()
+
+    monkeypatch.setattr(app.extensions['passwords'], 'hash', busy)
+    before = stored_hash(outdated)
+    assert login(client).status_code == 302
+    assert stored_hash(outdated) == before  # Retried at the next login
+
+
+def test_saturated_hashing_answers_429_without_waiting(client, user, saturated):
+    started = time.perf_counter()
+    response = login(client)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert time.perf_counter() - started < 1
+
+
+def test_waiting_for_a_slot_times_out(app, saturated):
+    saturated.max_waiting, saturated.wait_seconds = 1, 0.05
+    with pytest.raises(TooManyRequests) as raised:
+        saturated.verify(generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000'), PASSWORD)
+    assert raised.value.retry_after >= 1
+    assert saturated._waiting == 0
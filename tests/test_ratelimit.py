@@ -0,0 +1,128 @@
+import pytest
+
+import ratelimit
+from metrics import REGISTRY
+from models import db, Like, Product
+
+CLOCK = [1000.0]
+
+
+@pytest.fixture
+def limiter(app, monkeypatch):
+    """Admission control switched on with small limits and empty buckets; returns the control."""
+    control = app.extensions['ratelimit']
+    monkeypatch.setattr(control, 'enabled', True)
+    monkeypatch.setattr(control, 'buckets', ratelimit.MemoryBuckets())
+    monkeypatch.setattr(control, 'limits', {
+        'auth': {'user': None, 'ip': ratelimit.parse_limit('3/minute')},
+        'like': {'user': ratelimit.parse_limit('5/minute'), 'ip': None},
+    })
+    monkeypatch.setattr(control, 'slots', {'like': ratelimit.threading.BoundedSemaphore(1)})
+    return control
+
+
+@pytest.fixture
+def products(app):
+    db.session.add_all([Product(name=f'Item {i}', price=1) for i in range(8)])
+    db.session.commit()
+
+
+def likes():
+    return db.session.scalar(db.select(db.func.count()).select_from(Like))
+
+
+def test_bucket_refills_at_its_rate(monkeypatch):
+    monkeypatch.setattr(ratelimit.time, 'monotonic', lambda: CLOCK[0])
+    buckets = ratelimit.MemoryBuckets()
+    capacity, rate = ratelimit.parse_limit('2/minute')
+    assert [buckets.take('k', capacity, rate) for _ in range(2)] == [0, 0]
+    assert buckets.take('k', capacity, rate) == pytest.approx(30)
+    CLOCK[0] += 30
+    assert buckets.take('k', capacity, rate) == 0
+    CLOCK[0] += 600  # Never more than the capacity
+    assert buckets.take('k', capacity, rate, cost=2) == 0
+    assert buckets.take('k', capacity, rate) == pytest.approx(30)
+
+
+def test_take_is_all_or_nothing():
+    buckets = ratelimit.MemoryBuckets()
+    assert buckets.take('k', 5, 1, cost=4) == 0
+    assert buckets.take('k', 5, 1, cost=3) == pytest.approx(2, abs=0.1)
+    assert buckets.take('k', 5, 1) == 0  # The refused request took nothing
+
+
+def test_exhausted_bucket_gets_429_with_retry_after(limiter, logged_in, products):
+    assert [logged_in.post('/toggle_like/1').status_code for _ in range(5)] == [302] * 5
+    response = logged_in.post('/toggle_like/1')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    response = logged_in.post('/api/v1/products/1/like', json={'liked': True})
+    assert response.status_code == 429 and 'Retry-After' in response.headers
+    assert 'error' in response.get_json()
+    assert 'ratelimit_rejected_total{endpoint_class="like",reason="user"}' in REGISTRY.render()
+
+
+def test_batch_is_charged_per_change(limiter, logged_in, products):
+    def batch(*product_ids):
+        return logged_in.post('/api/v1/likes', json={'changes': [{'product_id': i, 'liked': True} for i in product_ids]})
+
+    assert batch(1, 2, 3).status_code == 200
+    response = batch(4, 5, 6)  # Two tokens left
+    assert response.status_code == 429 and 'Retry-After' in response.headers
+    assert likes() == 3
+    assert batch(4, 5).status_code == 200
+    assert likes() == 5
+
+
+def test_batch_larger_than_the_bucket_is_refused(limiter, logged_in, products):
+    response = logged_in.post('/api/v1/likes', json={'changes': [{'product_id': i, 'liked': True}
+                                                                 for i in range(1, 7)]})
+    assert response.status_code == 400
+    assert likes() == 0
+
+
+def test_concurrency_cap_and_release_after_an_error(limiter, logged_in, products, monkeypatch):
+    import run
+
+    slots = limiter.slots['like']
+    slots.acquire()
+    try:
+        assert logged_in.post('/toggle_like/1').status_code == 429
+    finally:
+        slots.release()
+
+    def broken(product_id, user_id):
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr(run, 'toggle_product_like', broken)
+    with pytest.raises(RuntimeError):
+        logged_in.post('/toggle_like/1')
+    assert slots.acquire(blocking=False)  # Released in teardown despite the exception
+    slots.release()
+
+
+def test_get_is_not_limited(limiter, logged_in, products):
+    limiter.slots['like'].acquire()
+    try:
+        assert logged_in.get('/home').status_code == 200
+    finally:
+        limiter.slots['like'].release()
+
+
+def test_forwarded_for_does_not_pick_a_fresh_bucket(limiter, client, user):
+    statuses = [client.post('/', data={'username': 'tester', 'password': 'wrong'},
+                            headers={'X-Forwarded-For': f'203.0.113.{i}'}).status_code for i in range(4)]
+    assert statuses[-1] == 429
+
+
+def test_redis_buckets_share_the_lua_script(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    import redis
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, 'from_url', lambda url: fakeredis.FakeRedis(server=server))
+    first, second = ratelimit.RedisBuckets('redis://bucket'), ratelimit.RedisBuckets('redis://bucket')
+    assert first.take('k', 3, 1 / 60, cost=2) == 0
+    assert second.take('k', 3, 1 / 60, cost=2) > 0  # Same bucket, one token left
+    assert second.take('k', 3, 1 / 60) == 0
@@ -0,0 +1,85 @@
+import io
+from collections import Counter
+
+import pytest
+from PIL import Image
+from sqlalchemy import event
+
+from conftest import PASSWORD
+from database import STICKY_KEY
+from models import db, User
+from passwords import hash_password
+
+
+@pytest.fixture
+def statements(app, replica):
+    """Statements run per engine, counted from the moment the test clears the counter."""
+    counted = Counter()
+    engines = {'primary': db.engine, 'replica': db.engines['replica_0']}
+    listeners = {name: lambda *args, name=name: counted.update([name]) for name in engines}
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute', listeners[name])
+    yield counted
+    for name, engine in engines.items():
+        event.remove(engine, 'before_cursor_execute', listeners[name])
+
+
+def engines_used(app, statements, request):
+    """The engines ``request()`` ran statements on; the page cache is emptied first so pages are rendered."""
+    app.extensions['cache'].clear()
+    statements.clear()
+    response = request()
+    return {name for name, count in statements.items() if count}, response.get_data(as_text=True)
+
+
+def png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), 'red').save(buffer, 'PNG')
+    buffer.seek(0)
+    return buffer
+
+
+def test_reads_follow_the_writer_to_the_primary_then_return_to_the_replica(app, logged_in, replica, statements):
+    used, _ = engines_used(app, statements, lambda: logged_in.get('/home'))
+    assert used == {'replica'}
+
+    used, _ = engines_used(app, statements, lambda: logged_in.post(
+        '/add_product', data={'name': 'Lagging lantern', 'price': '5', 'image': (png(), 'a.png')},
+        content_type='multipart/form-data'))
+    assert used == {'primary'}
+
+    used, page = engines_used(app, statements, lambda: logged_in.get('/home'))
+    assert used == {'primary'}
+    assert 'Lagging lantern' in page
+
+    with logged_in.session_transaction() as session:
+        session[STICKY_KEY] = 0  # The sticky window has passed
+    used, page = engines_used(app, statements, lambda: logged_in.get('/home'))
+    assert used == {'replica'}
+    assert 'Lagging lantern' not in page  # The replica lags behind
+
+    replica()
+    used, page = engines_used(app, statements, lambda: logged_in.get('/home'))
+    assert used == {'replica'}
+    assert 'Lagging lantern' in page
+
+
+@pytest.fixture
+def other_client(app, user):
+    """A second user, logged in on their own client."""
+    db.session.add(User(username='other', email='other@example.com', password=hash_password(PASSWORD)))
+    db.session.commit()
+    client = app.test_client()
+    assert client.post('/', data={'username': 'other', 'password': PASSWORD}).status_code == 302
+    return client
+
+
+def test_other_users_keep_reading_the_replica(app, logged_in, other_client, replica, statements):
+    used, _ = engines_used(app, statements, lambda: logged_in.post(
+        '/add_product', data={'name': 'Lantern', 'price': '5', 'image': (png(), 'a.png')},
+        content_type='multipart/form-data'))
+    assert used == {'primary'}
+
+    used, page = engines_used(app, statements, lambda: other_client.get('/home'))
+    assert used == {'replica'}
+    assert 'Lantern' not in page
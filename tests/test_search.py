@@ -0,0 +1,47 @@
+from sqlalchemy.dialects import postgresql
+
+import search
+from models import db, Product
+
+# Similarity to "fox": the first four contain it (1.0), the next three only some of its trigrams
+NAMES = ['red fox', 'blue fox', 'fox den', 'arctic fox', 'foxy lady', 'foxglove', 'foxtrot', 'owl', 'castle']
+
+
+def add_products(names):
+    db.session.execute(db.insert(Product), [{'name': name, 'price': 1} for name in names])
+    db.session.commit()
+
+
+def pages(client, **params):
+    """Every page of the API listing, following ``next_cursor``."""
+    result, cursor = [], None
+    while True:
+        body = client.get('/api/v1/products', query_string={**params, **({'cursor': cursor} if cursor else {})},
+                          headers={'Accept': 'application/json'}).get_json()
+        result.append([item['name'] for item in body['items']])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return result
+
+
+def test_ranked_search_pages_through_ties(logged_in):
+    add_products(NAMES)
+    seen = pages(logged_in, search='fox', sort='relevance', per_page=2, fields='name')
+
+    names = [name for page in seen for name in page]
+    assert all(len(page) == 2 for page in seen[:-1])
+    assert len(names) == len(set(names)) == 7
+    # Best match first; among equal scores, newest first
+    assert names == ['arctic fox', 'fox den', 'blue fox', 'red fox', 'foxtrot', 'foxglove', 'foxy lady']
+
+
+def test_ranked_search_matches_a_typo(logged_in):
+    add_products(NAMES)
+    assert 'arctic fox' in pages(logged_in, search='arctik fox', sort='relevance', fields='name')[0]
+
+
+def test_postgres_rank_is_compared_as_double_precision(app, monkeypatch):
+    monkeypatch.setattr(search, '_dialect', lambda: 'postgresql')
+    _, order_by = search.rank_products(Product.query, 'fox')
+    sql = str(order_by[0][0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith('CAST(word_similarity(') and sql.endswith('AS FLOAT(53))')
@@ -0,0 +1,108 @@
+import io
+import os
+
+import pytest
+from flask import Flask
+from PIL import Image
+
+import storage
+from images import discard_image
+from jobs import run_pending
+from models import db, ImageTombstone
+
+VARIANT = (64, 0, 'limit')
+
+
+def png(size=(200, 100)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'blue').save(buffer, 'PNG')
+    buffer.seek(0)
+    buffer.name = 'upload.png'
+    return buffer
+
+
+@pytest.fixture
+def local(tmp_path):
+    return storage.LocalStorage(str(tmp_path), '/media', variants=[VARIANT])
+
+
+@pytest.fixture
+def media(local):
+    """A client of an app serving ``local`` at /media."""
+    app = Flask(__name__)
+    app.config.update(MEDIA_MAX_AGE=3600, MEDIA_ACCEL_REDIRECT=None)
+    app.extensions['storage'] = local
+    app.register_blueprint(storage.bp, url_prefix='/media')
+    return app.test_client()
+
+
+def test_incomplete_driver_cannot_be_instantiated():
+    class Incomplete(storage.Storage):
+        def put(self, source):
+            return 'key'
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_put_is_content_addressed(local):
+    key = local.put(png())
+    assert storage.LOCAL_KEY.match(key) and key.endswith('.png')
+    assert local.put(png()) == key
+    assert [item['public_id'] for item in local.list()] == [key]
+
+
+@pytest.mark.parametrize('key', [
+    '../../etc/passwd',
+    'product_images/ab/../../../secret',
+    'product_images/zz/' + 'a' * 64 + '.png',
+    '/product_images/ab/' + 'a' * 64,
+])
+def test_keys_outside_the_layout_are_refused(local, media, key):
+    with pytest.raises(KeyError):
+        local.path(key)
+    assert media.get('/media/' + key, follow_redirects=True).status_code == 404
+
+
+def test_only_configured_variants_are_rendered(local, media):
+    key = local.put(png())
+    response = media.get(local.url(key, width=64, crop='limit'))
+    assert response.status_code == 200
+    assert Image.open(io.BytesIO(response.data)).size == (64, 32)
+    assert media.get(f'/media/{key}?w=2000&h=2000&c=fill').status_code == 404
+    assert os.listdir(os.path.join(local.root, storage.DERIVED_FOLDER, key.split('/')[1])) \
+        == [os.path.basename(local._derived_path(key, VARIANT))]
+
+
+def test_etag_revalidates_with_304(local, media):
+    key = local.put(png())
+    response = media.get(f'/media/{key}')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert etag.strip('"') in key
+    assert 'immutable' in response.headers['Cache-Control']
+    assert media.get(f'/media/{key}', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_range_request_gets_206(local, media):
+    key = local.put(png())
+    response = media.get(f'/media/{key}', headers={'Range': 'bytes=0-7'})
+    assert response.status_code == 206
+    assert response.data == b'\x89PNG\r\n\x1a\n'
+    assert response.headers['Content-Range'].startswith('bytes 0-7/')
+
+
+def test_discarded_image_is_tombstoned_then_deleted_by_the_job(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'IMAGE_DELETE_FLUSH_DELAY', 0)
+    local = storage.LocalStorage.from_config(app.config, root=str(tmp_path))
+    monkeypatch.setitem(app.extensions, 'storage', local)
+    key = local.put(png())
+
+    discard_image(key)
+    db.session.commit()
+    assert os.path.exists(local.path(key))
+    assert db.session.scalars(db.select(ImageTombstone.public_id)).all() == [key]
+
+    run_pending()
+    assert not os.path.exists(local.path(key))
+    assert db.session.scalar(db.select(db.func.count()).select_from(ImageTombstone)) == 0
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+from jinja2 import Environment, FileSystemLoader
+
+import templating
+
+
+@pytest.fixture
+def compiles(monkeypatch):
+    """Names of the templates compiled from source by environments created from here on."""
+    compiled = []
+    compile_source = Environment.compile
+
+    def counting(self, source, name=None, filename=None, raw=False, defer_init=False):
+        compiled.append(name)
+        return compile_source(self, source, name, filename, raw, defer_init)
+
+    monkeypatch.setattr(Environment, 'compile', counting)
+    return compiled
+
+
+def environment(templates, cache_dir):
+    """A fresh environment, as in a new process: nothing compiled in memory."""
+    return Environment(loader=FileSystemLoader(str(templates)), bytecode_cache=templating.BytecodeCache(str(cache_dir)))
+
+
+def test_bytecode_is_cached_reused_and_invalidated(tmp_path, compiles):
+    templates, cache_dir = tmp_path / 'templates', tmp_path / 'cache'
+    templates.mkdir()
+    cache_dir.mkdir()
+    (templates / 'page.html').write_text('Hello {{ name }}')
+
+    assert environment(templates, cache_dir).get_template('page.html').render(name='a') == 'Hello a'
+    assert compiles == ['page.html']
+    assert len(os.listdir(cache_dir)) == 1
+
+    assert environment(templates, cache_dir).get_template('page.html').render(name='b') == 'Hello b'
+    assert compiles == ['page.html']  # Loaded from the cache
+
+    (templates / 'page.html').write_text('Bye {{ name }}')
+    assert environment(templates, cache_dir).get_template('page.html').render(name='c') == 'Bye c'
+    assert compiles == ['page.html', 'page.html']
+    assert environment(templates, cache_dir).get_template('page.html').render(name='d') == 'Bye d'
+    assert len(compiles) == 2
+
+
+def test_unwritable_cache_still_renders(tmp_path, compiles, monkeypatch):
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 'page.html').write_text('Hello {{ name }}')
+    env = environment(templates, tmp_path)
+
+    def read_only(*args, **kwargs):
+        raise PermissionError('read-only file system')
+
+    monkeypatch.setattr(templating.FileSystemBytecodeCache, 'dump_bytecode', read_only)
+    assert env.get_template('page.html').render(name='a') == 'Hello a'
+
+
+def test_compile_templates_fills_the_app_cache(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'TEMPLATE_CACHE_DIR', str(tmp_path / 'jinja'))
+    monkeypatch.setattr(app.jinja_env, 'bytecode_cache', None)
+    templating.init_app(app)
+    assert isinstance(app.jinja_env.bytecode_cache, templating.BytecodeCache)
+
+    names = templating.compile_templates(app)
+    assert 'login.html' in names
+    assert len(os.listdir(tmp_path / 'jinja')) == len(names)
+    app.jinja_env.cache.clear()
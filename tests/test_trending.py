@@ -0,0 +1,92 @@
+import threading
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import event
+
+from jobs import run_pending
+from models import db, Job, Like, Product, TrendingState, User, toggle_like, trending_weight, utcnow
+from trending import refresh_trending
+
+
+def set_anchor(anchor):
+    db.session.get(TrendingState, 1).anchor = anchor
+    db.session.commit()
+
+
+def refresh_jobs():
+    return db.session.scalar(db.select(db.func.count()).select_from(Job).where(Job.kind == 'refresh_trending'))
+
+
+def test_weight_of_a_like_long_after_the_anchor_is_bounded(app):
+    now = utcnow()
+    assert trending_weight(now, now) == 1.0
+    assert 1e250 < trending_weight(now, now - timedelta(days=3650)) < float('inf')
+    assert trending_weight(now - timedelta(days=3650), now) == 0.0
+
+
+def test_like_after_an_old_anchor_queues_one_refresh(app, logged_in):
+    db.session.add_all([Product(name='Kite', price=1), Product(name='Drum', price=1)])
+    db.session.commit()
+    set_anchor(utcnow() - timedelta(days=400))
+
+    assert logged_in.post('/api/v1/products/1/like', json={'liked': True}).status_code == 200
+    assert logged_in.post('/api/v1/products/2/like', json={'liked': True}).status_code == 200
+    assert refresh_jobs() == 1
+
+    assert run_pending() == 1
+    db.session.expire_all()
+    assert utcnow() - db.session.get(TrendingState, 1).anchor < timedelta(minutes=1)
+    assert [round(score, 3) for score in db.session.scalars(db.select(Product.trending_score).order_by(Product.id))] \
+        == [1.0, 1.0]
+
+
+def test_like_after_a_recent_anchor_queues_nothing(app, logged_in):
+    db.session.add(Product(name='Kite', price=1))
+    db.session.commit()
+    set_anchor(utcnow() - timedelta(days=2))
+    logged_in.post('/api/v1/products/1/like', json={'liked': True})
+    assert refresh_jobs() == 0
+
+
+def test_like_during_a_refresh_uses_the_new_anchor(app):
+    """A like made while a refresh holds the anchor waits for it, then adds a delta at the new anchor."""
+    db.session.add_all([User(username='fan', email='fan@example.com', password='-'), Product(name='Kite', price=1)])
+    db.session.commit()
+    set_anchor(utcnow() - timedelta(days=3))
+    refreshing, liked = threading.Event(), threading.Event()
+
+    def pause_before_reading_likes(conn, cursor, statement, *args):
+        if statement.lstrip().startswith('SELECT likes.product_id') and not refreshing.is_set():
+            refreshing.set()
+            assert not liked.wait(0.5)  # The like can't get past the locked anchor
+
+    def in_app_context(function):
+        def run():
+            with app.app_context():
+                function()
+                db.session.remove()
+        return threading.Thread(target=run)
+
+    def like():
+        refreshing.wait(5)
+        toggle_like(1, 1)
+        db.session.commit()
+        liked.set()
+
+    event.listen(db.engine, 'before_cursor_execute', pause_before_reading_likes)
+    try:
+        threads = [in_app_context(refresh_trending), in_app_context(like)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', pause_before_reading_likes)
+    assert liked.is_set()
+
+    db.session.expire_all()
+    anchor = db.session.get(TrendingState, 1).anchor
+    assert utcnow() - anchor < timedelta(minutes=1)
+    liked_at = db.session.scalar(db.select(Like.created_at))
+    assert db.session.get(Product, 1).trending_score == pytest.approx(trending_weight(liked_at, anchor))
@@ -0,0 +1,64 @@
+import io
+import os
+from tempfile import SpooledTemporaryFile
+
+import pytest
+
+import uploads
+
+
+def png_bytes(size):
+    """A valid file name and ``size`` bytes of body; only the staging path reads it."""
+    return io.BytesIO(b'\x89PNG\r\n\x1a\n' + os.urandom(size - 8))
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    """Every spooled file the request class creates for an upload."""
+    created = []
+
+    class Recorded(SpooledTemporaryFile):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.directory = kwargs['dir']
+            created.append(self)
+
+    monkeypatch.setattr(uploads, 'SpooledTemporaryFile', Recorded)
+    return created
+
+
+def post_upload(client, size):
+    return client.post('/add_product', data={'name': 'Poster', 'price': '3', 'image': (png_bytes(size), 'poster.png')},
+                       content_type='multipart/form-data')
+
+
+def test_oversized_upload_is_refused_before_reading_the_body(app, logged_in, streams, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', 64 * 1024)
+    response = post_upload(logged_in, 128 * 1024)
+    assert response.status_code == 302
+    assert streams == []
+    assert b'The file is too large. The limit is 0.0625 MB.' in logged_in.get(response.location).data
+
+
+def test_oversized_api_request_gets_a_json_413(app, logged_in, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', 1024)
+    response = logged_in.post('/api/v1/likes', json={'likes': [{'product_id': 1, 'liked': True}] * 200})
+    assert response.status_code == 413
+    assert 'error' in response.get_json()
+
+
+def test_large_upload_is_spooled_to_the_staging_directory(app, logged_in, streams, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_SPOOL_THRESHOLD', 16 * 1024)
+    assert post_upload(logged_in, 256 * 1024).status_code == 302
+    [stream] = streams
+    assert stream._rolled
+    assert stream.directory == app.config['UPLOAD_STAGING_DIR']
+    # And staged next to it, for the upload job
+    assert len([name for name in os.listdir(app.config['UPLOAD_STAGING_DIR']) if name.endswith('.png')]) == 1
+
+
+def test_small_upload_stays_in_memory(app, logged_in, streams, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_SPOOL_THRESHOLD', 16 * 1024)
+    assert post_upload(logged_in, 4 * 1024).status_code == 302
+    [stream] = streams
+    assert not stream._rolled
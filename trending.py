@@ -0,0 +1,82 @@
+# trending.py
+"""Re-express every trending score at the current time.
+
+Likes and unlikes keep ``products.trending_score`` up to date as they
+happen (see ``models.TrendingState``), so the order of the "trending" sort
+is right without a refresh. A refresh moves the shared anchor to now so a
+recent like weighs about 1 again instead of growing without bound, drops
+likes older than ``WINDOW_HALF_LIVES`` half-lives (their weight is
+negligible), and repairs any drift.
+
+Refreshes run as a ``refresh_trending`` job, queued by the first like made
+``TRENDING_REBASE_HALF_LIVES`` half-lives after the anchor, so a deployment
+needs no cron; ``flask refresh-trending`` runs one by hand.
+
+A refresh locks the ``trending_state`` row before reading any like, and
+likes read the anchor under a share lock (on SQLite, the database write
+lock does both), so a like's delta is always computed at the anchor its
+product's score is expressed at: a like either finishes before the refresh
+reads the likes or waits for it to commit and uses the new anchor.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+import click
+from flask import has_request_context
+
+import cache
+from jobs import enqueue, handler, notify_workers
+from models import db, Job, Like, Product, TrendingState, trending_tau, utcnow
+
+BATCH_SIZE = 1000
+WINDOW_HALF_LIVES = 30  # 2 ** -30: older likes no longer move a score
+
+
+@handler('refresh_trending')
+def refresh_trending(now=None):
+    """Recompute ``trending_score`` for every product at ``now``; returns the rows changed."""
+    now = now or utcnow()
+    # Taken first: likes wait for the new anchor instead of adding old-anchor deltas to new scores
+    state = db.session.get(TrendingState, 1, with_for_update=True)
+    if state is None:
+        db.session.add(TrendingState(id=1, anchor=now))
+    else:
+        state.anchor = now
+    db.session.flush()
+    tau = trending_tau()
+    cutoff = now - timedelta(seconds=tau * math.log(2) * WINDOW_HALF_LIVES)
+
+    scores = defaultdict(float)
+    for product_id, liked_at in db.session.execute(
+        db.select(Like.product_id, Like.created_at).where(Like.created_at >= cutoff)
+        .execution_options(yield_per=BATCH_SIZE)
+    ):
+        scores[product_id] += math.exp(-(now - liked_at).total_seconds() / tau)
+    # Scored products without a recent like fall back to zero
+    for product_id in db.session.scalars(db.select(Product.id).where(Product.trending_score != 0)):
+        scores.setdefault(product_id, 0.0)
+
+    rows = [{'id': product_id, 'trending_score': score} for product_id, score in scores.items()]
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(db.update(Product), rows[start:start + BATCH_SIZE])
+    db.session.commit()
+    cache.bump('likes')
+    return len(rows)
+
+
+def schedule_refresh():
+    """Make sure a ``refresh_trending`` job is queued; joins the caller's transaction."""
+    queued = db.session.scalar(
+        db.select(Job.id).where(Job.kind == 'refresh_trending', Job.status == 'queued').limit(1)
+    )
+    if queued is None:
+        enqueue('refresh_trending')
+        if has_request_context():
+            notify_workers()
+
+
+@click.command('refresh-trending')
+def refresh_trending_command():
+    """Recompute the trending scores at the current time."""
+    click.echo(f'Refreshed {refresh_trending()} trending score(s)')
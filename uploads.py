@@ -0,0 +1,39 @@
+# uploads.py
+"""Request size limit and disk spooling for uploads.
+
+``MAX_CONTENT_LENGTH`` is checked against the Content-Length header before
+any of the body is read, and enforced while reading bodies sent without one
+(chunked transfer encoding), so an oversize upload is refused with 413
+without costing memory or disk. File parts of up to
+``UPLOAD_SPOOL_THRESHOLD`` bytes stay in memory; larger ones roll over to a
+temporary file in ``UPLOAD_STAGING_DIR``. ``images.stage_upload`` then
+copies that file in small blocks, so a request's memory doesn't grow with
+the size of the file. What the upload job sends to the image host is the
+preprocessed copy (``imaging.py``), never larger than a few hundred KB.
+"""
+from tempfile import SpooledTemporaryFile
+
+from flask import Request, current_app, flash, redirect, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from images import staging_dir
+
+
+class SpooledRequest(Request):
+    """Request whose file uploads spool to the staging directory above ``UPLOAD_SPOOL_THRESHOLD``."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=current_app.config['UPLOAD_SPOOL_THRESHOLD'], mode='rb+',
+                                    dir=staging_dir())
+
+
+def too_large(error):
+    limit = current_app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024)
+    flash(f'The file is too large. The limit is {limit:g} MB.', 'error')
+    # Back to the form the upload was posted from
+    return redirect(request.url)
+
+
+def init_app(app):
+    app.request_class = SpooledRequest
+    app.register_error_handler(RequestEntityTooLarge, too_large)
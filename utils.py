@@ -1,5 +1,5 @@
 from functools import wraps
-from flask import session, redirect, url_for, flash
+from flask import session, redirect, url_for, flash, jsonify
 
 def login_required(f):
     @wraps(f)
@@ -17,3 +17,11 @@ def logout_required(f):
             return redirect(url_for('home'))
         return f(*args, **kwargs)
     return decorated_function
+
+def api_login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:  # JSON clients get a 401 instead of the login page
+            return jsonify(error='Authentication required'), 401
+        return f(*args, **kwargs)
+    return decorated_function